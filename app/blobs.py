@@ -0,0 +1,48 @@
+"""Codec for content-addressed raw payload blobs.
+
+Payloads are serialized as canonical JSON (sorted keys, no whitespace) so
+identical payloads always hash the same, then zstd-compressed. Plain text
+(homepage snapshots) uses the same compressor without the JSON step.
+"""
+from typing import Any, Tuple
+import hashlib
+import json
+import threading
+import zstandard
+
+COMPRESSION_LEVEL = 9
+
+# zstd (de)compressor objects must not be shared across threads
+_local = threading.local()
+
+
+def _compressor() -> zstandard.ZstdCompressor:
+    if not hasattr(_local, 'compressor'):
+        _local.compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+    return _local.compressor
+
+
+def _decompressor() -> zstandard.ZstdDecompressor:
+    if not hasattr(_local, 'decompressor'):
+        _local.decompressor = zstandard.ZstdDecompressor()
+    return _local.decompressor
+
+
+def encode(payload: Any) -> Tuple[str, bytes, int]:
+    """Returns (sha256 hex digest, compressed bytes, uncompressed size)"""
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str).encode()
+    return hashlib.sha256(raw).hexdigest(), _compressor().compress(raw), len(raw)
+
+
+def decode(data: bytes) -> Any:
+    return json.loads(_decompressor().decompress(data))
+
+
+def compress_text(text: str) -> Tuple[bytes, int]:
+    """Returns (compressed bytes, uncompressed size)"""
+    raw = text.encode()
+    return _compressor().compress(raw), len(raw)
+
+
+def decompress_text(data: bytes) -> str:
+    return _decompressor().decompress(data).decode()
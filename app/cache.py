@@ -0,0 +1,137 @@
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class JSONCache:
+    """
+    Small TTL cache for JSON-serializable values. Backed by Redis when a URL
+    is given, so entries are shared by every worker; otherwise (or if Redis
+    is unreachable) entries live in this process only.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = 'cache'):
+        self.prefix = prefix
+        self.redis = None
+        if redis_url:
+            import redis
+            self.redis = redis.Redis.from_url(redis_url, socket_timeout=2)
+        self._local = {}
+        self._flights = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.redis is not None:
+            try:
+                value = self.redis.get(self._key(key))
+                return json.loads(value) if value is not None else None
+            except Exception as e:
+                logger.error(f"Error reading cache key {key}: {str(e)}")
+        with self._lock:
+            entry = self._local.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            self._local.pop(key, None)
+        return None
+
+    def set(self, key: str, value: Any, ttl: int):
+        if self.redis is not None:
+            try:
+                self.redis.set(self._key(key), json.dumps(value, default=str), ex=ttl)
+                return
+            except Exception as e:
+                logger.error(f"Error writing cache key {key}: {str(e)}")
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+
+    def _claim(self, key: str, ttl: int) -> bool:
+        """Claims the right to fetch `key` for up to `ttl` seconds"""
+        if self.redis is not None:
+            try:
+                return bool(self.redis.set(self._key(f"{key}:flight"), 1, nx=True, ex=ttl))
+            except Exception as e:
+                logger.error(f"Error claiming cache key {key}: {str(e)}")
+        with self._lock:
+            now = time.monotonic()
+            if self._flights.get(key, 0) > now:
+                return False
+            self._flights[key] = now + ttl
+            return True
+
+    def _release(self, key: str):
+        if self.redis is not None:
+            try:
+                self.redis.delete(self._key(f"{key}:flight"))
+            except Exception as e:
+                logger.error(f"Error releasing cache key {key}: {str(e)}")
+        with self._lock:
+            self._flights.pop(key, None)
+
+    def _mark_failed(self, key: str, ttl: int):
+        """Tells callers waiting on `key` that its fetch came back empty"""
+        if ttl <= 0:
+            return
+        if self.redis is not None:
+            try:
+                self.redis.set(self._key(f"{key}:failed"), 1, ex=ttl)
+                return
+            except Exception as e:
+                logger.error(f"Error marking cache key {key} failed: {str(e)}")
+        with self._lock:
+            self._failures[key] = time.monotonic() + ttl
+
+    def _failed(self, key: str) -> bool:
+        if self.redis is not None:
+            try:
+                return bool(self.redis.exists(self._key(f"{key}:failed")))
+            except Exception as e:
+                logger.error(f"Error reading cache key {key}: {str(e)}")
+        with self._lock:
+            if self._failures.get(key, 0) > time.monotonic():
+                return True
+            self._failures.pop(key, None)
+            return False
+
+    async def get_or_fetch(self, key: str, ttl: int, fetch: Callable[[], Awaitable[Any]],
+                           flight_ttl: int = 30, failure_ttl: int = 10,
+                           poll_interval: float = 0.1) -> Optional[Any]:
+        """
+        Cached value of `key`, or the result of `await fetch()` cached for
+        `ttl` seconds. Concurrent misses are coalesced: one caller (across
+        every worker when Redis is configured) fetches while the others wait
+        for its result. A None result or an error is not cached, but callers
+        get None for the next `failure_ttl` seconds instead of each
+        refetching in turn. Waiters give up with None after `flight_ttl`.
+        """
+        deadline = time.monotonic() + flight_ttl
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+            if self._failed(key):
+                return None
+            if self._claim(key, flight_ttl):
+                value = None
+                try:
+                    value = await fetch()
+                    if value is not None:
+                        self.set(key, value, ttl)
+                    return value
+                finally:
+                    if value is None:
+                        self._mark_failed(key, failure_ttl)
+                    self._release(key)
+            if time.monotonic() > deadline:
+                # The fetching worker hung; its claim expires and a later call retries
+                logger.warning(f"Gave up waiting on the fetch of cache key {key}")
+                return None
+            await asyncio.sleep(poll_interval)
@@ -0,0 +1,77 @@
+from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_init
+from .config import Settings
+from . import metrics
+
+settings = Settings()
+
+celery = Celery('tasks', broker=settings.redis_url, include=['app.celery_tasks'])
+
+# Network-bound tasks go to `io` (gevent pool, hundreds of greenlets);
+# CPU-bound ones to `cpu` (prefork, one process per core). Override per
+# task with CELERY_TASK_ROUTES="app.celery_tasks.refresh_tech_stack=cpu,..."
+IO_QUEUE = 'io'
+CPU_QUEUE = 'cpu'
+TASK_QUEUES = {
+    'app.celery_tasks.process_company_data': IO_QUEUE,
+    'app.celery_tasks.refresh_github_data': IO_QUEUE,
+    'app.celery_tasks.refresh_market_data': IO_QUEUE,
+    'app.celery_tasks.refresh_tech_stack': IO_QUEUE,
+    'app.celery_tasks.refresh_review_data': IO_QUEUE,
+    'app.celery_tasks.crawl_frontier': IO_QUEUE,
+    'app.celery_tasks.analyze_review_data': CPU_QUEUE,
+    'app.celery_tasks.maintain_metrics_history': CPU_QUEUE,
+    'app.celery_tasks.delete_orphaned_raw_blobs': CPU_QUEUE,
+    'app.celery_tasks.evict_homepage_snapshots': CPU_QUEUE,
+    'app.celery_tasks.rebuild_company_rankings': CPU_QUEUE,
+    'app.celery_tasks.rebuild_company_features': CPU_QUEUE,
+}
+
+
+def task_routes(overrides: str = '') -> dict:
+    queues = dict(TASK_QUEUES)
+    for route in filter(None, (route.strip() for route in overrides.split(','))):
+        task, _, queue = route.partition('=')
+        if not queue:
+            raise ValueError(f"Invalid task route {route!r}, expected task=queue")
+        queues[task.strip()] = queue.strip()
+    return {task: {'queue': queue} for task, queue in queues.items()}
+
+
+celery.conf.task_routes = task_routes(settings.celery_task_routes)
+
+celery.conf.beat_schedule = {
+    'maintain-metrics-history': {
+        'task': 'app.celery_tasks.maintain_metrics_history',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'delete-orphaned-raw-blobs': {
+        'task': 'app.celery_tasks.delete_orphaned_raw_blobs',
+        'schedule': crontab(hour=4, minute=0, day_of_week='sunday'),
+    },
+    'evict-homepage-snapshots': {
+        'task': 'app.celery_tasks.evict_homepage_snapshots',
+        'schedule': crontab(hour=5, minute=0),
+    },
+}
+
+
+@worker_init.connect
+def _serve_metrics(**kwargs):
+    """Each worker service exposes its own metrics for Prometheus to scrape"""
+    if settings.worker_metrics_port:
+        metrics.serve_worker_metrics(settings.worker_metrics_port)
+
+
+@worker_init.connect
+def _patch_psycopg(**kwargs):
+    """Under the gevent pool, make psycopg2 yield to other greenlets while waiting on Postgres"""
+    try:
+        from gevent import monkey
+        if not monkey.is_module_patched('socket'):
+            return
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
@@ -1,87 +1,84 @@
-from celery import shared_task
+from celery import group, shared_task
 from .database import SessionLocal
-from . import crud
-from .collectors import GitHubCollector
-from .marketing import MarketingEstimator
+from . import crud, history, snapshots
+from .collectors import (
+    CrawlFrontier, GitHubCollector, GitHubTokenPool, MarketingEstimator, ReviewCollector, TokensExhausted
+)
+from .collectors.marketing import calculate_efficiency
 from .config import Settings
+from .cache import JSONCache
+from .domains import canonical_host
+from . import metrics, profiling
+from urllib.parse import urlsplit
 import logging
 import asyncio
 
 logger = logging.getLogger(__name__)
 settings = Settings()
+github_cache = JSONCache(settings.redis_url, prefix='github')
+github_pool = GitHubTokenPool.from_settings(settings)
+domain_cache = JSONCache(settings.redis_url, prefix='domains')
+frontier = CrawlFrontier.from_settings(settings)
+# Review sources crawled so far for a company, until its last source lands
+review_stash = JSONCache(settings.redis_url, prefix='reviews:crawl')
+REVIEW_STASH_TTL = 24 * 3600
+
+metrics.instrument_celery()
+metrics.instrument_sqlalchemy()
+profiling.instrument_celery(settings)
+
+def get_github_collector() -> GitHubCollector:
+    return GitHubCollector(
+        base_url=settings.github_api_url,
+        cheap=settings.github_cheap_mode,
+        cache=github_cache,
+        pool=github_pool
+    )
 
 @shared_task
-def process_company_data(company_id: int):
-    try:
-        db = SessionLocal()
-        company = crud.get_company(db, company_id)
-        
-        if not company:
-            logger.error(f"Company {company_id} not found")
-            return
-        
-        # Initialize collectors
-        github_collector = GitHubCollector(settings.github_token)
-        marketing_estimator = MarketingEstimator()
-        
-        # Collect GitHub metrics
-        github_metrics = github_collector.collect_metrics(company.github_url)
-        if github_metrics:
-            crud.update_github_metrics(db, company_id, github_metrics)
-        
-        # Collect marketing metrics using asyncio
-        loop = asyncio.get_event_loop()
-        marketing_metrics = loop.run_until_complete(
-            marketing_estimator.collect_metrics(company.website)
-        )
-        if marketing_metrics:
-            crud.update_market_metrics(db, company_id, marketing_metrics)
-            
-            # Extract and save tech stack data
-            if tech_data := marketing_metrics.get('raw_data', {}).get('tech_stack'):
-                crud.update_tech_stack(db, company_id, tech_data)
-        
-        # Calculate acquisition score
-        acquisition_score = calculate_acquisition_score(
-            github_metrics,
-            marketing_metrics
-        )
-        
-        # Update company score
-        company.acquisition_score = acquisition_score
-        db.commit()
-        
-    except Exception as e:
-        logger.error(f"Error processing company {company_id}: {str(e)}")
-        raise
-    
-    finally:
-        db.close()
+def process_company_data(company_id: int, profile: bool = False):
+    """
+    Fans collection out to one task per source. They run in parallel, and
+    each persists its own results and rescores the company when it lands,
+    so a slow or failing source delays or loses only its own part.
+    `profile` profiles the source tasks too (see app/profiling.py).
+    """
+    group(task.si(company_id) for task in SOURCE_TASKS).apply_async(
+        headers={'profile': True} if profile else None
+    )
 
-def calculate_acquisition_score(
+def rescore_company(db, company_id: int) -> float:
+    """
+    Recomputes the acquisition score and the marketing efficiency score from
+    the metrics stored so far. Market and tech stack data land in parallel,
+    so whichever arrives second completes the efficiency score.
+    """
+    github_metrics, marketing_metrics = crud.get_score_inputs(db, company_id)
+    subscores = calculate_subscores(github_metrics, marketing_metrics)
+    acquisition_score = calculate_acquisition_score(github_metrics, marketing_metrics, subscores)
+    efficiency_score = None
+    # Only companies with stored market metrics have an efficiency score
+    if marketing_metrics and 'tranco' in marketing_metrics['raw_data']:
+        efficiency_score = calculate_efficiency(marketing_metrics['raw_data'])
+    crud.update_company_score(db, company_id, acquisition_score, subscores, efficiency_score)
+    return acquisition_score
+
+def calculate_subscores(
     github_metrics: dict,
     marketing_metrics: dict
-) -> float:
+) -> dict:
+    """GitHub, market and tech components of the acquisition score"""
+    subscores = {'github_score': 0.0, 'market_score': 0.0, 'tech_score': 0.0}
     try:
-        # Define weights for each category
-        weights = {
-            'github': 0.4,
-            'market': 0.3,
-            'tech': 0.3
-        }
-        
         # Calculate GitHub score
-        github_score = 0
         if github_metrics:
-            github_score = (
+            subscores['github_score'] = (
                 github_metrics['stars'] * 0.3 +
                 github_metrics['contributors'] * 0.3 +
                 github_metrics['commit_frequency'] * 0.2 +
                 (1 / (github_metrics['issue_response_time'] + 1)) * 0.2
             ) / 1000  # Normalize
         
-        # Calculate market score
-        market_score = 0
         if marketing_metrics:
             # Get Tranco rank score (inverse of rank percentile)
             rank = marketing_metrics.get('raw_data', {}).get('tranco', {}).get('rank')
@@ -94,19 +91,38 @@ def calculate_acquisition_score(
                 recent_trends = trends_data['interest_over_time'][-4:]
                 trend_score = sum(recent_trends) / len(recent_trends)
             
-            market_score = (rank_score * 0.6 + trend_score * 0.4) / 100
+            subscores['market_score'] = (rank_score * 0.6 + trend_score * 0.4) / 100
         
-        # Calculate tech score
-        tech_score = 0
-        if tech_data := marketing_metrics.get('raw_data', {}).get('tech_stack'):
-            total_tools = sum(len(tools) for tools in tech_data.values())
-            tech_score = min(1.0, total_tools / 5)  # 5 tools = 100%
+            # Calculate tech score
+            if tech_data := marketing_metrics.get('raw_data', {}).get('tech_stack'):
+                total_tools = sum(len(tools) for tools in tech_data.values())
+                subscores['tech_score'] = min(1.0, total_tools / 5)  # 5 tools = 100%
+        
+    except Exception as e:
+        logger.error(f"Error calculating subscores: {str(e)}")
+    
+    return subscores
+
+def calculate_acquisition_score(
+    github_metrics: dict,
+    marketing_metrics: dict,
+    subscores: dict = None
+) -> float:
+    try:
+        # Define weights for each category
+        weights = {
+            'github': 0.4,
+            'market': 0.3,
+            'tech': 0.3
+        }
+        
+        subscores = subscores or calculate_subscores(github_metrics, marketing_metrics)
         
         # Calculate final score
         final_score = (
-            github_score * weights['github'] +
-            market_score * weights['market'] +
-            tech_score * weights['tech']
+            subscores['github_score'] * weights['github'] +
+            subscores['market_score'] * weights['market'] +
+            subscores['tech_score'] * weights['tech']
         ) * 100
         
         return min(max(final_score, 0), 100)  # Ensure score is between 0 and 100
@@ -115,9 +131,36 @@ def calculate_acquisition_score(
         logger.error(f"Error calculating acquisition score: {str(e)}")
         return 0.0
 
+@shared_task(bind=True, max_retries=None)
+def refresh_github_data(self, company_id: int):
+    """Task to collect just the GitHub metrics, waiting out drained tokens"""
+    try:
+        db = SessionLocal()
+        company = crud.get_company(db, company_id)
+        
+        if not company:
+            logger.error(f"Company {company_id} not found")
+            return
+        
+        github_metrics = get_github_collector().collect_metrics(company.github_url)
+        if github_metrics:
+            crud.update_github_metrics(db, company_id, github_metrics)
+            rescore_company(db, company_id)
+        
+    except TokensExhausted as e:
+        logger.warning(f"Deferring GitHub collection for company {company_id}: {str(e)}")
+        raise self.retry(exc=e, countdown=e.retry_after)
+    
+    except Exception as e:
+        logger.error(f"Error refreshing GitHub data for company {company_id}: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
+
 @shared_task
 def refresh_market_data(company_id: int):
-    """Task to refresh just the marketing metrics"""
+    """Task to refresh just the marketing metrics (Tranco and Trends)"""
     try:
         db = SessionLocal()
         company = crud.get_company(db, company_id)
@@ -126,23 +169,279 @@ def refresh_market_data(company_id: int):
             logger.error(f"Company {company_id} not found")
             return
         
-        marketing_estimator = MarketingEstimator()
-        loop = asyncio.get_event_loop()
-        marketing_metrics = loop.run_until_complete(
-            marketing_estimator.collect_metrics(company.website)
+        # The homepage belongs to refresh_tech_stack; reuse what it last stored
+        marketing_estimator = MarketingEstimator(settings.redis_url, cache=domain_cache)
+        marketing_metrics = asyncio.run(
+            marketing_estimator.collect_metrics(
+                company.website,
+                tech_data=crud.get_tech_stack_data(db, company_id) or {},
+                name=company.name
+            )
         )
         
         if marketing_metrics:
+            if marketing_metrics.get('partial'):
+                logger.warning(f"Partial marketing metrics for company {company_id}, skipped: "
+                               f"{marketing_metrics['raw_data']['skipped_sources']}")
             crud.update_market_metrics(db, company_id, marketing_metrics)
-            
-            if tech_data := marketing_metrics.get('raw_data', {}).get('tech_stack'):
-                crud.update_tech_stack(db, company_id, tech_data)
-                
-        db.commit()
+            rescore_company(db, company_id)
         
     except Exception as e:
         logger.error(f"Error refreshing market data for company {company_id}: {str(e)}")
         raise
     
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@shared_task
+def refresh_tech_stack(company_id: int):
+    """Task to queue a homepage tech stack re-detection on the crawl frontier"""
+    try:
+        db = SessionLocal()
+        company = crud.get_company(db, company_id)
+        
+        if not company:
+            logger.error(f"Company {company_id} not found")
+            return
+        
+        enqueue_crawl(company, 'tech_stack', profile=profiling.task_requested(refresh_tech_stack.request))
+        
+    except Exception as e:
+        logger.error(f"Error refreshing tech stack for company {company_id}: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
+
+@shared_task
+def refresh_review_data(company_id: int):
+    """Task to queue a refresh of the G2 and Capterra review metrics on the crawl frontier"""
+    try:
+        db = SessionLocal()
+        company = crud.get_company(db, company_id)
+        
+        if not company:
+            logger.error(f"Company {company_id} not found")
+            return
+        
+        # One source at a time; crawl_reviews queues the next when one lands
+        enqueue_crawl(
+            company, ReviewCollector.SOURCES[0], profile=profiling.task_requested(refresh_review_data.request)
+        )
+        
+    except Exception as e:
+        logger.error(f"Error refreshing review data for company {company_id}: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
+
+def enqueue_crawl(company, kind: str, profile: bool = False):
+    """
+    Queues a homepage (`tech_stack`) or review site (`g2`, `capterra`) fetch
+    for `company` on its host's frontier queue, best-scored companies first,
+    and starts a crawler to pick it up. `profile` has the crawler profile
+    the fetch, whichever crawler claims it.
+    """
+    if kind == 'tech_stack':
+        host = canonical_host(company.website)
+    else:
+        host = urlsplit(ReviewCollector(settings.redis_url).source_url(kind, company.name)).hostname
+    if not host:
+        logger.error(f"Nothing to crawl for company {company.id} ({kind}), website: {company.website!r}")
+        return
+    job = f"{kind}:{company.id}:profile" if profile else f"{kind}:{company.id}"
+    frontier.push(host, job, priority=-(company.acquisition_score or 0.0))
+    crawl_frontier.delay()
+
+@shared_task
+def crawl_frontier(max_jobs: int = 50):
+    """
+    Task to work through crawl jobs as their hosts become eligible. After
+    `max_jobs` it hands over to a fresh task; once every queued host is
+    waiting out its crawl delay it schedules one crawler for the first.
+    """
+    for _ in range(max_jobs):
+        lease = frontier.claim()
+        if lease is None:
+            break
+        try:
+            kind, company_id, *flags = lease.job.split(':')
+            profile = 'profile' in flags
+            with profiling.profiled(settings, 'crawl', kind, enabled=profile, company_id=int(company_id)):
+                crawl_company(kind, int(company_id), profile)
+        except Exception as e:
+            logger.error(f"Error crawling {lease.job} on {lease.host}: {str(e)}")
+        finally:
+            frontier.release(lease)
+    else:
+        crawl_frontier.delay(max_jobs)
+        return
+    
+    wait = frontier.next_ready_in()
+    if wait is not None and frontier.reserve_wakeup(wait):
+        crawl_frontier.apply_async(args=(max_jobs,), countdown=wait)
+
+def crawl_company(kind: str, company_id: int, profile: bool = False):
+    """Runs one crawl job handed out by the frontier"""
+    try:
+        db = SessionLocal()
+        company = crud.get_company(db, company_id)
+        
+        if not company:
+            logger.error(f"Company {company_id} not found")
+            return
+        
+        if kind == 'tech_stack':
+            marketing_estimator = MarketingEstimator(settings.redis_url, cache=domain_cache, keep_homepages=True)
+            tech_data = asyncio.run(marketing_estimator.collect_tech_stack(company.website))
+            # Stored once the event loop is done, so the fetch never waits on the database
+            for url, html in marketing_estimator.homepages:
+                store_homepage_snapshot(db, company, url, html)
+            if tech_data:
+                crud.update_tech_stack(db, company_id, tech_data)
+                rescore_company(db, company_id)
+        else:
+            crawl_reviews(company, kind, profile)
+    
+    finally:
+        db.close()
+
+def store_homepage_snapshot(db, company, url: str, html: str):
+    """Keeps fetched homepage HTML for offline re-detection"""
+    host = canonical_host(company.website)
+    try:
+        snapshots.store(
+            db, host, url, html, keep=settings.snapshots_per_host, max_bytes=settings.snapshot_max_bytes
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error storing homepage snapshot for {host}: {str(e)}")
+
+def crawl_reviews(company, source: str, profile: bool = False):
+    """Collects one review source, then queues the next or hands the full set to analysis"""
+    collector = ReviewCollector(settings.redis_url)
+    position = ReviewCollector.SOURCES.index(source)
+    # The first source starts a fresh set
+    stash = review_stash.get(str(company.id)) if position else None
+    stash = stash or {'raw_data': {}, 'skipped': []}
+    
+    # Skip sources whose circuit is open, as collect_metrics does
+    if collector.breakers[source].allow():
+        stash['raw_data'][source] = collector.collect_source(source, company.name)
+    else:
+        stash['skipped'].append(source)
+    
+    if position + 1 < len(ReviewCollector.SOURCES):
+        review_stash.set(str(company.id), stash, REVIEW_STASH_TTL)
+        enqueue_crawl(company, ReviewCollector.SOURCES[position + 1], profile)
+        return
+    
+    # Scraping waits on the network; scoring the text is CPU work for another pool
+    review_metrics = collector.summarize(stash['raw_data'], stash['skipped'], analyze=False)
+    analyze_review_data.delay(company.id, review_metrics)
+
+@shared_task
+def analyze_review_data(company_id: int, review_metrics: dict):
+    """Task to score collected reviews (NPS, TextBlob sentiment) and store them"""
+    try:
+        db = SessionLocal()
+        # Folds only reviews no earlier scrape has folded into the stored aggregates. They stay
+        # locked until update_review_metrics commits, so a concurrent or redelivered task waits
+        aggregates = crud.lock_review_aggregates(db, company_id, ReviewCollector.SOURCES)
+        review_metrics = ReviewCollector().analyze(review_metrics, aggregates)
+        crud.update_review_metrics(db, company_id, review_metrics)
+        rescore_company(db, company_id)
+        
+    except Exception as e:
+        logger.error(f"Error analyzing review data for company {company_id}: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
+
+# One task per external source, run in parallel by process_company_data
+SOURCE_TASKS = (refresh_github_data, refresh_market_data, refresh_tech_stack, refresh_review_data)
+
+@shared_task
+def maintain_metrics_history():
+    """Task to create upcoming history partitions and downsample old points"""
+    try:
+        db = SessionLocal()
+        removed = history.maintain(
+            db,
+            raw_retention_days=settings.history_raw_retention_days,
+            daily_retention_days=settings.history_daily_retention_days
+        )
+        logger.info(f"Downsampled metrics history: {removed}")
+        
+    except Exception as e:
+        logger.error(f"Error maintaining metrics history: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
+
+
+@shared_task
+def delete_orphaned_raw_blobs():
+    """Task to drop raw payload blobs no metrics row references any more"""
+    try:
+        db = SessionLocal()
+        deleted = crud.delete_orphaned_raw_blobs(db)
+        logger.info(f"Deleted {deleted} orphaned raw blobs")
+        
+    except Exception as e:
+        logger.error(f"Error deleting orphaned raw blobs: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
+
+
+@shared_task
+def evict_homepage_snapshots():
+    """Task to trim the homepage snapshot store to its size cap, oldest fetches first"""
+    try:
+        db = SessionLocal()
+        deleted = snapshots.evict(db, settings.snapshot_max_bytes)
+        logger.info(f"Evicted {deleted} homepage snapshots")
+        
+    except Exception as e:
+        logger.error(f"Error evicting homepage snapshots: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
+
+
+@shared_task
+def rebuild_company_rankings():
+    """Task to backfill the screening table from the metrics tables"""
+    try:
+        db = SessionLocal()
+        rows = crud.rebuild_rankings(db)
+        logger.info(f"Rebuilt {rows} company rankings")
+        
+    except Exception as e:
+        logger.error(f"Error rebuilding company rankings: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
+
+
+@shared_task
+def rebuild_company_features():
+    """Task to backfill similarity tokens for existing companies"""
+    try:
+        db = SessionLocal()
+        rows = crud.rebuild_company_features(db)
+        logger.info(f"Rebuilt similarity features for {rows} companies")
+        
+    except Exception as e:
+        logger.error(f"Error rebuilding company features: {str(e)}")
+        raise
+    
+    finally:
+        db.close()
@@ -0,0 +1,5 @@
+from .github import GitHubCollector
+from .token_pool import GitHubTokenPool, TokensExhausted
+from .frontier import CrawlFrontier, Lease
+from .reviews import ReviewCollector
+from .marketing import MarketingEstimator
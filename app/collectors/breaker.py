@@ -0,0 +1,168 @@
+"""Circuit breakers for the external sources the collectors scrape.
+
+A breaker opens once `failure_threshold` blocking failures (403/429,
+timeouts, refused connections) land within `window` seconds, and stays
+open for a cooldown. After the cooldown a single caller is let through
+as a half-open probe: success closes the circuit, failure reopens it for
+twice as long (capped at `max_cooldown`).
+
+State lives in Redis when a URL is given, so a source that blocks one
+worker is skipped by all of them; without Redis (or if it is unreachable)
+each process keeps its own state.
+"""
+from typing import Dict, Optional
+import logging
+import threading
+import time
+from ..metrics import CIRCUIT_BREAKER_STATE, CIRCUIT_BREAKER_TRANSITIONS, CIRCUIT_BREAKER_SKIPPED
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# HTTP statuses that mean we are being blocked or throttled
+BLOCKING_STATUSES = (403, 429)
+
+
+class CircuitBreaker:
+    def __init__(self, source: str, redis_url: Optional[str] = None, failure_threshold: int = 5,
+                 window: int = 60, base_cooldown: int = 30, max_cooldown: int = 1800):
+        self.source = source
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.key = f"breaker:{source}"
+        self.redis = None
+        if redis_url:
+            import redis
+            self.redis = redis.Redis.from_url(redis_url, socket_timeout=2, decode_responses=True)
+        self._local = {'state': {}, 'failures': (0, 0.0), 'probe': 0.0}
+        self._lock = threading.Lock()
+
+    # Storage: Redis first, this process as fallback
+
+    def _load(self) -> dict:
+        if self.redis is not None:
+            try:
+                return self.redis.hgetall(self.key)
+            except Exception as e:
+                logger.error(f"Error reading breaker {self.source}: {str(e)}")
+        with self._lock:
+            return dict(self._local['state'])
+
+    def _open(self, trips: int, open_until: float):
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.hset(self.key, mapping={'trips': trips, 'open_until': open_until})
+                pipe.delete(f"{self.key}:failures", f"{self.key}:probe")
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.error(f"Error opening breaker {self.source}: {str(e)}")
+        with self._lock:
+            self._local.update(state={'trips': trips, 'open_until': open_until}, failures=(0, 0.0), probe=0.0)
+
+    def _close(self):
+        if self.redis is not None:
+            try:
+                self.redis.delete(self.key, f"{self.key}:failures", f"{self.key}:probe")
+                return
+            except Exception as e:
+                logger.error(f"Error closing breaker {self.source}: {str(e)}")
+        with self._lock:
+            self._local.update(state={}, failures=(0, 0.0), probe=0.0)
+
+    def _count_failure(self) -> int:
+        """Failures within the current window, including this one"""
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.incr(f"{self.key}:failures")
+                pipe.ttl(f"{self.key}:failures")
+                count, ttl = pipe.execute()
+                # First failure of a window starts its clock
+                if ttl < 0:
+                    self.redis.expire(f"{self.key}:failures", self.window)
+                return count
+            except Exception as e:
+                logger.error(f"Error counting failure for breaker {self.source}: {str(e)}")
+        with self._lock:
+            count, started = self._local['failures']
+            now = time.monotonic()
+            if now - started > self.window:
+                count, started = 0, now
+            self._local['failures'] = (count + 1, started)
+            return count + 1
+
+    def _claim_probe(self, ttl: int) -> bool:
+        if self.redis is not None:
+            try:
+                return bool(self.redis.set(f"{self.key}:probe", 1, nx=True, ex=ttl))
+            except Exception as e:
+                logger.error(f"Error claiming probe for breaker {self.source}: {str(e)}")
+        with self._lock:
+            now = time.monotonic()
+            if self._local['probe'] > now:
+                return False
+            self._local['probe'] = now + ttl
+            return True
+
+    # Public API
+
+    def state(self, data: Optional[dict] = None) -> str:
+        data = self._load() if data is None else data
+        if not int(data.get('trips', 0)):
+            return CLOSED
+        return OPEN if time.time() < float(data.get('open_until', 0)) else HALF_OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open only one caller gets through"""
+        data = self._load()
+        state = self.state(data)
+        CIRCUIT_BREAKER_STATE.labels(self.source).set(STATE_VALUES[state])
+        if state == CLOSED:
+            return True
+        # A probe that never reports back frees the slot after one base cooldown
+        if state == HALF_OPEN and self._claim_probe(self.base_cooldown):
+            return True
+        CIRCUIT_BREAKER_SKIPPED.labels(self.source).inc()
+        return False
+
+    def record_success(self):
+        if self.state() != CLOSED:
+            self._close()
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        """Records a blocking failure (403/429, timeout, refused connection)"""
+        data = self._load()
+        state = self.state(data)
+        if state == CLOSED:
+            if self._count_failure() < self.failure_threshold:
+                return
+            trips = 1
+        else:
+            trips = int(data['trips']) + 1
+        cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (trips - 1))
+        self._open(trips, time.time() + cooldown)
+        self._transition(OPEN)
+        logger.warning(f"Circuit for {self.source} opened for {cooldown}s after repeated blocking failures")
+
+    def _transition(self, state: str):
+        CIRCUIT_BREAKER_STATE.labels(self.source).set(STATE_VALUES[state])
+        CIRCUIT_BREAKER_TRANSITIONS.labels(self.source, state).inc()
+
+
+_breakers: Dict[tuple, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(source: str, redis_url: Optional[str] = None) -> CircuitBreaker:
+    """Process-wide breaker per source, so collectors built per task share state"""
+    with _breakers_lock:
+        if (source, redis_url) not in _breakers:
+            _breakers[(source, redis_url)] = CircuitBreaker(source, redis_url)
+        return _breakers[(source, redis_url)]
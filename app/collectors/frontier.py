@@ -0,0 +1,361 @@
+"""Shared crawl frontier for scraped hosts.
+
+Fetches of company homepages and review sites are queued as jobs, one
+queue per host, each job scored by priority (lower goes first). Workers
+`claim` the best job among hosts that are eligible right now, that is, hosts
+with a free concurrency slot and whose crawl delay since the last claim has
+passed. They `release` it when the fetch is done. So no host sees more than
+its concurrency limit, or requests closer together than its delay, however
+many workers are running, and idle hosts never wait behind a busy one.
+
+Hosts are indexed twice. Eligible hosts sit in a zset scored by the priority
+of their best queued job, so a claim takes the global best in O(log n).
+Hosts waiting out their delay or a full set of leases sit in a zset scored
+by when they may be claimed again. Each claim first moves the waiting hosts
+whose time has come over to the eligible index.
+
+A lease that expires (its worker died mid-fetch) puts the job back on its
+host's queue at its old priority, up to `max_attempts` claims per job.
+
+State lives in Redis when a URL is given (claims are atomic Lua scripts),
+so every worker shares one frontier; without Redis (or if it is
+unreachable) each process keeps its own. The scripts touch per-host keys
+they only find at run time, which are not declared in KEYS, so the
+frontier needs a single Redis node (replicas are fine), not Redis Cluster.
+"""
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+Lease = namedtuple('Lease', ['host', 'job'])
+
+# Requeues the host's expired leases (or drops them after max_attempts claims); returns its active zset
+REAP = """
+local function reap(prefix, host, now, max_attempts)
+    local active = prefix .. ':active:' .. host
+    local leased = prefix .. ':leased:' .. host
+    for _, job in ipairs(redis.call('ZRANGEBYSCORE', active, '-inf', now)) do
+        redis.call('ZREM', active, job)
+        local priority = redis.call('HGET', leased, job)
+        redis.call('HDEL', leased, job)
+        local attempt = host .. ' ' .. job
+        if priority and redis.call('HINCRBY', prefix .. ':attempts', attempt, 1) < max_attempts then
+            redis.call('ZADD', prefix .. ':queue:' .. host, 'NX', priority, job)
+        else
+            redis.call('HDEL', prefix .. ':attempts', attempt)
+        end
+    end
+    return active
+end
+"""
+
+# KEYS[1] eligible zset (host -> best queued priority), KEYS[2] waiting zset (host -> ready time)
+# ARGV: now, host, job, priority, concurrency, delay, prefix, max attempts
+PUSH_SCRIPT = REAP + """
+local now, host, job, priority, prefix = tonumber(ARGV[1]), ARGV[2], ARGV[3], tonumber(ARGV[4]), ARGV[7]
+local concurrency, delay = tonumber(ARGV[5]), tonumber(ARGV[6])
+local queue = prefix .. ':queue:' .. host
+redis.call('ZADD', queue, priority, job)
+local head = redis.call('ZRANGE', queue, 0, 0, 'WITHSCORES')
+if redis.call('ZSCORE', KEYS[1], host) then
+    redis.call('ZADD', KEYS[1], head[2], host)
+elseif not redis.call('ZSCORE', KEYS[2], host) then
+    local active = reap(prefix, host, now, tonumber(ARGV[8]))
+    local started = tonumber(redis.call('HGET', prefix .. ':started', host))
+    local ready = started and started + delay or now
+    if redis.call('ZCARD', active) < concurrency and ready <= now then
+        redis.call('ZADD', KEYS[1], head[2], host)
+    else
+        -- Claim time checks the slots again
+        redis.call('ZADD', KEYS[2], math.max(now, ready), host)
+    end
+end
+"""
+
+# KEYS[1] eligible zset, KEYS[2] waiting zset
+# ARGV: now, lease_ttl, promotions, default concurrency, default delay, prefix, max attempts,
+#       then host, concurrency, delay triples for per-host limits
+CLAIM_SCRIPT = REAP + """
+local now, lease_ttl, prefix, max_attempts = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[6], tonumber(ARGV[7])
+local default = {tonumber(ARGV[4]), tonumber(ARGV[5])}
+local limits = {}
+for i = 8, #ARGV, 3 do limits[ARGV[i]] = {tonumber(ARGV[i + 1]), tonumber(ARGV[i + 2])} end
+
+for _, host in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, tonumber(ARGV[3]))) do
+    redis.call('ZREM', KEYS[2], host)
+    local active = reap(prefix, host, now, max_attempts)
+    local head = redis.call('ZRANGE', prefix .. ':queue:' .. host, 0, 0, 'WITHSCORES')
+    local leases = redis.call('ZCARD', active)
+    if #head == 0 and leases == 0 then
+        -- Idle until a push brings it back
+        redis.call('HDEL', prefix .. ':started', host)
+    elseif #head == 0 or leases >= (limits[host] or default)[1] then
+        -- Back when a lease expires, to requeue it or take the freed slot; release brings it back sooner
+        redis.call('ZADD', KEYS[2], redis.call('ZRANGE', active, 0, 0, 'WITHSCORES')[2], host)
+    else
+        redis.call('ZADD', KEYS[1], head[2], host)
+    end
+end
+
+local best = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+if not best then
+    return nil
+end
+local limit = limits[best] or default
+local queue = prefix .. ':queue:' .. best
+local active = prefix .. ':active:' .. best
+local head = redis.call('ZRANGE', queue, 0, 0, 'WITHSCORES')
+local job = head[1]
+redis.call('ZREM', queue, job)
+redis.call('ZREM', KEYS[1], best)
+redis.call('ZADD', active, now + lease_ttl, job)
+-- Kept until release so an expired lease can be requeued at its priority
+redis.call('HSET', prefix .. ':leased:' .. best, job, head[2])
+redis.call('HSET', prefix .. ':started', best, now)
+local ready = now + limit[2]
+if redis.call('ZCARD', active) >= limit[1] then
+    ready = math.max(ready, tonumber(redis.call('ZRANGE', active, 0, 0, 'WITHSCORES')[2]))
+end
+redis.call('ZADD', KEYS[2], ready, best)
+return {best, job}
+"""
+
+# KEYS[1] eligible zset, KEYS[2] waiting zset; ARGV: now, host, job, delay, prefix, max attempts
+RELEASE_SCRIPT = REAP + """
+local now, host, job, delay, prefix = tonumber(ARGV[1]), ARGV[2], ARGV[3], tonumber(ARGV[4]), ARGV[5]
+redis.call('ZREM', prefix .. ':active:' .. host, job)
+redis.call('HDEL', prefix .. ':leased:' .. host, job)
+redis.call('HDEL', prefix .. ':attempts', host .. ' ' .. job)
+local active = reap(prefix, host, now, tonumber(ARGV[6]))
+if redis.call('ZSCORE', KEYS[1], host) then
+    return
+end
+local ready = (tonumber(redis.call('HGET', prefix .. ':started', host)) or now) + delay
+if redis.call('ZCARD', prefix .. ':queue:' .. host) == 0 and redis.call('ZCARD', active) == 0 and ready <= now then
+    redis.call('ZREM', KEYS[2], host)
+    redis.call('HDEL', prefix .. ':started', host)
+else
+    -- Stays waiting so a later push still respects the delay
+    redis.call('ZADD', KEYS[2], math.max(now, ready), host)
+end
+"""
+
+
+def parse_host_limits(limits: str) -> Dict[str, Tuple[int, float]]:
+    """"host=concurrency:delay,..." -> {host: (concurrency, delay seconds)}"""
+    parsed = {}
+    for limit in filter(None, (limit.strip() for limit in limits.split(','))):
+        host, _, value = limit.partition('=')
+        concurrency, _, delay = value.partition(':')
+        try:
+            parsed[host.strip().lower()] = (int(concurrency), float(delay or 0))
+        except ValueError:
+            raise ValueError(f"Invalid crawl host limit {limit!r}, expected host=concurrency:delay")
+    return parsed
+
+
+class CrawlFrontier:
+    # Waiting hosts moved to the eligible index per claim
+    SCAN = 1000
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = 'frontier', concurrency: int = 2,
+                 delay: float = 1.0, host_limits: Optional[Dict[str, Tuple[int, float]]] = None,
+                 lease_ttl: float = 120.0, max_attempts: int = 3):
+        self.prefix = prefix
+        self.concurrency = concurrency
+        self.delay = delay
+        self.host_limits = host_limits or {}
+        # A worker that dies mid-fetch gives its slot back after this long
+        self.lease_ttl = lease_ttl
+        # Claims per job before an expired lease drops it instead of requeueing it
+        self.max_attempts = max_attempts
+        self.redis = None
+        if redis_url:
+            import redis
+            self.redis = redis.Redis.from_url(redis_url, socket_timeout=2, decode_responses=True)
+            self._push_script = self.redis.register_script(PUSH_SCRIPT)
+            self._claim_script = self.redis.register_script(CLAIM_SCRIPT)
+            self._release_script = self.redis.register_script(RELEASE_SCRIPT)
+        self._local = {
+            'queues': {}, 'eligible': {}, 'waiting': {}, 'active': {}, 'leased': {}, 'attempts': {}, 'started': {},
+            'wakeup': 0.0
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> 'CrawlFrontier':
+        return cls(
+            settings.redis_url,
+            concurrency=settings.crawl_concurrency,
+            delay=settings.crawl_delay,
+            host_limits=parse_host_limits(settings.crawl_host_limits)
+        )
+
+    def limits(self, host: str) -> Tuple[int, float]:
+        """(concurrency, delay seconds) for `host`"""
+        return self.host_limits.get(host, (self.concurrency, self.delay))
+
+    @property
+    def _keys(self):
+        return [f"{self.prefix}:eligible", f"{self.prefix}:waiting"]
+
+    def push(self, host: str, job: str, priority: float = 0.0):
+        """Queues `job` against `host`; a job already queued just takes the new priority"""
+        host = host.lower()
+        now = time.time()
+        concurrency, delay = self.limits(host)
+        if self.redis is not None:
+            try:
+                self._push_script(keys=self._keys, args=[
+                    now, host, job, priority, concurrency, delay, self.prefix, self.max_attempts
+                ])
+                return
+            except Exception as e:
+                logger.error(f"Error queueing crawl job {job} for {host}: {str(e)}")
+        with self._lock:
+            state = self._local
+            queue = state['queues'].setdefault(host, {})
+            queue[job] = priority
+            if host in state['eligible']:
+                state['eligible'][host] = min(queue.values())
+            elif host not in state['waiting']:
+                active = self._active_local(host, now)
+                started = state['started'].get(host)
+                ready = started + delay if started is not None else now
+                if len(active) < concurrency and ready <= now:
+                    state['eligible'][host] = min(queue.values())
+                else:
+                    state['waiting'][host] = max(now, ready)
+
+    def claim(self) -> Optional[Lease]:
+        """The highest-priority job on any host that may be crawled now, or None"""
+        now = time.time()
+        if self.redis is not None:
+            try:
+                args = [now, self.lease_ttl, self.SCAN, self.concurrency, self.delay, self.prefix, self.max_attempts]
+                for host, (concurrency, delay) in self.host_limits.items():
+                    args.extend((host, concurrency, delay))
+                claimed = self._claim_script(keys=self._keys, args=args)
+                return Lease(*claimed) if claimed else None
+            except Exception as e:
+                logger.error(f"Error claiming crawl job: {str(e)}")
+        with self._lock:
+            return self._claim_local(now)
+
+    def _active_local(self, host: str, now: float) -> dict:
+        """The host's leases, after requeueing the expired ones as the REAP script does"""
+        state = self._local
+        active = state['active'].setdefault(host, {})
+        leased = state['leased'].setdefault(host, {})
+        for job, expires in list(active.items()):
+            if expires > now:
+                continue
+            del active[job]
+            priority = leased.pop(job, None)
+            attempts = state['attempts'][(host, job)] = state['attempts'].get((host, job), 0) + 1
+            if priority is not None and attempts < self.max_attempts:
+                state['queues'].setdefault(host, {}).setdefault(job, priority)
+            else:
+                del state['attempts'][(host, job)]
+        return active
+
+    def _claim_local(self, now: float) -> Optional[Lease]:
+        state = self._local
+        due = sorted((ready, host) for host, ready in state['waiting'].items() if ready <= now)
+        for _, host in due[:self.SCAN]:
+            del state['waiting'][host]
+            active = self._active_local(host, now)
+            queue = state['queues'].get(host)
+            if not queue and not active:
+                state['started'].pop(host, None)
+            elif not queue or len(active) >= self.limits(host)[0]:
+                state['waiting'][host] = min(active.values())
+            else:
+                state['eligible'][host] = min(queue.values())
+        if not state['eligible']:
+            return None
+
+        host = min(state['eligible'], key=state['eligible'].get)
+        concurrency, delay = self.limits(host)
+        queue = state['queues'][host]
+        job = min(queue, key=queue.get)
+        queue_priority = queue.pop(job)
+        del state['eligible'][host]
+        active = state['active'].setdefault(host, {})
+        active[job] = now + self.lease_ttl
+        state['leased'].setdefault(host, {})[job] = queue_priority
+        state['started'][host] = now
+        ready = now + delay
+        if len(active) >= concurrency:
+            ready = max(ready, min(active.values()))
+        state['waiting'][host] = ready
+        return Lease(host, job)
+
+    def release(self, lease: Lease):
+        """Frees the lease's slot; its host becomes eligible again once the crawl delay has passed"""
+        now = time.time()
+        delay = self.limits(lease.host)[1]
+        if self.redis is not None:
+            try:
+                self._release_script(keys=self._keys, args=[
+                    now, lease.host, lease.job, delay, self.prefix, self.max_attempts
+                ])
+                return
+            except Exception as e:
+                logger.error(f"Error releasing crawl job {lease.job}: {str(e)}")
+        with self._lock:
+            state = self._local
+            state['active'].get(lease.host, {}).pop(lease.job, None)
+            state['leased'].get(lease.host, {}).pop(lease.job, None)
+            state['attempts'].pop((lease.host, lease.job), None)
+            active = self._active_local(lease.host, now)
+            if lease.host in state['eligible']:
+                return
+            ready = state['started'].get(lease.host, now) + delay
+            if not state['queues'].get(lease.host) and not active and ready <= now:
+                state['waiting'].pop(lease.host, None)
+                state['started'].pop(lease.host, None)
+            else:
+                # Stays waiting so a later push still respects the delay
+                state['waiting'][lease.host] = max(now, ready)
+
+    def next_ready_in(self) -> Optional[float]:
+        """Seconds until some host may be crawled again, None if nothing is queued or leased"""
+        if self.redis is not None:
+            try:
+                eligible, waiting = self._keys
+                if self.redis.zcard(eligible):
+                    return 0.0
+                head = self.redis.zrange(waiting, 0, 0, withscores=True)
+                return max(0.0, head[0][1] - time.time()) if head else None
+            except Exception as e:
+                logger.error(f"Error reading crawl frontier: {str(e)}")
+        with self._lock:
+            if self._local['eligible']:
+                return 0.0
+            if not self._local['waiting']:
+                return None
+            return max(0.0, min(self._local['waiting'].values()) - time.time())
+
+    def reserve_wakeup(self, delay: float) -> bool:
+        """Whether the caller should schedule a crawl in `delay` seconds, i.e. none is due sooner"""
+        at = time.time() + delay
+        if self.redis is not None:
+            try:
+                key = f"{self.prefix}:wakeup"
+                scheduled = self.redis.get(key)
+                if scheduled is not None and float(scheduled) <= at:
+                    return False
+                self.redis.set(key, at, px=max(1, int(delay * 1000)))
+                return True
+            except Exception as e:
+                logger.error(f"Error scheduling crawl wakeup: {str(e)}")
+        with self._lock:
+            if time.time() < self._local['wakeup'] <= at:
+                return False
+            self._local['wakeup'] = at
+            return True
@@ -1,57 +1,235 @@
-from github import Github
+from github import Github, RateLimitExceededException
 from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
+from ..cache import JSONCache
+from ..metrics import timed, record_error
+from .token_pool import GitHubTokenPool, StaticToken, TokensExhausted
 import logging
+import math
+import time
 
 logger = logging.getLogger(__name__)
 
+ISSUE_RESPONSE_QUERY = """
+query($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    issues(states: CLOSED, first: 100, orderBy: {field: UPDATED_AT, direction: DESC}) {
+      nodes { createdAt comments(first: 1) { nodes { createdAt } } }
+    }
+  }
+}
+"""
+
 class GitHubCollector:
-    def __init__(self, token):
-        self.github = Github(token)
+    # Weekly participation only changes once a week; a day keeps it fresh enough
+    PARTICIPATION_TTL = 24 * 3600
+    # Backoff (seconds) between retries while GitHub computes statistics (HTTP 202)
+    STATS_RETRY_DELAYS = (1, 2, 4)
+
+    # Closed issues sampled for the response time, and the page size they are listed with
+    ISSUE_SAMPLE = 100
+    PER_PAGE = 100
+
+    # API calls one collection can make at most, reserved from a token up front. Cheap: the
+    # repo, participation (plus its 202 retries), contributors and GraphQL calls. Full: the
+    # repo, contributors, commits and topics calls, the pages of sampled issues and one
+    # comments call per sampled issue
+    ESTIMATED_CALLS = {
+        True: 4 + len(STATS_RETRY_DELAYS),
+        False: 4 + math.ceil(ISSUE_SAMPLE / PER_PAGE) + ISSUE_SAMPLE,
+    }
+
+    def __init__(self, token=None, base_url="https://api.github.com", cheap=False, cache=None, pool=None):
+        self.pool = pool or GitHubTokenPool([StaticToken(token)])
+        self.base_url = base_url.rstrip('/')
+        self.cheap = cheap
+        self.cache = cache or JSONCache(prefix='github')
+        self._clients = {}
+
+    def _client(self, source) -> Github:
+        # Installation tokens rotate, so clients are keyed by the token itself
+        token = source.token()
+        if token not in self._clients:
+            self._clients[token] = Github(token, base_url=self.base_url, per_page=self.PER_PAGE)
+        return self._clients[token]
         
+    @timed('github')
     def collect_metrics(self, repo_url):
-        try:
-            # Extract repo name from URL
-            repo_name = repo_url.split('github.com/')[-1]
-            repo = self.github.get_repo(repo_name)
-            
-            # Collect basic metrics
-            metrics = {
-                'stars': repo.stargazers_count,
-                'forks': repo.forks_count,
-                'contributors': repo.get_contributors().totalCount,
-                'commit_frequency': self._calculate_commit_frequency(repo),
-                'issue_response_time': self._calculate_response_time(repo),
-                'raw_data': {
-                    'description': repo.description,
-                    'language': repo.language,
-                    'topics': repo.get_topics(),
-                    'open_issues': repo.open_issues_count,
-                    'watchers': repo.subscribers_count,
-                    'last_update': repo.updated_at.isoformat()
-                }
+        """
+        Collects with the pooled token that has the most headroom, moving on
+        to the next one if a token runs dry mid-collection. Raises
+        TokensExhausted when no token has calls left.
+        """
+        for _ in range(self.pool.size):
+            source = self.pool.acquire(self.ESTIMATED_CALLS[self.cheap])
+            github = self._client(source)
+            try:
+                return self._collect(github, repo_url)
+            except RateLimitExceededException as e:
+                logger.warning(f"GitHub token {source.key} exhausted: {str(e)}")
+                # Connection-level failures carry no headers
+                self.pool.update(source, 0, float((e.headers or {}).get('x-ratelimit-reset', time.time() + 60)))
+                continue
+            except Exception as e:
+                logger.error(f"Error collecting GitHub metrics: {str(e)}")
+                record_error('github', 'collect_metrics')
+                return None
+            finally:
+                self._record_rate_limit(source, github)
+        raise TokensExhausted(time.time() + 60)
+
+    def _collect(self, github, repo_url):
+        # Extract repo name from URL
+        repo_name = repo_url.split('github.com/')[-1]
+        repo = github.get_repo(repo_name)
+        
+        if self.cheap:
+            return self._collect_cheap(repo)
+        
+        # Collect basic metrics
+        return {
+            'stars': repo.stargazers_count,
+            'forks': repo.forks_count,
+            'contributors': repo.get_contributors().totalCount,
+            'commit_frequency': self._calculate_commit_frequency(repo),
+            'issue_response_time': self._calculate_response_time(repo),
+            'raw_data': {
+                'description': repo.description,
+                'language': repo.language,
+                'topics': repo.get_topics(),
+                'open_issues': repo.open_issues_count,
+                'watchers': repo.subscribers_count,
+                'last_update': repo.updated_at.isoformat()
             }
+        }
+
+    def _collect_cheap(self, repo):
+        """
+        Constant-cost collection: the repo call, one participation call
+        (cached), one per_page=1 contributors call and one GraphQL query,
+        instead of paging commits, contributors and issue comments.
+        """
+        weekly_commits = self._get_weekly_commits(repo)
+        return {
+            'stars': repo.stargazers_count,
+            'forks': repo.forks_count,
+            # Same count as full mode's get_contributors(): anonymous contributors excluded
+            'contributors': self._count_via_link(repo, '/contributors'),
+            # Last four weeks of participation, as average daily commits
+            'commit_frequency': sum(weekly_commits[-4:]) / 28 if weekly_commits else 0,
+            'issue_response_time': self._calculate_response_time_graphql(repo),
+            'raw_data': {
+                'description': repo.description,
+                'language': repo.language,
+                'topics': repo.raw_data.get('topics', []),
+                'open_issues': repo.open_issues_count,
+                'watchers': repo.subscribers_count,
+                'last_update': repo.updated_at.isoformat(),
+                'weekly_commits': weekly_commits
+            }
+        }
+
+    def _count_via_link(self, repo, path, params=None):
+        """Total item count from a per_page=1 request and its Link: rel="last" page number"""
+        try:
+            headers, data = repo._requester.requestJsonAndCheck(
+                "GET", repo.url + path, parameters={**(params or {}), 'per_page': 1}
+            )
+            for link in headers.get('link', '').split(','):
+                target, _, rel = link.partition(';')
+                if 'rel="last"' in rel:
+                    query = parse_qs(urlparse(target.strip(' <>')).query)
+                    return int(query['page'][0])
+            return len(data) if data else 0
+        except RateLimitExceededException:
+            raise
+        except Exception as e:
+            logger.error(f"Error counting {path}: {str(e)}")
+            record_error('github', '_count_via_link')
+            return 0
+
+    @timed('github')
+    def _get_weekly_commits(self, repo):
+        """52 weeks of commit counts from the participation statistics endpoint"""
+        key = f"participation:{repo.full_name}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            for delay in (*self.STATS_RETRY_DELAYS, None):
+                # PyGithub returns None while GitHub answers 202 (still computing)
+                stats = repo.get_stats_participation()
+                if stats is not None:
+                    self.cache.set(key, stats.all, self.PARTICIPATION_TTL)
+                    return stats.all
+                if delay is not None:
+                    time.sleep(delay)
+            logger.warning(f"Participation stats for {repo.full_name} still computing")
+            return []
+        except RateLimitExceededException:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching participation stats: {str(e)}")
+            record_error('github', '_get_weekly_commits')
+            return []
+
+    @timed('github')
+    def _calculate_response_time_graphql(self, repo):
+        """Average hours to first comment on the last 100 closed issues, in one GraphQL call"""
+        try:
+            graphql_url = self.base_url[:-3] + 'graphql' if self.base_url.endswith('/v3') else self.base_url + '/graphql'
+            owner, name = repo.full_name.split('/', 1)
+            _, data = repo._requester.requestJsonAndCheck(
+                "POST", graphql_url,
+                input={'query': ISSUE_RESPONSE_QUERY, 'variables': {'owner': owner, 'name': name}}
+            )
+            response_times = []
+            for issue in data['data']['repository']['issues']['nodes']:
+                comments = issue['comments']['nodes']
+                if comments:
+                    created = datetime.fromisoformat(issue['createdAt'].replace('Z', '+00:00'))
+                    answered = datetime.fromisoformat(comments[0]['createdAt'].replace('Z', '+00:00'))
+                    response_times.append((answered - created).total_seconds() / 3600)
             
-            return metrics
+            return sum(response_times) / len(response_times) if response_times else 0
             
+        except RateLimitExceededException:
+            raise
+        except Exception as e:
+            logger.error(f"Error calculating response time via GraphQL: {str(e)}")
+            record_error('github', '_calculate_response_time_graphql')
+            return 0
+
+    def _record_rate_limit(self, source, github):
+        # PyGithub keeps the X-RateLimit-* headers of the last response. Only
+        # when nothing was answered does it ask /rate_limit, which GitHub
+        # doesn't count against the budget
+        try:
+            remaining, _ = github.rate_limiting
+            self.pool.update(source, remaining, github.rate_limiting_resettime)
         except Exception as e:
-            logger.error(f"Error collecting GitHub metrics: {str(e)}")
-            return None
+            logger.error(f"Error reading GitHub rate limit for {source.key}: {str(e)}")
             
+    @timed('github')
     def _calculate_commit_frequency(self, repo):
         try:
             since = datetime.now() - timedelta(days=30)
             commits = repo.get_commits(since=since)
             return commits.totalCount / 30  # Average daily commits
+        except RateLimitExceededException:
+            raise
         except Exception as e:
             logger.error(f"Error calculating commit frequency: {str(e)}")
+            record_error('github', '_calculate_commit_frequency')
             return 0
             
+    @timed('github')
     def _calculate_response_time(self, repo):
         try:
             issues = repo.get_issues(state='closed', sort='updated')
             response_times = []
             
-            for issue in issues[:100]:  # Sample last 100 issues
+            for issue in issues[:self.ISSUE_SAMPLE]:
                 if issue.comments > 0:
                     first_comment = issue.get_comments()[0]
                     response_time = (first_comment.created_at - issue.created_at).total_seconds() / 3600
@@ -59,6 +237,9 @@ class GitHubCollector:
             
             return sum(response_times) / len(response_times) if response_times else 0
             
+        except RateLimitExceededException:
+            raise
         except Exception as e:
             logger.error(f"Error calculating response time: {str(e)}")
+            record_error('github', '_calculate_response_time')
             return 0
\ No newline at end of file
@@ -1,24 +1,168 @@
 import aiohttp
+import requests
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
-from bs4 import BeautifulSoup
 from pytrends.request import TrendReq
+from pytrends.exceptions import ResponseError
 from fake_useragent import UserAgent
 import asyncio
 import json
 import re
 from urllib.parse import urlparse
+from ..cache import JSONCache
+from ..domains import canonical_host, registrable_domain, brand_name
+from ..metrics import timed, record_error
+from .breaker import get_breaker, BLOCKING_STATUSES
 
 logger = logging.getLogger(__name__)
 
+# (category, tool, substrings any of which in the homepage HTML means the tool is present).
+# Stored homepage snapshots can be re-run against a changed set with
+# `python -m app.snapshots redetect` instead of refetching every site.
+TECH_SIGNATURES = (
+    ('analytics', 'Google Analytics', ('ga.js', 'analytics.js', 'gtag')),
+    ('advertising', 'Google AdSense', ('googlesyndication',)),
+    ('advertising', 'Google Ads', ('doubleclick',)),
+    ('marketing_tools', 'HubSpot', ('hubspot',)),
+    ('marketing_tools', 'Marketo', ('marketo',)),
+)
+
+def detect_tech_stack(html: str) -> Dict[str, Any]:
+    """Marketing and analytics tools whose signatures appear in `html`"""
+    tech_stack = {
+        'analytics': [],
+        'advertising': [],
+        'marketing_tools': []
+    }
+    for category, tool, patterns in TECH_SIGNATURES:
+        if any(pattern in html for pattern in patterns):
+            tech_stack[category].append(tool)
+    return tech_stack
+
+def calculate_efficiency(raw_data: Dict) -> float:
+    """
+    Marketing efficiency score (0-100) from the Tranco rank, recent Trends
+    interest and tech stack diversity in a marketing `raw_data` payload
+    """
+    try:
+        efficiency_score = 0
+        weights = {
+            'rank_score': 0.4,
+            'trend_score': 0.3,
+            'tech_diversity': 0.3
+        }
+        
+        # 1. Rank Score (inverse of rank percentile)
+        rank = (raw_data.get('tranco') or {}).get('rank')
+        if rank:
+            rank_score = max(0, 100 - (rank / 1000000 * 100))  # Assumes top 1M websites
+        else:
+            rank_score = 0
+            
+        # 2. Trend Score
+        trends_data = raw_data.get('trends', {})
+        trend_score = 0
+        if trends_data and trends_data.get('interest_over_time'):
+            recent_trends = trends_data['interest_over_time'][-4:]
+            trend_score = sum(recent_trends) / len(recent_trends)
+            
+        # 3. Tech Stack Diversity
+        tech_data = raw_data.get('tech_stack') or {}
+        total_tools = sum(len(tools) for tools in tech_data.values())
+        tech_score = min(100, total_tools * 20)  # 5 tools = 100%
+        
+        # Calculate weighted final score
+        efficiency_score = (
+            rank_score * weights['rank_score'] +
+            trend_score * weights['trend_score'] +
+            tech_score * weights['tech_diversity']
+        )
+        
+        return min(max(efficiency_score, 0), 100)
+        
+    except Exception as e:
+        logger.error(f"Error calculating efficiency score: {str(e)}")
+        return 0.0
+
 class MarketingEstimator:
-    def __init__(self):
+    TRANCO_URL = "https://tranco-list.eu/api/ranks/domain/{domain}"
+    HOMEPAGE_URL = "https://{domain}"
+    TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+    # Per-domain result lifetimes (seconds); the Tranco list is rebuilt daily
+    RESOLVE_TTL = 24 * 3600
+    TRANCO_TTL = 24 * 3600
+    TRENDS_TTL = 12 * 3600
+    TECH_STACK_TTL = 6 * 3600
+
+    def __init__(self, redis_url=None, cache=None, keep_homepages=False):
+        """With `keep_homepages`, every homepage fetched is kept in `homepages` as (url, html)"""
         self.ua = UserAgent()
-        self.pytrends = TrendReq()
+        self.pytrends = TrendReq(timeout=(3, 10))
+        self.breakers = {source: get_breaker(source, redis_url) for source in ('tranco', 'trends')}
+        self.cache = cache or JSONCache(redis_url, prefix='domains')
+        self.keep_homepages = keep_homepages
+        self.homepages = []
+
+    async def resolve_host(self, website: str) -> Optional[str]:
+        """Canonical host of `website` after following homepage redirects"""
+        resolved = await self.resolve(website)
+        return resolved['host'] if resolved else None
+
+    async def resolve(self, website: str) -> Optional[Dict[str, str]]:
+        """
+        {'host': canonical host after following homepage redirects,
+         'url': homepage URL the redirects landed on}
+        """
+        host = canonical_host(website)
+        if not host:
+            return None
+        resolved = await self.cache.get_or_fetch(
+            f"resolve:{host}", self.RESOLVE_TTL, lambda: self._resolve_redirects(host)
+        )
+        if isinstance(resolved, str):
+            # Cached before resolution kept the homepage URL
+            resolved = {'host': resolved, 'url': self.HOMEPAGE_URL.format(domain=resolved)}
+        return resolved
+
+    @timed('marketing')
+    async def _resolve_redirects(self, host: str) -> Dict[str, str]:
+        headers = {'User-Agent': self.ua.random}
+        # Canonical hosts drop www, and some sites only answer on www
+        for candidate in (host, f"www.{host}"):
+            url = self.HOMEPAGE_URL.format(domain=candidate)
+            try:
+                async with aiohttp.ClientSession(timeout=self.TIMEOUT) as session:
+                    async with session.head(url, headers=headers, allow_redirects=True) as response:
+                        final = response.url.host
+                        # Only a redirect to another host changes the domain
+                        if final and final != urlparse(url).hostname:
+                            return {'host': canonical_host(final) or host, 'url': str(response.url)}
+                        return {'host': host, 'url': str(response.url)}
+            except Exception as e:
+                error = e
+        logger.error(f"Error resolving redirects for {host}: {str(error)}")
+        record_error('marketing', '_resolve_redirects')
+        return {'host': host, 'url': self.HOMEPAGE_URL.format(domain=host)}
         
-    async def collect_metrics(self, domain: str) -> Dict[str, Any]:
+    @timed('marketing')
+    async def collect_metrics(self, domain: str, tech_data: Optional[Dict] = None,
+                              name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Tranco, Trends and homepage tech stack for a website URL or domain.
+        Pass an already known `tech_data` to skip fetching the homepage, and
+        the company `name` to search Trends for it instead of the domain's
+        brand label. Results are cached per domain.
+        """
         try:
+            resolved = await self.resolve(domain)
+            if not resolved:
+                logger.error(f"Invalid website: {domain!r}")
+                return None
+            host = resolved['host']
+            registrable = registrable_domain(host)
+            keyword = (name or brand_name(host)).strip().lower()
+            
             metrics = {
                 'estimated_spend': 0.0,
                 'channels': {},
@@ -26,10 +170,16 @@ class MarketingEstimator:
                 'raw_data': {}
             }
             
-            # Collect data from multiple free sources
-            tranco_data = await self._collect_tranco(domain)
-            trends_data = await self._collect_trends(domain)
-            tech_data = await self._collect_tech_stack(domain)
+            # Collect data from multiple free sources, skipping any whose circuit is open
+            skipped = [source for source, breaker in self.breakers.items() if not breaker.allow()]
+            tranco_data = await self.cache.get_or_fetch(
+                f"tranco:{registrable}", self.TRANCO_TTL, lambda: self._collect_tranco(registrable)
+            ) if 'tranco' not in skipped else None
+            trends_data = await self.cache.get_or_fetch(
+                f"trends:{keyword}", self.TRENDS_TTL, lambda: self._collect_trends(keyword)
+            ) if 'trends' not in skipped else None
+            if tech_data is None:
+                tech_data = await self._cached_tech_stack(resolved)
             
             if tranco_data:
                 metrics['raw_data']['tranco'] = tranco_data
@@ -46,37 +196,62 @@ class MarketingEstimator:
             # Calculate efficiency score
             metrics['efficiency_score'] = await self._calculate_efficiency(metrics)
             
+            if skipped:
+                metrics['partial'] = True
+                metrics['raw_data']['skipped_sources'] = skipped
+            
             return metrics
             
         except Exception as e:
             logger.error(f"Error collecting marketing metrics: {str(e)}")
+            record_error('marketing', 'collect_metrics')
             return None
 
+    @timed('marketing')
     async def _collect_tranco(self, domain: str) -> Dict[str, Any]:
         """Collect domain ranking from Tranco list API"""
+        breaker = self.breakers['tranco']
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"https://tranco-list.eu/api/ranks/domain/{domain}"
+            async with aiohttp.ClientSession(timeout=self.TIMEOUT) as session:
+                url = self.TRANCO_URL.format(domain=domain)
                 async with session.get(url) as response:
+                    if response.status in BLOCKING_STATUSES:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
                     if response.status == 200:
                         data = await response.json()
                         return {
                             'rank': data.get('rank'),
                             'last_updated': datetime.now().isoformat()
                         }
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            breaker.record_failure()
+            logger.error(f"Error collecting Tranco data for {domain}: {str(e)}")
+            record_error('marketing', '_collect_tranco')
+            return None
         except Exception as e:
             logger.error(f"Error collecting Tranco data for {domain}: {str(e)}")
+            record_error('marketing', '_collect_tranco')
             return None
 
-    async def _collect_trends(self, domain: str) -> Dict[str, Any]:
+    @timed('marketing')
+    async def _collect_trends(self, company_name: str) -> Dict[str, Any]:
         """Collect Google Trends data"""
+        breaker = self.breakers['trends']
         try:
-            # Remove TLD for better trend matching
-            company_name = domain.split('.')[0]
-            self.pytrends.build_payload([company_name], timeframe='today 3-m')
-            
-            interest_data = self.pytrends.interest_over_time()
-            related_queries = self.pytrends.related_queries()
+            try:
+                self.pytrends.build_payload([company_name], timeframe='today 3-m')
+                interest_data = self.pytrends.interest_over_time()
+                related_queries = self.pytrends.related_queries()
+            except ResponseError as e:
+                if e.response.status_code in BLOCKING_STATUSES:
+                    breaker.record_failure()
+                raise
+            except (requests.Timeout, requests.ConnectionError):
+                breaker.record_failure()
+                raise
+            breaker.record_success()
             
             return {
                 'interest_over_time': interest_data[company_name].tolist() if not interest_data.empty else [],
@@ -86,45 +261,38 @@ class MarketingEstimator:
                 }
             }
         except Exception as e:
-            logger.error(f"Error collecting Google Trends data for {domain}: {str(e)}")
+            logger.error(f"Error collecting Google Trends data for {company_name}: {str(e)}")
+            record_error('marketing', '_collect_trends')
+            return None
+
+    async def collect_tech_stack(self, domain: str) -> Dict[str, Any]:
+        """Detects marketing and analytics tools on the homepage only"""
+        resolved = await self.resolve(domain)
+        if not resolved:
+            logger.error(f"Invalid website: {domain!r}")
             return None
+        return await self._cached_tech_stack(resolved)
+
+    async def _cached_tech_stack(self, resolved: Dict[str, str]) -> Dict[str, Any]:
+        return await self.cache.get_or_fetch(
+            f"tech_stack:{resolved['host']}", self.TECH_STACK_TTL, lambda: self._collect_tech_stack(resolved['url'])
+        )
 
-    async def _collect_tech_stack(self, domain: str) -> Dict[str, Any]:
-        """Collect technology stack information"""
+    @timed('marketing')
+    async def _collect_tech_stack(self, url: str) -> Dict[str, Any]:
+        """Collect technology stack information from the resolved homepage URL"""
         try:
             headers = {'User-Agent': self.ua.random}
-            async with aiohttp.ClientSession() as session:
-                url = f"https://{domain}"
+            async with aiohttp.ClientSession(timeout=self.TIMEOUT) as session:
                 async with session.get(url, headers=headers) as response:
                     if response.status == 200:
                         html = await response.text()
-                        soup = BeautifulSoup(html, 'html.parser')
-                        
-                        tech_stack = {
-                            'analytics': [],
-                            'advertising': [],
-                            'marketing_tools': []
-                        }
-                        
-                        # Detect Analytics
-                        if 'ga.js' in html or 'analytics.js' in html or 'gtag' in html:
-                            tech_stack['analytics'].append('Google Analytics')
-                        
-                        # Detect Advertising
-                        if 'googlesyndication' in html:
-                            tech_stack['advertising'].append('Google AdSense')
-                        if 'doubleclick' in html:
-                            tech_stack['advertising'].append('Google Ads')
-                            
-                        # Detect Marketing Tools
-                        if 'hubspot' in html:
-                            tech_stack['marketing_tools'].append('HubSpot')
-                        if 'marketo' in html:
-                            tech_stack['marketing_tools'].append('Marketo')
-                            
-                        return tech_stack
+                        if self.keep_homepages:
+                            self.homepages.append((str(response.url), html))
+                        return detect_tech_stack(html)
         except Exception as e:
-            logger.error(f"Error collecting tech stack for {domain}: {str(e)}")
+            logger.error(f"Error collecting tech stack for {url}: {str(e)}")
+            record_error('marketing', '_collect_tech_stack')
             return None
 
     def _estimate_spend_from_rank(self, rank: int) -> float:
@@ -171,42 +339,4 @@ class MarketingEstimator:
 
     async def _calculate_efficiency(self, metrics: Dict) -> float:
         """Calculate marketing efficiency score using available metrics"""
-        try:
-            efficiency_score = 0
-            weights = {
-                'rank_score': 0.4,
-                'trend_score': 0.3,
-                'tech_diversity': 0.3
-            }
-            
-            # 1. Rank Score (inverse of rank percentile)
-            rank = metrics.get('raw_data', {}).get('tranco', {}).get('rank')
-            if rank:
-                rank_score = max(0, 100 - (rank / 1000000 * 100))  # Assumes top 1M websites
-            else:
-                rank_score = 0
-                
-            # 2. Trend Score
-            trends_data = metrics.get('raw_data', {}).get('trends', {})
-            trend_score = 0
-            if trends_data and trends_data.get('interest_over_time'):
-                recent_trends = trends_data['interest_over_time'][-4:]
-                trend_score = sum(recent_trends) / len(recent_trends)
-                
-            # 3. Tech Stack Diversity
-            tech_data = metrics.get('raw_data', {}).get('tech_stack', {})
-            total_tools = sum(len(tools) for tools in tech_data.values())
-            tech_score = min(100, total_tools * 20)  # 5 tools = 100%
-            
-            # Calculate weighted final score
-            efficiency_score = (
-                rank_score * weights['rank_score'] +
-                trend_score * weights['trend_score'] +
-                tech_score * weights['tech_diversity']
-            )
-            
-            return min(max(efficiency_score, 0), 100)
-            
-        except Exception as e:
-            logger.error(f"Error calculating efficiency score: {str(e)}")
-            return 0.0
\ No newline at end of file
+        return calculate_efficiency(metrics.get('raw_data', {}))
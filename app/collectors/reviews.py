@@ -1,70 +1,97 @@
 import requests
 from bs4 import BeautifulSoup
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import json
+import copy
 from textblob import TextBlob
 import re
 from urllib.parse import quote_plus
 import random
+from ..metrics import timed, record_error
+from .. import review_stats
+from .breaker import get_breaker, BLOCKING_STATUSES
 logger = logging.getLogger(__name__)
 
 class ReviewCollector:
-    def __init__(self):
+    SOURCES = ('g2', 'capterra')
+    G2_URL = "https://www.g2.com/products/{name}/reviews"
+    CAPTERRA_URL = "https://www.capterra.com/p/{name}/reviews"
+    # (connect, read) seconds
+    TIMEOUT = (3, 10)
+
+    def __init__(self, redis_url=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
+        self.breakers = {source: get_breaker(source, redis_url) for source in ('g2', 'capterra')}
         
-    def collect_metrics(self, company_name: str) -> Dict[str, Any]:
+    @timed('reviews')
+    def collect_metrics(self, company_name: str, analyze: bool = True) -> Dict[str, Any]:
+        """
+        Scrapes G2 and Capterra. With `analyze=False` the CPU-heavy NPS and
+        sentiment scoring is left to a later `analyze` call.
+        """
         try:
-            metrics = {
-                'nps_score': 0.0,
-                'review_count': 0,
-                'average_rating': 0.0,
-                'sentiment_score': 0.0,
-                'raw_data': {}
+            # Collect from multiple sources, skipping any whose circuit is open
+            skipped = [source for source, breaker in self.breakers.items() if not breaker.allow()]
+            raw_data = {
+                source: self.collect_source(source, company_name)
+                for source in self.SOURCES if source not in skipped
             }
-            
-            # Collect from multiple sources
-            g2_data = self._collect_g2(company_name)
-            capterra_data = self._collect_capterra(company_name)
-            
-            if g2_data:
-                metrics['raw_data']['g2'] = g2_data
-                metrics['review_count'] += g2_data['review_count']
-                metrics['average_rating'] = (
-                    (metrics['average_rating'] * metrics['review_count'] + 
-                     g2_data['rating'] * g2_data['review_count']) /
-                    (metrics['review_count'] + g2_data['review_count'])
-                )
-            
-            if capterra_data:
-                metrics['raw_data']['capterra'] = capterra_data
-                metrics['review_count'] += capterra_data['review_count']
-                metrics['average_rating'] = (
-                    (metrics['average_rating'] * metrics['review_count'] + 
-                     capterra_data['rating'] * capterra_data['review_count']) /
-                    (metrics['review_count'] + capterra_data['review_count'])
-                )
-            
-            # Calculate NPS from raw review data
-            metrics['nps_score'] = self._calculate_nps(metrics['raw_data'])
-            metrics['sentiment_score'] = self._calculate_sentiment(metrics['raw_data'])
-            
-            return metrics
+            return self.summarize(raw_data, skipped, analyze)
             
         except Exception as e:
             logger.error(f"Error collecting review metrics: {str(e)}")
+            record_error('reviews', 'collect_metrics')
             return None
+
+    def source_url(self, source: str, company_name: str) -> str:
+        template = self.G2_URL if source == 'g2' else self.CAPTERRA_URL
+        return template.format(name=quote_plus(company_name.lower()))
+
+    def collect_source(self, source: str, company_name: str) -> Dict[str, Any]:
+        """Review data from one source, or None"""
+        return self._collect_g2(company_name) if source == 'g2' else self._collect_capterra(company_name)
+
+    def summarize(self, raw_data: Dict[str, Any], skipped: List[str] = (), analyze: bool = True) -> Dict[str, Any]:
+        """Review metrics from per-source data collected separately (e.g. one crawl job per source)"""
+        metrics = {
+            'nps_score': 0.0,
+            'review_count': 0,
+            'average_rating': 0.0,
+            'sentiment_score': 0.0,
+            'raw_data': {}
+        }
+        for source in self.SOURCES:
+            if raw_data.get(source):
+                metrics['raw_data'][source] = raw_data[source]
+        
+        # Rating of each source weighted by its review count
+        collected = list(metrics['raw_data'].values())
+        metrics['review_count'] = sum(data['review_count'] for data in collected)
+        if metrics['review_count']:
+            metrics['average_rating'] = sum(
+                data['rating'] * data['review_count'] for data in collected
+            ) / metrics['review_count']
+        
+        if analyze:
+            metrics = self.analyze(metrics)
+        
+        if skipped:
+            metrics['partial'] = True
+            metrics['raw_data']['skipped_sources'] = list(skipped)
+        
+        return metrics
             
+    @timed('reviews')
     def _collect_g2(self, company_name: str) -> Dict[str, Any]:
         """
         Collects review data from G2
         """
         try:
             # Construct G2 URL
-            encoded_name = quote_plus(company_name.lower())
-            url = f"https://www.g2.com/products/{encoded_name}/reviews"
+            url = self.source_url('g2', company_name)
             
             # Make request with rotating user agents
             headers = {
@@ -77,8 +104,7 @@ class ReviewCollector:
                 'Upgrade-Insecure-Requests': '1',
             }
             
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            response = self._get('g2', url, headers)
             
             soup = BeautifulSoup(response.content, 'html.parser')
             
@@ -119,16 +145,17 @@ class ReviewCollector:
             
         except Exception as e:
             logger.error(f"Error collecting G2 data for {company_name}: {str(e)}")
+            record_error('reviews', '_collect_g2')
             return None
 
+    @timed('reviews')
     def _collect_capterra(self, company_name: str) -> Dict[str, Any]:
         """
         Collects review data from Capterra
         """
         try:
             # Construct Capterra URL
-            encoded_name = quote_plus(company_name.lower())
-            url = f"https://www.capterra.com/p/{encoded_name}/reviews"
+            url = self.source_url('capterra', company_name)
             
             headers = {
                 'User-Agent': self._get_random_user_agent(),
@@ -140,8 +167,7 @@ class ReviewCollector:
                 'Upgrade-Insecure-Requests': '1',
             }
             
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            response = self._get('capterra', url, headers)
             
             soup = BeautifulSoup(response.content, 'html.parser')
             
@@ -186,95 +212,62 @@ class ReviewCollector:
             
         except Exception as e:
             logger.error(f"Error collecting Capterra data for {company_name}: {str(e)}")
+            record_error('reviews', '_collect_capterra')
             return None
 
-    def _calculate_nps(self, raw_data: Dict) -> float:
+    def analyze(self, metrics: Dict[str, Any], aggregates: Optional[Dict[str, dict]] = None) -> Dict[str, Any]:
         """
-        Calculates NPS score from review data
-        NPS = % Promoters - % Detractors
-        Promoters: 9-10
-        Passives: 7-8
-        Detractors: 0-6
+        Folds the newly scraped reviews into the per-source aggregates
+        (`aggregates`, {source: aggregate} as last stored) and derives NPS,
+        average rating and sentiment from them. Only reviews no earlier
+        scrape has folded are scored. The updated aggregates are
+        returned under `metrics['aggregates']`.
         """
+        aggregates = copy.deepcopy(aggregates or {})
+        for source in self.SOURCES:
+            data = metrics['raw_data'].get(source)
+            if not data:
+                # Not collected this time: the stored aggregate stands
+                continue
+            aggregate = aggregates.get(source) or review_stats.empty()
+            review_stats.fold(aggregate, data['reviews'], self._sentiment)
+            aggregates[source] = aggregate
+        
+        metrics.update(review_stats.headline(aggregates.values()))
+        metrics['aggregates'] = aggregates
+        return metrics
+
+    def _get(self, source: str, url: str, headers: Dict[str, str]) -> requests.Response:
+        """GET that reports blocking (403/429, timeouts) to the source's circuit breaker"""
+        breaker = self.breakers[source]
         try:
-            all_reviews = []
-            
-            # Combine reviews from all sources
-            for source, data in raw_data.items():
-                if data and 'reviews' in data:
-                    all_reviews.extend(data['reviews'])
-            
-            if not all_reviews:
-                return 0.0
-            
-            # Count promoters, passives, and detractors
-            promoters = sum(1 for r in all_reviews if r['rating'] >= 9)
-            detractors = sum(1 for r in all_reviews if r['rating'] <= 6)
-            total_responses = len(all_reviews)
-            
-            if total_responses == 0:
-                return 0.0
-            
-            # Calculate NPS
-            promoter_percentage = (promoters / total_responses) * 100
-            detractor_percentage = (detractors / total_responses) * 100
-            
-            nps = promoter_percentage - detractor_percentage
-            
-            # NPS ranges from -100 to 100
-            return max(min(nps, 100), -100)
-            
-        except Exception as e:
-            logger.error(f"Error calculating NPS: {str(e)}")
-            return 0.0
+            response = requests.get(url, headers=headers, timeout=self.TIMEOUT)
+        except (requests.Timeout, requests.ConnectionError):
+            breaker.record_failure()
+            raise
+        
+        if response.status_code in BLOCKING_STATUSES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        response.raise_for_status()
+        return response
 
-    def _calculate_sentiment(self, raw_data: Dict) -> float:
-        """
-        Calculates sentiment score from review text using TextBlob
-        Returns score from 0 to 100 where:
-        0-40: Negative
-        40-60: Neutral
-        60-100: Positive
-        """
+    def _sentiment(self, review: Dict[str, Any]) -> Optional[float]:
+        """TextBlob polarity (-1 to 1) of a review's text, pros and cons; None if it has no text"""
+        text = review.get('text', '')
+        if 'pros' in review:
+            text += ' ' + review['pros']
+        if 'cons' in review:
+            text += ' ' + review['cons']
+        
+        if not text.strip():
+            return None
         try:
-            all_reviews = []
-            
-            # Combine reviews from all sources
-            for source, data in raw_data.items():
-                if data and 'reviews' in data:
-                    all_reviews.extend(data['reviews'])
-            
-            if not all_reviews:
-                return 50.0  # Neutral score if no reviews
-            
-            # Calculate sentiment for each review
-            sentiments = []
-            for review in all_reviews:
-                # Combine all text fields
-                text = review.get('text', '')
-                if 'pros' in review:
-                    text += ' ' + review['pros']
-                if 'cons' in review:
-                    text += ' ' + review['cons']
-                    
-                if text.strip():
-                    # Use TextBlob for sentiment analysis
-                    blob = TextBlob(text)
-                    # Polarity ranges from -1 to 1
-                    sentiments.append(blob.sentiment.polarity)
-            
-            if not sentiments:
-                return 50.0
-            
-            # Calculate average sentiment and convert to 0-100 scale
-            avg_sentiment = sum(sentiments) / len(sentiments)
-            scaled_sentiment = (avg_sentiment + 1) * 50  # Convert -1,1 to 0,100
-            
-            return scaled_sentiment
-            
+            return TextBlob(text).sentiment.polarity
         except Exception as e:
             logger.error(f"Error calculating sentiment: {str(e)}")
-            return 50.0
+            return None
 
     def _get_random_user_agent(self) -> str:
         """
@@ -0,0 +1,201 @@
+"""Quota-aware pool of GitHub credentials.
+
+Every credential (personal access token or GitHub App installation) has its
+own hourly budget. The remaining calls and reset time of each one are kept
+in Redis, so all workers see the same picture: a collection acquires the
+credential with the most headroom and reserves its estimated cost up front
+in one atomic step (a Lua script, so concurrent workers never overshoot the
+reserve), then writes back the real `X-RateLimit-Remaining` / `X-RateLimit-Reset` values
+when it finishes. When every credential is drained, `acquire` raises
+`TokensExhausted` carrying the earliest reset so callers can park the work.
+"""
+from typing import Dict, List, Optional
+import logging
+import threading
+import time
+from ..metrics import token_id, GITHUB_RATE_LIMIT_REMAINING
+
+logger = logging.getLogger(__name__)
+
+# KEYS: one rate limit hash per credential; ARGV: now, cost, reserve, default limit.
+# Returns {1-based index of the credential picked, or 0 if none can afford
+# `cost`; its reset, or the earliest reset if none}
+ACQUIRE_SCRIPT = """
+local now, cost, reserve, default = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local best, best_remaining, best_reset, retry_at
+for i, key in ipairs(KEYS) do
+    local state = redis.call('HMGET', key, 'remaining', 'reset')
+    local reset = tonumber(state[2]) or 0
+    local remaining = default
+    if reset > now then
+        remaining = tonumber(state[1]) or default
+    end
+    if remaining - reserve < cost then
+        if not retry_at or reset < retry_at then
+            retry_at = reset
+        end
+    elseif not best or remaining > best_remaining then
+        best, best_remaining, best_reset = i, remaining, reset
+    end
+end
+if not best then
+    return {0, tostring(retry_at)}
+end
+if best_reset > now then
+    redis.call('HINCRBY', KEYS[best], 'remaining', -cost)
+else
+    -- New window: assume a full budget until the first response says otherwise
+    redis.call('HSET', KEYS[best], 'remaining', default - cost, 'reset', tostring(now + 3600))
+    redis.call('EXPIREAT', KEYS[best], math.floor(now) + 7200)
+end
+return {best, tostring(best_reset)}
+"""
+
+
+class TokensExhausted(Exception):
+    def __init__(self, retry_at: float):
+        super().__init__(f"All GitHub tokens drained until {time.ctime(retry_at)}")
+        self.retry_at = retry_at
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, int(self.retry_at - time.time()) + 1)
+
+
+class StaticToken:
+    """Personal access token"""
+
+    def __init__(self, token: str):
+        self.key = token_id(token)
+        self._token = token
+
+    def token(self) -> str:
+        return self._token
+
+
+class InstallationToken:
+    """GitHub App installation; the access token is minted on demand and renewed before it expires"""
+
+    def __init__(self, app_id: int, private_key: str, installation_id: int,
+                 base_url: str = "https://api.github.com"):
+        from github import GithubIntegration
+
+        self.key = f"app-{installation_id}"
+        self.installation_id = installation_id
+        self.integration = GithubIntegration(app_id, private_key, base_url=base_url)
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def token(self) -> str:
+        with self._lock:
+            if self._token is None or self._expires_at - time.time() < 300:
+                authorization = self.integration.get_access_token(self.installation_id)
+                self._token = authorization.token
+                self._expires_at = authorization.expires_at.timestamp()
+            return self._token
+
+
+class GitHubTokenPool:
+    # Hourly budget assumed for a credential we haven't seen a response for yet
+    DEFAULT_LIMIT = 5000
+    # Calls left untouched on every credential, so manual use never hits zero
+    RESERVE = 50
+
+    def __init__(self, sources: List, redis_url: Optional[str] = None, prefix: str = 'github:ratelimit'):
+        if not sources:
+            raise ValueError("GitHub token pool needs at least one token")
+        self.sources = sources
+        self.prefix = prefix
+        self.redis = None
+        if redis_url:
+            import redis
+            self.redis = redis.Redis.from_url(redis_url, socket_timeout=2, decode_responses=True)
+            self._acquire_script = self.redis.register_script(ACQUIRE_SCRIPT)
+        self._local: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> 'GitHubTokenPool':
+        tokens = [settings.github_token] + [token.strip() for token in settings.github_tokens.split(',')]
+        sources = [StaticToken(token) for token in dict.fromkeys(tokens) if token]
+        if settings.github_app_id and settings.github_app_private_key:
+            for installation_id in settings.github_app_installation_ids.split(','):
+                if installation_id.strip():
+                    sources.append(InstallationToken(
+                        settings.github_app_id,
+                        settings.github_app_private_key,
+                        int(installation_id),
+                        base_url=settings.github_api_url
+                    ))
+        return cls(sources, settings.redis_url)
+
+    @property
+    def size(self) -> int:
+        return len(self.sources)
+
+    def _key(self, source) -> str:
+        return f"{self.prefix}:{source.key}"
+
+    def _save(self, source, remaining: int, reset: float):
+        state = {'remaining': remaining, 'reset': reset}
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.hset(self._key(source), mapping=state)
+                # Stale state is worthless after the window closes
+                pipe.expireat(self._key(source), int(reset) + 3600)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.error(f"Error writing GitHub rate limit: {str(e)}")
+        with self._lock:
+            self._local[source.key] = state
+
+    def acquire(self, cost: int = 1):
+        """
+        Picks the credential with the most calls left and reserves `cost`
+        of them. Raises TokensExhausted if none can afford it.
+        """
+        now = time.time()
+        if self.redis is not None:
+            try:
+                index, reset = self._acquire_script(
+                    keys=[self._key(source) for source in self.sources],
+                    args=[now, cost, self.RESERVE, self.DEFAULT_LIMIT]
+                )
+            except Exception as e:
+                logger.error(f"Error reserving GitHub rate limit: {str(e)}")
+            else:
+                if not int(index):
+                    raise TokensExhausted(float(reset))
+                return self.sources[int(index) - 1]
+        with self._lock:
+            return self._acquire_local(now, cost)
+
+    def _acquire_local(self, now: float, cost: int):
+        best, best_remaining, retry_at = None, None, None
+        for source in self.sources:
+            state = self._local.get(source.key, {})
+            reset = float(state.get('reset', 0))
+            remaining = int(state.get('remaining', self.DEFAULT_LIMIT)) if reset > now else self.DEFAULT_LIMIT
+            if remaining - self.RESERVE < cost:
+                retry_at = reset if retry_at is None else min(retry_at, reset)
+                continue
+            if best_remaining is None or remaining > best_remaining:
+                best, best_remaining, best_reset = source, remaining, reset
+
+        if best is None:
+            raise TokensExhausted(retry_at)
+        if best_reset > now:
+            self._local[best.key]['remaining'] = best_remaining - cost
+        else:
+            self._local[best.key] = {'remaining': self.DEFAULT_LIMIT - cost, 'reset': now + 3600}
+        return best
+
+    def update(self, source, remaining: int, reset: float):
+        """Records the rate limit headers of the last response made with `source`"""
+        if remaining < 0 or not reset:
+            return
+        self._save(source, remaining, reset)
+        GITHUB_RATE_LIMIT_REMAINING.labels(source.key).set(remaining)
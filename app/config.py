@@ -3,40 +3,40 @@ from typing import Optional
 
 class Settings(BaseSettings):
     github_token: str
+    # Extra personal access tokens, comma-separated, pooled with github_token
+    github_tokens: str = ""
+    github_app_id: Optional[int]
+    github_app_private_key: Optional[str]
+    github_app_installation_ids: str = ""
+    github_api_url: str = "https://api.github.com"
+    github_cheap_mode: bool = False
     database_url: str
     redis_url: str
     semrush_api_key: Optional[str]
     similarweb_api_key: Optional[str]
+    history_raw_retention_days: int = 30
+    history_daily_retention_days: int = 180
+    similarity_refresh_seconds: int = 60
+    similarity_use_ann: bool = False
+    # Per-task queue overrides, "task=queue,task=queue" (see app/celery.py)
+    celery_task_routes: str = ""
+    # Crawl frontier politeness: slots per host and seconds between requests to it
+    crawl_concurrency: int = 2
+    crawl_delay: float = 1.0
+    # Per-host overrides, "host=concurrency:delay,..." e.g. "www.g2.com=4:0.5"
+    crawl_host_limits: str = ""
+    # Homepage snapshots kept for tech stack re-detection (see app/snapshots.py)
+    snapshots_per_host: int = 2
+    snapshot_max_bytes: int = 2 * 1024 ** 3
+    # Opt-in sampling profiler (see app/profiling.py); nothing is hooked up when off
+    profiling_enabled: bool = False
+    # Tasks profiled on every run, comma-separated names or "*"
+    profile_tasks: str = ""
+    profile_hz: int = 100
+    profile_threshold_seconds: float = 1.0
+    profile_dir: str = "profiles"
+    # Celery workers serve their own /metrics on this port; 0 turns it off
+    worker_metrics_port: int = 9808
     
     class Config:
-        env_file = ".env" = Column(JSON)
-    updated_at = Column(DateTime, default=datetime.utcnow)
-
-    company = relationship("Company", back_populates="github_metrics")
-
-class ReviewMetrics(Base):
-    __tablename__ = "review_metrics"
-
-    id = Column(Integer, primary_key=True, index=True)
-    company_id = Column(Integer, ForeignKey("companies.id"))
-    nps_score = Column(Float, default=0.0)
-    review_count = Column(Integer, default=0)
-    average_rating = Column(Float, default=0.0)
-    sentiment_score = Column(Float, default=0.0)
-    raw_data = Column(JSON)
-    updated_at = Column(DateTime, default=datetime.utcnow)
-
-    company = relationship("Company", back_populates="review_metrics")
-
-class MarketingMetrics(Base):
-    __tablename__ = "marketing_metrics"
-
-    id = Column(Integer, primary_key=True, index=True)
-    company_id = Column(Integer, ForeignKey("companies.id"))
-    estimated_spend = Column(Float, default=0.0)
-    channels = Column(JSON)
-    efficiency_score = Column(Float, default=0.0)
-    raw_data = Column(JSON)
-    updated_at = Column(DateTime, default=datetime.utcnow)
-
-    company = relationship("Company", back_populates="marketing_metrics")
\ No newline at end of file
+        env_file = ".env"
@@ -1,7 +1,23 @@
 from sqlalchemy.orm import Session
-from . import models, schemas
-from datetime import datetime
-from typing import List, Optional
+from sqlalchemy import DateTime, case, delete, exists, func, insert, literal, or_, select, true
+from . import models, schemas, history, blobs, similarity, review_stats
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Columns mirrored into company_rankings, by the update helper that owns them
+RANKING_FIELDS = {
+    'github': ('stars', 'forks', 'contributors', 'commit_frequency', 'issue_response_time'),
+    'review': ('nps_score', 'review_count', 'average_rating', 'sentiment_score'),
+    'market': ('tranco_rank', 'efficiency_score', 'search_interest_score', 'trend_score'),
+    'tech': ('tech_diversity_score',),
+    'score': ('acquisition_score', 'github_score', 'market_score', 'tech_score'),
+}
+SCREEN_COLUMNS = tuple(column for fields in RANKING_FIELDS.values() for column in fields)
+# MarketMetrics columns that come from each marketing source
+MARKET_SOURCE_COLUMNS = {
+    'tranco': ('tranco_rank', 'estimated_spend'),
+    'trends': ('search_interest_score', 'trend_score', 'trends_data'),
+}
 
 def get_company(db: Session, company_id: int):
     return db.query(models.Company).filter(models.Company.id == company_id).first()
@@ -18,6 +34,249 @@ def get_companies(
         .limit(limit)\
         .all()
 
+def get_growth_rates(
+    db: Session,
+    family: str,
+    metric: str,
+    days: int = 30,
+    company_ids: Optional[List[int]] = None,
+    min_growth: Optional[float] = None,
+    limit: int = 100
+) -> List[dict]:
+    since = datetime.utcnow() - timedelta(days=days)
+    return history.growth_rates(
+        db, family, metric, since,
+        company_ids=company_ids, min_growth=min_growth, limit=limit
+    )
+
+def screen_companies(
+    db: Session,
+    filters: Dict[str, Tuple[Optional[float], Optional[float]]],
+    sort: List[Tuple[str, bool]],
+    skip: int = 0,
+    limit: int = 50
+) -> List[dict]:
+    """
+    Range filters ({column: (min, max)}) and ordering ([(column, descending)])
+    over the company_rankings table. NULLs never match a filter or a sort
+    column, which keeps every predicate and ORDER BY servable by its index.
+    """
+    ranking = models.CompanyRanking
+    query = db.query(ranking, models.Company.name, models.Company.website)\
+        .join(models.Company, models.Company.id == ranking.company_id)
+
+    for name, (low, high) in filters.items():
+        column = getattr(ranking, name)
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            query = query.filter(column <= high)
+
+    order_by = []
+    for name, descending in sort:
+        column = getattr(ranking, name)
+        query = query.filter(column.isnot(None))
+        order_by.append(column.desc() if descending else column.asc())
+    order_by.append(ranking.company_id.asc())
+
+    results = []
+    for row, name, website in query.order_by(*order_by).offset(skip).limit(limit):
+        result = {column: getattr(row, column) for column in SCREEN_COLUMNS}
+        result.update(company_id=row.company_id, name=name, website=website, updated_at=row.updated_at)
+        results.append(result)
+    return results
+
+def _upsert_company_row(db: Session, model, company_id: int, values: dict):
+    """Race-free upsert of a row keyed by company_id; the caller owns the transaction"""
+    dialect = db.bind.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(model).values(company_id=company_id, **values)
+        db.execute(stmt.on_conflict_do_update(index_elements=['company_id'], set_=values))
+        return
+
+    db_row = db.query(model).get(company_id)
+    if db_row:
+        for key, value in values.items():
+            setattr(db_row, key, value)
+    else:
+        db.add(model(company_id=company_id, **values))
+
+def _update_ranking(db: Session, company_id: int, values: dict):
+    """Upserts the given screening columns; the caller owns the transaction"""
+    values = {key: value for key, value in values.items() if key in SCREEN_COLUMNS}
+    if not values:
+        return
+    values['updated_at'] = datetime.utcnow()
+    _upsert_company_row(db, models.CompanyRanking, company_id, values)
+
+def _update_features(db: Session, company_id: int, **tokens):
+    """Upserts similarity tokens (github_tokens and/or tech_tokens)"""
+    _upsert_company_row(db, models.CompanyFeatures, company_id, {**tokens, 'updated_at': datetime.utcnow()})
+
+def update_company_score(db: Session, company_id: int, acquisition_score: float, subscores: dict,
+                         efficiency_score: Optional[float] = None):
+    db.query(models.Company)\
+        .filter(models.Company.id == company_id)\
+        .update({'acquisition_score': acquisition_score}, synchronize_session=False)
+    ranking = {'acquisition_score': acquisition_score, **subscores}
+    if efficiency_score is not None:
+        db.query(models.MarketMetrics)\
+            .filter(models.MarketMetrics.company_id == company_id)\
+            .update({'efficiency_score': efficiency_score}, synchronize_session=False)
+        ranking['efficiency_score'] = efficiency_score
+    _update_ranking(db, company_id, ranking)
+    db.commit()
+
+def get_tech_stack_data(db: Session, company_id: int) -> Optional[dict]:
+    """Stored tech stack in the shape the detector returns"""
+    row = db.query(
+        models.TechStack.analytics_tools,
+        models.TechStack.advertising_tools,
+        models.TechStack.marketing_tools
+    ).filter(models.TechStack.company_id == company_id).first()
+    if not row:
+        return None
+    return {
+        'analytics': row.analytics_tools or [],
+        'advertising': row.advertising_tools or [],
+        'marketing_tools': row.marketing_tools or []
+    }
+
+def get_score_inputs(db: Session, company_id: int) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    Latest stored GitHub and marketing metrics in the shape of the collector
+    results, so a score can be recomputed without collecting anything
+    """
+    github = db.query(
+        models.GithubMetrics.stars,
+        models.GithubMetrics.contributors,
+        models.GithubMetrics.commit_frequency,
+        models.GithubMetrics.issue_response_time
+    ).filter(models.GithubMetrics.company_id == company_id).first()
+    market = db.query(
+        models.MarketMetrics.tranco_rank,
+        models.MarketMetrics.trends_data
+    ).filter(models.MarketMetrics.company_id == company_id).first()
+    tech_data = get_tech_stack_data(db, company_id)
+
+    github_metrics = {key: value or 0 for key, value in github._mapping.items()} if github else None
+    marketing_metrics = None
+    if market or tech_data:
+        raw_data = {}
+        if market:
+            raw_data['tranco'] = {'rank': market.tranco_rank}
+            raw_data['trends'] = market.trends_data or {}
+        if tech_data:
+            raw_data['tech_stack'] = tech_data
+        marketing_metrics = {'raw_data': raw_data}
+    return github_metrics, marketing_metrics
+
+def _subscore_columns(github, market, tech) -> list:
+    """
+    github_score, market_score and tech_score in SQL, from the same stored
+    inputs as calculate_subscores in app/celery_tasks.py. The market trend
+    term is the stored search_interest_score (mean of the last four weeks).
+    """
+    def stored(column):
+        return func.coalesce(column, 0)
+
+    github_score = case((github.company_id.isnot(None), (
+        stored(github.stars) * 0.3 +
+        stored(github.contributors) * 0.3 +
+        stored(github.commit_frequency) * 0.2 +
+        0.2 / (stored(github.issue_response_time) + 1)
+    ) / 1000), else_=0.0)
+    rank_score = case(
+        ((market.tranco_rank > 0) & (market.tranco_rank < 1000000), 100 - market.tranco_rank * 100.0 / 1000000),
+        else_=0.0
+    )
+    market_score = (rank_score * 0.6 + stored(market.search_interest_score) * 0.4) / 100
+    # tech_diversity_score is min(100, tools * 20), tech_score min(1, tools / 5)
+    tech_score = stored(tech.tech_diversity_score) / 100.0
+    return [github_score, market_score, tech_score]
+
+def rebuild_rankings(db: Session) -> int:
+    """
+    Full backfill of company_rankings from the metrics tables in one
+    statement. Rows are upserted: existing ones keep the subscores the last
+    rescore wrote, and rows created here get them computed from the stored
+    metrics, so subscore screens keep matching.
+    """
+    sources = {
+        'github': models.GithubMetrics,
+        'review': models.ReviewMetrics,
+        'market': models.MarketMetrics,
+        'tech': models.TechStack,
+    }
+    columns = [models.Company.id, models.Company.acquisition_score]
+    names = ['company_id', 'acquisition_score']
+    query_from = models.Company.__table__
+    for source, model in sources.items():
+        query_from = query_from.outerjoin(model, model.company_id == models.Company.id)
+        for field in RANKING_FIELDS[source]:
+            columns.append(getattr(model, field))
+            names.append(field)
+    columns += _subscore_columns(models.GithubMetrics, models.MarketMetrics, models.TechStack)
+    names += ['github_score', 'market_score', 'tech_score']
+    columns.append(literal(datetime.utcnow(), DateTime))
+    names.append('updated_at')
+    # SQLite needs a WHERE to tell the upsert's ON CONFLICT from a join's ON
+    rows = select(*columns).select_from(query_from).where(true())
+
+    dialect = db.bind.dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        db.execute(delete(models.CompanyRanking))
+        result = db.execute(insert(models.CompanyRanking).from_select(names, rows))
+        db.commit()
+        return result.rowcount
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    db.query(models.CompanyRanking)\
+        .filter(~exists().where(models.Company.id == models.CompanyRanking.company_id))\
+        .delete(synchronize_session=False)
+    stmt = dialect_insert(models.CompanyRanking).from_select(names, rows)
+    kept = set(RANKING_FIELDS['score']) - {'acquisition_score'}
+    result = db.execute(stmt.on_conflict_do_update(
+        index_elements=['company_id'],
+        set_={name: stmt.excluded[name] for name in names if name != 'company_id' and name not in kept}
+    ))
+    db.commit()
+    return result.rowcount
+
+def get_company_names(db: Session, company_ids: List[int]) -> Dict[int, str]:
+    rows = db.query(models.Company.id, models.Company.name)\
+        .filter(models.Company.id.in_(company_ids))\
+        .all()
+    return {row.id: row.name for row in rows}
+
+def rebuild_company_features(db: Session, chunk_size: int = 1000) -> int:
+    """Backfills similarity tokens for rows written before company_features existed"""
+    count = 0
+    query = db.query(models.Company.id, models.GithubMetrics, models.TechStack)\
+        .outerjoin(models.GithubMetrics, models.GithubMetrics.company_id == models.Company.id)\
+        .outerjoin(models.TechStack, models.TechStack.company_id == models.Company.id)\
+        .yield_per(chunk_size)
+    for company_id, github, tech in query:
+        _update_features(
+            db, company_id,
+            github_tokens=similarity.github_tokens(github.raw_data) if github else [],
+            tech_tokens=similarity.tech_tokens({
+                'analytics': tech.analytics_tools or [],
+                'advertising': tech.advertising_tools or [],
+                'marketing_tools': tech.marketing_tools or []
+            }) if tech else []
+        )
+        count += 1
+    db.commit()
+    return count
+
 def create_company(db: Session, company: schemas.CompanyCreate) -> models.Company:
     db_company = models.Company(**company.dict())
     db.add(db_company)
@@ -25,7 +284,41 @@ def create_company(db: Session, company: schemas.CompanyCreate) -> models.Compan
     db.refresh(db_company)
     return db_company
 
+def store_raw_payload(db: Session, payload) -> Optional[str]:
+    """Stores a payload in the blob store (once per distinct content) and returns its hash"""
+    if not payload:
+        return None
+    digest, data, size = blobs.encode(payload)
+    values = {'hash': digest, 'size': size, 'data': data, 'created_at': datetime.utcnow()}
+    if db.bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        db.execute(pg_insert(models.RawBlob).values(**values).on_conflict_do_nothing())
+    elif db.bind.dialect.name == 'sqlite':
+        db.execute(insert(models.RawBlob).values(**values).prefix_with('OR IGNORE'))
+    elif not db.query(exists().where(models.RawBlob.hash == digest)).scalar():
+        db.add(models.RawBlob(**values))
+    return digest
+
+def _externalize_raw_data(db: Session, values: dict) -> dict:
+    values = dict(values)
+    values['raw_data_hash'] = store_raw_payload(db, values.pop('raw_data', None))
+    return values
+
+def delete_orphaned_raw_blobs(db: Session) -> int:
+    referenced = or_(*(
+        exists().where(model.raw_data_hash == models.RawBlob.hash)
+        for model in (models.GithubMetrics, models.MarketMetrics, models.TechStack, models.ReviewMetrics)
+    ))
+    deleted = db.query(models.RawBlob)\
+        .filter(~referenced)\
+        .delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
 def update_github_metrics(db: Session, company_id: int, metrics: dict):
+    if 'raw_data' in metrics:
+        _update_features(db, company_id, github_tokens=similarity.github_tokens(metrics['raw_data']))
+    metrics = _externalize_raw_data(db, metrics)
     db_metrics = db.query(models.GithubMetrics)\
         .filter(models.GithubMetrics.company_id == company_id)\
         .first()
@@ -37,10 +330,64 @@ def update_github_metrics(db: Session, company_id: int, metrics: dict):
         db_metrics = models.GithubMetrics(company_id=company_id, **metrics)
         db.add(db_metrics)
     
+    history.record(db, 'github', company_id, metrics)
+    _update_ranking(db, company_id, metrics)
     db.commit()
     return db_metrics
 
+AGGREGATE_FIELDS = review_stats.COUNTERS + ('rating_histogram', 'sentiment_histogram', 'seen', 'watermark')
+
+def get_review_aggregates(db: Session, company_id: int, for_update: bool = False) -> Dict[str, dict]:
+    """Stored review aggregates by source. `for_update` locks the rows until the transaction ends."""
+    query = db.query(models.ReviewAggregate)\
+        .filter(models.ReviewAggregate.company_id == company_id)
+    if for_update:
+        query = query.with_for_update()
+    rows = query.all()
+    return {row.source: {field: getattr(row, field) for field in AGGREGATE_FIELDS} for row in rows}
+
+def lock_review_aggregates(db: Session, company_id: int, sources) -> Dict[str, dict]:
+    """
+    Review aggregates of `sources`, locked until the transaction ends so a
+    fold and its store can't interleave with another task's. Missing rows
+    are inserted empty first, so a company's first fold is locked too.
+    """
+    values = {field: value for field, value in review_stats.empty().items() if field in AGGREGATE_FIELDS}
+    rows = [{'company_id': company_id, 'source': source, **values} for source in sources]
+    dialect = db.bind.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        # A concurrent insert of the same row waits here until the other transaction ends
+        db.execute(dialect_insert(models.ReviewAggregate).values(rows).on_conflict_do_nothing(
+            index_elements=['company_id', 'source']
+        ))
+    else:
+        stored = get_review_aggregates(db, company_id)
+        db.add_all(models.ReviewAggregate(**row) for row in rows if row['source'] not in stored)
+        db.flush()
+    return get_review_aggregates(db, company_id, for_update=True)
+
+def _store_review_aggregates(db: Session, company_id: int, aggregates: Dict[str, dict]):
+    """The caller owns the transaction"""
+    rows = {
+        row.source: row for row in db.query(models.ReviewAggregate)
+        .filter(models.ReviewAggregate.company_id == company_id)
+    }
+    for source, aggregate in aggregates.items():
+        values = {field: aggregate[field] for field in AGGREGATE_FIELDS}
+        if source in rows:
+            for key, value in values.items():
+                setattr(rows[source], key, value)
+        else:
+            db.add(models.ReviewAggregate(company_id=company_id, source=source, **values))
+
 def update_review_metrics(db: Session, company_id: int, metrics: dict):
+    metrics = _externalize_raw_data(db, metrics)
+    metrics.pop('partial', None)
+    _store_review_aggregates(db, company_id, metrics.pop('aggregates', {}))
     db_metrics = db.query(models.ReviewMetrics)\
         .filter(models.ReviewMetrics.company_id == company_id)\
         .first()
@@ -52,6 +399,8 @@ def update_review_metrics(db: Session, company_id: int, metrics: dict):
         db_metrics = models.ReviewMetrics(company_id=company_id, **metrics)
         db.add(db_metrics)
     
+    history.record(db, 'review', company_id, metrics)
+    _update_ranking(db, company_id, metrics)
     db.commit()
     return db_metrics
 
@@ -68,4 +417,129 @@ def update_marketing_metrics(db: Session, company_id: int, metrics: dict):
         db.add(db_metrics)
     
     db.commit()
-    return db_metrics
\ No newline at end of file
+    return db_metrics
+
+
+def update_market_metrics(db: Session, company_id: int, metrics: dict):
+    db_metrics = db.query(models.MarketMetrics)\
+        .filter(models.MarketMetrics.company_id == company_id)\
+        .first()
+
+    raw_data = metrics.get('raw_data', {})
+    skipped = raw_data.get('skipped_sources', [])
+    if skipped and db_metrics:
+        # Keep the last payloads of sources skipped behind an open circuit
+        previous = db_metrics.raw_data
+        raw_data = {**raw_data, **{source: previous[source] for source in skipped if source in previous}}
+    search = metrics.get('channels', {}).get('search', {})
+    values = {
+        'tranco_rank': (raw_data.get('tranco') or {}).get('rank'),
+        'estimated_spend': metrics.get('estimated_spend', 0.0),
+        'search_interest_score': search.get('score', 0.0),
+        'trend_score': search.get('trend', 0.0),
+        'efficiency_score': metrics.get('efficiency_score', 0.0),
+        'trends_data': raw_data.get('trends'),
+        'raw_data_hash': store_raw_payload(db, raw_data)
+    }
+    # Keep the last known values of sources skipped behind an open circuit,
+    # and the efficiency score, which was computed as if they were empty
+    for source in skipped:
+        for column in MARKET_SOURCE_COLUMNS[source]:
+            values.pop(column)
+    if skipped:
+        values.pop('efficiency_score')
+    
+    if db_metrics:
+        for key, value in values.items():
+            setattr(db_metrics, key, value)
+    else:
+        db_metrics = models.MarketMetrics(company_id=company_id, **values)
+        db.add(db_metrics)
+    
+    history.record(db, 'market', company_id, values)
+    _update_ranking(db, company_id, values)
+    db.commit()
+    return db_metrics
+
+def _tech_stack_values(db: Session, tech_data: dict) -> dict:
+    total_tools = sum(len(tools) for tools in tech_data.values())
+    return {
+        'analytics_tools': tech_data.get('analytics', []),
+        'advertising_tools': tech_data.get('advertising', []),
+        'marketing_tools': tech_data.get('marketing_tools', []),
+        'tech_diversity_score': min(100, total_tools * 20),  # 5 tools = 100%
+        'raw_data_hash': store_raw_payload(db, tech_data)
+    }
+
+def update_tech_stack(db: Session, company_id: int, tech_data: dict):
+    _update_features(db, company_id, tech_tokens=similarity.tech_tokens(tech_data))
+    values = _tech_stack_values(db, tech_data)
+
+    db_tech = db.query(models.TechStack)\
+        .filter(models.TechStack.company_id == company_id)\
+        .first()
+    
+    if db_tech:
+        for key, value in values.items():
+            setattr(db_tech, key, value)
+    else:
+        db_tech = models.TechStack(company_id=company_id, **values)
+        db.add(db_tech)
+    
+    _update_ranking(db, company_id, values)
+    db.commit()
+    return db_tech
+
+def _bulk_upsert_company_rows(db: Session, model, rows: List[dict]):
+    """_upsert_company_row for many rows (all with the same keys) in one statement"""
+    dialect = db.bind.dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        for row in rows:
+            row = dict(row)
+            _upsert_company_row(db, model, row.pop('company_id'), row)
+        return
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(model).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=['company_id'],
+        set_={key: stmt.excluded[key] for key in rows[0] if key != 'company_id'}
+    ))
+
+def bulk_update_tech_stacks(db: Session, tech_data: Dict[int, dict]) -> int:
+    """
+    update_tech_stack for many companies ({company_id: tech data}) in a
+    handful of statements, for re-detection over stored homepage snapshots.
+    Like any tech stack change, new scores land on each company's next rescore.
+    """
+    if not tech_data:
+        return 0
+    now = datetime.utcnow()
+    existing = dict(
+        db.query(models.TechStack.company_id, models.TechStack.id)
+        .filter(models.TechStack.company_id.in_(list(tech_data)))
+    )
+    # Few distinct stacks: compress and store each payload once
+    by_payload = {}
+    updates, inserts, rankings, features = [], [], [], []
+    for company_id, data in tech_data.items():
+        key = repr(sorted(data.items()))
+        if key not in by_payload:
+            by_payload[key] = _tech_stack_values(db, data)
+        values = {**by_payload[key], 'updated_at': now}
+        if company_id in existing:
+            updates.append({'id': existing[company_id], **values})
+        else:
+            inserts.append({'company_id': company_id, **values})
+        rankings.append({'company_id': company_id, 'tech_diversity_score': values['tech_diversity_score'],
+                         'updated_at': now})
+        features.append({'company_id': company_id, 'tech_tokens': similarity.tech_tokens(data), 'updated_at': now})
+
+    db.bulk_update_mappings(models.TechStack, updates)
+    db.bulk_insert_mappings(models.TechStack, inserts)
+    _bulk_upsert_company_rows(db, models.CompanyRanking, rankings)
+    _bulk_upsert_company_rows(db, models.CompanyFeatures, features)
+    db.commit()
+    return len(tech_data)
@@ -0,0 +1,29 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from .config import Settings
+
+settings = Settings()
+
+# SQLite (local runs and benchmarks) needs cross-thread connections
+connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
+
+engine = create_engine(settings.database_url, connect_args=connect_args)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def init_db():
+    """Creates missing tables and the upcoming history partitions"""
+    from . import models, history
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        history.ensure_partitions(db)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    # Schema management runs once per deploy, not on every API import:
+    #   python -m app.database
+    init_db()
@@ -0,0 +1,84 @@
+"""Canonical hosts and registrable domains for company websites.
+
+`Company.website` may be a full URL (`https://www.company.com/about`), a
+bare host or anything in between. Collectors key their requests and
+caches on the canonical host (lowercase, IDNA, no scheme, port, path or
+leading `www`) and query rank lists with the registrable domain
+(`shop.company.co.uk` -> `company.co.uk`).
+
+tldextract, if installed, supplies the public suffix list; otherwise a
+short list of common multi-label suffixes covers the usual cases.
+"""
+from typing import Optional
+from urllib.parse import urlsplit
+import re
+
+try:
+    import tldextract
+    # Bundled suffix list snapshot only; never fetch it at runtime
+    _extract = tldextract.TLDExtract(suffix_list_urls=())
+except ImportError:
+    tldextract = None
+
+# Multi-label public suffixes for when tldextract is not installed
+MULTI_LABEL_SUFFIXES = {
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'me.uk', 'ltd.uk', 'plc.uk',
+    'com.au', 'net.au', 'org.au', 'co.nz', 'org.nz', 'co.jp', 'ne.jp', 'or.jp',
+    'co.in', 'net.in', 'org.in', 'com.br', 'com.cn', 'com.mx', 'co.za', 'com.sg',
+    'com.tr', 'co.kr', 'com.hk', 'com.tw', 'co.il', 'com.ar', 'co.id', 'com.my',
+}
+
+_WWW = re.compile(r'^www\d*\.')
+
+
+def canonical_host(website: Optional[str]) -> Optional[str]:
+    """Lowercase IDNA host without scheme, credentials, port, path or leading www"""
+    if not website or not website.strip():
+        return None
+    website = website.strip()
+    if '://' not in website:
+        website = '//' + website
+    try:
+        host = urlsplit(website).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    host = host.rstrip('.')
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+    return _WWW.sub('', host) or None
+
+
+def _split(host: str):
+    """(subdomain labels, registrable label, public suffix)"""
+    if tldextract is not None:
+        parts = _extract(host)
+        if parts.domain and parts.suffix:
+            return parts.subdomain, parts.domain, parts.suffix
+    labels = host.split('.')
+    suffix_size = 2 if len(labels) > 2 and '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES else 1
+    if len(labels) <= suffix_size:
+        return '', host, ''
+    return (
+        '.'.join(labels[:-suffix_size - 1]),
+        labels[-suffix_size - 1],
+        '.'.join(labels[-suffix_size:])
+    )
+
+
+def registrable_domain(host: str) -> str:
+    """eTLD+1, e.g. `app.company.co.uk` -> `company.co.uk`"""
+    _, domain, suffix = _split(host)
+    return f"{domain}.{suffix}" if suffix else domain
+
+
+def brand_name(host: str) -> str:
+    """The registrable label, e.g. `app.company.co.uk` -> `company`"""
+    label = _split(host)[1]
+    try:
+        return label.encode('ascii').decode('idna')
+    except UnicodeError:
+        return label
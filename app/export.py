@@ -0,0 +1,207 @@
+"""Streaming export of every company joined with its latest metrics.
+
+Rows are read through a server-side cursor in chunks of `chunk_size` and
+serialized chunk by chunk, so memory stays flat regardless of table size.
+
+    python -m app.export --format csv --output companies.csv
+    python -m app.export --format parquet --updated-since 2024-01-01 --output delta.parquet
+"""
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Iterator, List, Optional
+import argparse
+import csv
+import io
+import json
+import sys
+from . import models
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+COLUMNS = [
+    ('id', models.Company.id),
+    ('name', models.Company.name),
+    ('github_url', models.Company.github_url),
+    ('website', models.Company.website),
+    ('acquisition_score', models.Company.acquisition_score),
+    ('created_at', models.Company.created_at),
+    ('stars', models.GithubMetrics.stars),
+    ('forks', models.GithubMetrics.forks),
+    ('contributors', models.GithubMetrics.contributors),
+    ('commit_frequency', models.GithubMetrics.commit_frequency),
+    ('issue_response_time', models.GithubMetrics.issue_response_time),
+    ('tranco_rank', models.MarketMetrics.tranco_rank),
+    ('estimated_spend', models.MarketMetrics.estimated_spend),
+    ('search_interest_score', models.MarketMetrics.search_interest_score),
+    ('trend_score', models.MarketMetrics.trend_score),
+    ('efficiency_score', models.MarketMetrics.efficiency_score),
+    ('nps_score', models.ReviewMetrics.nps_score),
+    ('review_count', models.ReviewMetrics.review_count),
+    ('average_rating', models.ReviewMetrics.average_rating),
+    ('sentiment_score', models.ReviewMetrics.sentiment_score),
+    ('analytics_tools', models.TechStack.analytics_tools),
+    ('advertising_tools', models.TechStack.advertising_tools),
+    ('marketing_tools', models.TechStack.marketing_tools),
+    ('tech_diversity_score', models.TechStack.tech_diversity_score),
+]
+
+# Timestamps whose maximum becomes the row's `updated_at` (and the
+# watermark for the next incremental export)
+UPDATED_COLUMNS = [
+    models.Company.updated_at,
+    models.GithubMetrics.updated_at,
+    models.MarketMetrics.updated_at,
+    models.ReviewMetrics.updated_at,
+    models.TechStack.updated_at,
+]
+
+FIELDS = [name for name, _ in COLUMNS] + ['updated_at']
+LIST_FIELDS = ('analytics_tools', 'advertising_tools', 'marketing_tools')
+
+
+def _query(updated_since: Optional[datetime]):
+    query = select(
+        *(column.label(name) for name, column in COLUMNS),
+        *(column.label(f'updated_at_{i}') for i, column in enumerate(UPDATED_COLUMNS))
+    )\
+        .outerjoin(models.GithubMetrics, models.GithubMetrics.company_id == models.Company.id)\
+        .outerjoin(models.MarketMetrics, models.MarketMetrics.company_id == models.Company.id)\
+        .outerjoin(models.ReviewMetrics, models.ReviewMetrics.company_id == models.Company.id)\
+        .outerjoin(models.TechStack, models.TechStack.company_id == models.Company.id)\
+        .order_by(models.Company.id)
+    if updated_since:
+        query = query.where(or_(*(column >= updated_since for column in UPDATED_COLUMNS)))
+    return query
+
+
+def iter_rows(db: Session, updated_since: Optional[datetime] = None, chunk_size: int = 5000) -> Iterator[List[dict]]:
+    """Yields lists of at most `chunk_size` flat row dicts"""
+    result = db.execute(_query(updated_since).execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        chunk = []
+        for row in partition:
+            record = {name: row[i] for i, (name, _) in enumerate(COLUMNS)}
+            stamps = [stamp for stamp in row[len(COLUMNS):] if stamp is not None]
+            record['updated_at'] = max(stamps) if stamps else None
+            chunk.append(record)
+        yield chunk
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _ndjson(chunks: Iterator[List[dict]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield ''.join(json.dumps(row, default=_json_default) + '\n' for row in chunk).encode()
+
+
+def _csv(chunks: Iterator[List[dict]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow({
+                key: json.dumps(value) if key in LIST_FIELDS and value is not None
+                else value.isoformat() if isinstance(value, datetime) else value
+                for key, value in row.items()
+            })
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be taken out between writes"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet(chunks: Iterator[List[dict]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()), ('name', pa.string()), ('github_url', pa.string()), ('website', pa.string()),
+        ('acquisition_score', pa.float64()), ('created_at', pa.timestamp('us')),
+        ('stars', pa.int64()), ('forks', pa.int64()), ('contributors', pa.int64()),
+        ('commit_frequency', pa.float64()), ('issue_response_time', pa.float64()),
+        ('tranco_rank', pa.int64()), ('estimated_spend', pa.float64()),
+        ('search_interest_score', pa.float64()), ('trend_score', pa.float64()),
+        ('efficiency_score', pa.float64()),
+        ('nps_score', pa.float64()), ('review_count', pa.int64()),
+        ('average_rating', pa.float64()), ('sentiment_score', pa.float64()),
+        ('analytics_tools', pa.list_(pa.string())), ('advertising_tools', pa.list_(pa.string())),
+        ('marketing_tools', pa.list_(pa.string())), ('tech_diversity_score', pa.float64()),
+        ('updated_at', pa.timestamp('us')),
+    ])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for chunk in chunks:
+            # One row group per chunk
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream(db: Session, fmt: str = 'ndjson', updated_since: Optional[datetime] = None,
+           chunk_size: int = 5000) -> Iterator[bytes]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    serializer = {'ndjson': _ndjson, 'csv': _csv, 'parquet': _parquet}[fmt]
+    return serializer(iter_rows(db, updated_since, chunk_size))
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Export companies with their latest metrics")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+    parser.add_argument('--output', help="Defaults to stdout")
+    parser.add_argument('--updated-since', type=datetime.fromisoformat,
+                        help="Only rows whose company or metrics changed at or after this ISO timestamp")
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for data in stream(db, args.format, args.updated_since, args.chunk_size):
+            out.write(data)
+    finally:
+        if args.output:
+            out.close()
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
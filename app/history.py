@@ -0,0 +1,200 @@
+from sqlalchemy import Integer, cast, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+from . import models
+
+# Metric family -> (history model, numeric columns tracked over time)
+FAMILIES = {
+    'github': (models.GithubMetricsHistory, (
+        'stars', 'forks', 'contributors', 'commit_frequency', 'issue_response_time'
+    )),
+    'market': (models.MarketMetricsHistory, (
+        'tranco_rank', 'estimated_spend', 'search_interest_score', 'trend_score', 'efficiency_score'
+    )),
+    'review': (models.ReviewMetricsHistory, (
+        'nps_score', 'review_count', 'average_rating', 'sentiment_score'
+    )),
+}
+
+# Source resolution -> rolled-up resolution
+ROLLUPS = {'raw': 'day', 'day': 'week'}
+
+
+def record(db: Session, family: str, company_id: int, values: dict, ts: Optional[datetime] = None):
+    """Append one raw point; the caller owns the transaction"""
+    model, fields = FAMILIES[family]
+    db.add(model(
+        company_id=company_id,
+        ts=ts or datetime.utcnow(),
+        resolution='raw',
+        **{field: values.get(field) for field in fields}
+    ))
+
+
+def _bucket_start(ts: datetime, resolution: str) -> datetime:
+    start = datetime(ts.year, ts.month, ts.day)
+    if resolution == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def _bucket_expr(db: Session, column, resolution: str):
+    if db.bind.dialect.name == 'postgresql':
+        return func.date_trunc(resolution, column)
+    # SQLite: weeks start on Monday to match date_trunc('week')
+    if resolution == 'week':
+        return func.datetime(column, 'weekday 0', '-6 days', 'start of day')
+    return func.datetime(column, 'start of day')
+
+
+def downsample(db: Session, family: str, source: str, older_than: datetime) -> int:
+    """
+    Rolls `source` points older than `older_than` into the next resolution up
+    with one INSERT ... SELECT and one DELETE. The cutoff is aligned to a
+    bucket boundary so every rollup bucket is complete and later runs never
+    write a second row for the same bucket.
+    """
+    model, fields = FAMILIES[family]
+    target = ROLLUPS[source]
+    cutoff = _bucket_start(older_than, target)
+    stale = (model.resolution == source, model.ts < cutoff)
+
+    bucket = _bucket_expr(db, model.ts, target)
+    aggregates = []
+    for field in fields:
+        column = getattr(model, field)
+        value = func.avg(column)
+        if isinstance(column.type, Integer):
+            value = cast(func.round(value), Integer)
+        aggregates.append(value)
+
+    rollup = select(model.company_id, bucket, literal(target), *aggregates)\
+        .where(*stale)\
+        .group_by(model.company_id, bucket)
+    db.execute(insert(model).from_select(['company_id', 'ts', 'resolution', *fields], rollup))
+    removed = db.query(model).filter(*stale).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+
+def _month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def ensure_partitions(db: Session, start: Optional[date] = None, months: int = 2):
+    """Creates monthly partitions (plus a default catch-all) on PostgreSQL"""
+    if db.bind.dialect.name != 'postgresql':
+        return
+    for model, _ in FAMILIES.values():
+        create_partitions(db, model.__tablename__, start, months)
+    db.commit()
+
+
+def create_partitions(bind, table: str, start: Optional[date] = None, months: int = 2):
+    """
+    Creates the default partition of a PostgreSQL history table and its
+    monthly partitions for `months` months from `start`. `bind` is a
+    session or connection; the caller owns the transaction.
+    """
+    bind.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    month = _month_start(start or date.today())
+    for _ in range(months):
+        _create_month_partition(bind, table, month)
+        month = _next_month(month)
+
+
+def _create_month_partition(bind, table: str, month: date):
+    name = f"{table}_{month:%Y_%m}"
+    if bind.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is not None:
+        return
+    upper = _next_month(month)
+    default = f"{table}_default"
+    in_month = f"ts >= '{month.isoformat()}' AND ts < '{upper.isoformat()}'"
+    # Points written while maintenance was behind sit in the default partition,
+    # and PostgreSQL refuses a new partition that would own them: move them
+    # into it with the default detached
+    stranded = bind.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})")).scalar()
+    if stranded:
+        bind.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    bind.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+    ))
+    if stranded:
+        bind.execute(text(f"INSERT INTO {table} SELECT * FROM {default} WHERE {in_month}"))
+        bind.execute(text(f"DELETE FROM {default} WHERE {in_month}"))
+        bind.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+
+def maintain(db: Session, raw_retention_days: int, daily_retention_days: int) -> Dict[str, int]:
+    """Creates upcoming partitions and downsamples aged points for every family"""
+    ensure_partitions(db)
+    now = datetime.utcnow()
+    removed = {}
+    for family in FAMILIES:
+        removed[family] = (
+            downsample(db, family, 'raw', now - timedelta(days=raw_retention_days)) +
+            downsample(db, family, 'day', now - timedelta(days=daily_retention_days))
+        )
+    return removed
+
+
+def growth_rates(
+    db: Session,
+    family: str,
+    metric: str,
+    since: datetime,
+    company_ids: Optional[Sequence[int]] = None,
+    min_growth: Optional[float] = None,
+    limit: int = 100
+) -> List[dict]:
+    """
+    Growth of `metric` between each company's first and last point since
+    `since`, computed for all companies in a single windowed query.
+    """
+    model, fields = FAMILIES[family]
+    if metric not in fields:
+        raise ValueError(f"Unknown {family} metric: {metric}")
+
+    column = getattr(model, metric)
+    window = {'partition_by': model.company_id, 'order_by': model.ts, 'rows': (None, None)}
+    points = select(
+        model.company_id,
+        func.first_value(column, type_=column.type).over(**window).label('start_value'),
+        func.last_value(column, type_=column.type).over(**window).label('end_value'),
+        func.first_value(model.ts, type_=model.ts.type).over(**window).label('first_ts'),
+        func.last_value(model.ts, type_=model.ts.type).over(**window).label('last_ts')
+    ).where(model.ts >= since, column.isnot(None))
+    if company_ids:
+        points = points.where(model.company_id.in_(company_ids))
+    points = points.distinct().subquery()
+
+    growth = (
+        (points.c.end_value - points.c.start_value) * 100.0 / func.nullif(points.c.start_value, 0)
+    ).label('growth_pct')
+    query = select(points, growth).order_by(growth.desc().nullslast(), points.c.company_id)
+    if min_growth is not None:
+        query = query.where(growth >= min_growth)
+    query = query.limit(limit)
+
+    results = []
+    for row in db.execute(query):
+        span_days = (row.last_ts - row.first_ts).total_seconds() / 86400 if row.first_ts else 0
+        monthly = None
+        if row.growth_pct is not None and span_days > 0:
+            monthly = row.growth_pct * 30 / span_days
+        results.append({
+            'company_id': row.company_id,
+            'start_value': row.start_value,
+            'end_value': row.end_value,
+            'first_ts': row.first_ts,
+            'last_ts': row.last_ts,
+            'growth_pct': row.growth_pct,
+            'monthly_growth_pct': monthly
+        })
+    return results
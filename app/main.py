@@ -1,24 +1,29 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
-from celery import Celery
 from . import models, schemas, crud
 from .database import SessionLocal, engine
-from .collectors import GitHubCollector, ReviewCollector, MarketingEstimator
 from .config import Settings
+from . import metrics, export, similarity, profiling
+from datetime import datetime
+from typing import List, Optional
 import logging
+import time
+
+# Keep this module's imports to what request handling needs: collectors
+# (pandas, TextBlob, bs4, ...) only load in the Celery workers, and tables
+# are created by `python -m app.database`, not on import.
+
+# Time SQL statements before any engine is used
+metrics.instrument_sqlalchemy()
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
-
 app = FastAPI(title="Acquisition Target Discovery API")
 
-# Initialize Celery
-celery = Celery('tasks', broker='redis://redis:6379/0')
-
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -27,22 +32,106 @@ def get_db():
     finally:
         db.close()
 
-# Initialize collectors
 settings = Settings()
-github_collector = GitHubCollector(settings.github_token)
-review_collector = ReviewCollector()
-marketing_estimator = MarketingEstimator()
+
+# Similar-companies index, loaded and refreshed by a background thread from startup
+similarity_index = similarity.SimilarityIndex(use_ann=settings.similarity_use_ann)
+
+# Prometheus registry for the API container; each worker service serves its own
+metrics_registry = metrics.build_registry(settings.redis_url, queues=('celery', 'io', 'cpu'))
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        endpoint = request.scope.get("endpoint")
+        metrics.HTTP_REQUEST_LATENCY.labels(
+            request.method,
+            endpoint.__name__ if endpoint else "unmatched",
+            str(status)
+        ).observe(time.perf_counter() - start)
+
+if settings.profiling_enabled:
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """Profiles requests sent with an X-Profile header (see app/profiling.py)"""
+        if not profiling.requested(request.headers.get(profiling.HEADER)):
+            return await call_next(request)
+        run = profiling.start(settings)
+        try:
+            return await call_next(request)
+        finally:
+            endpoint = request.scope.get("endpoint")
+            run.finish(
+                settings, 'request', endpoint.__name__ if endpoint else "unmatched",
+                company_id=request.scope.get("path_params", {}).get("company_id"),
+                method=request.method, path=request.url.path
+            )
+
+@app.on_event("startup")
+def warm_similarity_index():
+    # In a thread, so startup and /healthz never wait on the full load
+    similarity_index.start_background_refresh(SessionLocal, settings.similarity_refresh_seconds)
+
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    """Liveness: the process is up and serving; touches no dependencies"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """Readiness: the database answers and its schema exists, and Redis answers"""
+    checks = {}
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            checks["database"] = "ok" if inspect(connection).has_table(models.Company.__tablename__) \
+                else "schema missing, run python -m app.database"
+    except Exception as e:
+        checks["database"] = str(e)
+    try:
+        import redis
+        redis.Redis.from_url(settings.redis_url, socket_timeout=1).ping()
+        checks["redis"] = "ok"
+    except Exception as e:
+        checks["redis"] = str(e)
+
+    ready = all(status == "ok" for status in checks.values())
+    return JSONResponse({"ready": ready, "checks": checks}, status_code=200 if ready else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    data, content_type = metrics.render(metrics_registry)
+    return Response(content=data, media_type=content_type)
 
 @app.post("/companies/", response_model=schemas.Company)
 async def create_company(
     company: schemas.CompanyCreate,
     background_tasks: BackgroundTasks,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     db_company = crud.create_company(db=db, company=company)
-    background_tasks.add_task(process_company_data, db_company.id)
+    background_tasks.add_task(
+        enqueue_collection, db_company.id,
+        profile=settings.profiling_enabled and profiling.requested(request.headers.get(profiling.HEADER))
+    )
     return db_company
 
+def enqueue_collection(company_id: int, profile: bool = False):
+    # By name, so the API never imports the task module and its collectors
+    from .celery import celery
+    try:
+        celery.send_task('app.celery_tasks.process_company_data', args=[company_id],
+                         kwargs={'profile': True} if profile else None)
+    except Exception as e:
+        logger.error(f"Error queueing collection for company {company_id}: {str(e)}")
+
 @app.get("/companies/", response_model=list[schemas.Company])
 def get_companies(
     skip: int = 0,
@@ -53,9 +142,104 @@ def get_companies(
     companies = crud.get_companies(db, skip=skip, limit=limit, min_score=min_score)
     return companies
 
+@app.get("/companies/export")
+def export_companies(
+    format: str = "ndjson",
+    updated_since: Optional[datetime] = None,
+    chunk_size: int = Query(5000, ge=1, le=100000)
+):
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+
+    # The stream outlives the request dependency, so it owns its session
+    def generate():
+        db = SessionLocal()
+        try:
+            yield from export.stream(db, format, updated_since, chunk_size)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=companies.{format}"}
+    )
+
+@app.get("/companies/screen", response_model=list[schemas.ScreenResult])
+def screen_companies(
+    request: Request,
+    sort: str = "-acquisition_score",
+    skip: int = 0,
+    limit: int = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Range filters are passed as min_<column>/max_<column>, e.g.
+    /companies/screen?min_nps_score=50&max_efficiency_score=40&min_stars=100&sort=-nps_score
+    """
+    filters = {}
+    for key, value in request.query_params.items():
+        bound, _, column = key.partition("_")
+        if bound not in ("min", "max") or key in ("sort", "skip", "limit"):
+            continue
+        if column not in crud.SCREEN_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"Unknown screening column: {column}")
+        try:
+            low, high = filters.get(column, (None, None))
+            filters[column] = (float(value), high) if bound == "min" else (low, float(value))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{key} must be a number")
+
+    order = []
+    for term in filter(None, sort.split(",")):
+        column = term.lstrip("-")
+        if column not in crud.SCREEN_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"Unknown sort column: {column}")
+        order.append((column, term.startswith("-")))
+
+    return crud.screen_companies(db, filters, order, skip=skip, limit=limit)
+
+@app.get("/companies/growth", response_model=list[schemas.GrowthRate])
+def get_growth_rates(
+    family: str = "github",
+    metric: str = "stars",
+    days: int = 30,
+    min_growth: Optional[float] = None,
+    limit: int = 100,
+    company_ids: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        return crud.get_growth_rates(
+            db, family, metric, days=days, company_ids=company_ids,
+            min_growth=min_growth, limit=limit
+        )
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown metric {family}.{metric}")
+
 @app.get("/companies/{company_id}", response_model=schemas.CompanyDetail)
 def get_company(company_id: int, db: Session = Depends(get_db)):
     company = crud.get_company(db, company_id=company_id)
     if company is None:
         raise HTTPException(status_code=404, detail="Company not found")
-    return company
\ No newline at end of file
+    return company
+
+@app.get("/companies/{company_id}/similar", response_model=list[schemas.SimilarCompany])
+def get_similar_companies(
+    company_id: int,
+    k: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    if not similarity_index.loaded.is_set():
+        raise HTTPException(status_code=503, detail="Similarity index is loading", headers={"Retry-After": "5"})
+    results = similarity_index.similar(company_id, k)
+    if results is None:
+        if crud.get_company(db, company_id) is None:
+            raise HTTPException(status_code=404, detail="Company not found")
+        return []
+
+    names = crud.get_company_names(db, [other for other, _ in results])
+    return [
+        {"company_id": other, "name": names[other], "score": score}
+        for other, score in results if other in names
+    ]
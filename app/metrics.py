@@ -0,0 +1,205 @@
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    CONTENT_TYPE_LATEST, generate_latest, multiprocess, start_http_server
+)
+from prometheus_client.core import GaugeMetricFamily
+from functools import wraps
+from typing import Iterable, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Set PROMETHEUS_MULTIPROC_DIR to aggregate samples from every process of
+# one service (prefork children, API threads). Files are named by PID, so
+# each container needs its own directory, emptied before the service starts.
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+COLLECTOR_LATENCY = Histogram(
+    'collector_call_duration_seconds',
+    'Latency of external data collector calls',
+    ['source', 'method'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+COLLECTOR_ERRORS = Counter(
+    'collector_errors_total',
+    'Errors raised or swallowed by external data collectors',
+    ['source', 'method']
+)
+GITHUB_RATE_LIMIT_REMAINING = Gauge(
+    'github_rate_limit_remaining',
+    'Remaining GitHub API calls as of the last response',
+    ['token'],
+    multiprocess_mode='liveall'
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    'circuit_breaker_state',
+    'Circuit breaker state per external source (0 closed, 1 half-open, 2 open)',
+    ['source'],
+    multiprocess_mode='max'
+)
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    'circuit_breaker_transitions_total',
+    'Circuit breaker state changes',
+    ['source', 'state']
+)
+CIRCUIT_BREAKER_SKIPPED = Counter(
+    'circuit_breaker_skipped_total',
+    'Calls skipped because the source circuit was open',
+    ['source']
+)
+TASK_DURATION = Histogram(
+    'celery_task_duration_seconds',
+    'Celery task run time',
+    ['task', 'state'],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600)
+)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds',
+    'SQL statement execution time',
+    ['operation'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+HTTP_REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'API request latency',
+    ['method', 'endpoint', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+
+def token_id(token: Optional[str]) -> str:
+    """Short, non-reversible label for an API token"""
+    if not token:
+        return 'anonymous'
+    return hashlib.sha1(token.encode()).hexdigest()[:8]
+
+
+def timed(source: str):
+    """Record latency of a collector method; works for sync and async methods"""
+    def decorator(func):
+        histogram = COLLECTOR_LATENCY.labels(source, func.__name__)
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def record_error(source: str, method: str):
+    COLLECTOR_ERRORS.labels(source, method).inc()
+
+
+def instrument_sqlalchemy():
+    """Time every statement on every engine created in this process"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['query_start_time'].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+    DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+
+_task_started = {}
+
+
+def instrument_celery():
+    """Hook Celery signals for task duration and multiprocess cleanup"""
+    from celery.signals import task_prerun, task_postrun, worker_process_shutdown
+
+    task_prerun.connect(_on_task_prerun, weak=False)
+    task_postrun.connect(_on_task_postrun, weak=False)
+    worker_process_shutdown.connect(_on_worker_process_shutdown, weak=False)
+
+
+def _on_task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def _on_task_postrun(task_id=None, task=None, state=None, **kwargs):
+    start = _task_started.pop(task_id, None)
+    if start is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - start)
+
+
+def _on_worker_process_shutdown(pid=None, **kwargs):
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+class QueueDepthCollector:
+    """Reports Celery queue lengths straight from the Redis broker at scrape time"""
+
+    def __init__(self, redis_url: str, queues: Iterable[str] = ('celery',)):
+        self.redis_url = redis_url
+        self.queues = tuple(queues)
+
+    def describe(self):
+        # Avoid a Redis round-trip when the collector is registered
+        return []
+
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            'celery_queue_depth', 'Pending messages per Celery queue', labels=['queue']
+        )
+        try:
+            import redis
+            client = redis.Redis.from_url(self.redis_url, socket_timeout=1)
+            for queue in self.queues:
+                gauge.add_metric([queue], client.llen(queue))
+        except Exception as e:
+            logger.error(f"Error reading Celery queue depth: {str(e)}")
+        yield gauge
+
+
+def build_registry(redis_url: Optional[str] = None, queues: Iterable[str] = ('celery',)) -> CollectorRegistry:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    if redis_url:
+        registry.register(QueueDepthCollector(redis_url, queues))
+    return registry
+
+
+def serve_worker_metrics(port: int):
+    """Serves this worker's /metrics (every pool process in multiprocess mode) on `port`"""
+    try:
+        start_http_server(port, registry=build_registry())
+        logger.info(f"Serving worker metrics on port {port}")
+    except Exception as e:
+        logger.error(f"Error serving worker metrics on port {port}: {str(e)}")
+
+
+def render(registry: CollectorRegistry) -> Tuple[bytes, str]:
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,10 +1,60 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, LargeBinary, Index, event
 from sqlalchemy.orm import relationship
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.declarative import declarative_base, declared_attr
 from datetime import datetime
+from . import blobs
 
 Base = declarative_base()
 
+class RawBlob(Base):
+    """zstd-compressed raw payload, addressed by the SHA-256 of its canonical JSON"""
+    __tablename__ = "raw_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    size = Column(Integer)  # uncompressed bytes
+    data = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def payload(self):
+        return blobs.decode(self.data)
+
+class HomepageSnapshot(Base):
+    """zstd-compressed homepage HTML, kept so tech stack signatures can be re-run without refetching"""
+    __tablename__ = "homepage_snapshots"
+    __table_args__ = (Index("ix_homepage_snapshots_host_fetched_at", "host", "fetched_at"),)
+
+    id = Column(Integer, primary_key=True)
+    host = Column(String, nullable=False)  # canonical host of the company website
+    url = Column(String)  # where the HTML was fetched from, after redirects
+    fetched_at = Column(DateTime, default=datetime.utcnow, index=True)
+    size = Column(Integer)  # uncompressed bytes
+    compressed_size = Column(Integer)
+    data = Column(LargeBinary)
+
+    @property
+    def html(self) -> str:
+        return blobs.decompress_text(self.data)
+
+class RawPayloadMixin:
+    """
+    Metric rows keep only a reference to their raw payload. The blob is
+    fetched on first access to `raw_data`, so list queries and scoring
+    never read it.
+    """
+
+    @declared_attr
+    def raw_data_hash(cls):
+        return Column(String(64), ForeignKey("raw_blobs.hash"), index=True)
+
+    @declared_attr
+    def raw_blob(cls):
+        return relationship("RawBlob", lazy="select")
+
+    @property
+    def raw_data(self):
+        return self.raw_blob.payload if self.raw_blob is not None else {}
+
 class Company(Base):
     __tablename__ = "companies"
 
@@ -19,8 +69,19 @@ class Company(Base):
     github_metrics = relationship("GithubMetrics", back_populates="company", uselist=False)
     market_metrics = relationship("MarketMetrics", back_populates="company", uselist=False)
     tech_stack = relationship("TechStack", back_populates="company", uselist=False)
+    review_metrics = relationship("ReviewMetrics", back_populates="company", uselist=False)
+    marketing_metrics = relationship("MarketingMetrics", back_populates="company", uselist=False)
+
+    @property
+    def metrics(self):
+        """Latest metrics grouped for the detail view (schemas.CompanyDetail)"""
+        return {
+            'github': self.github_metrics,
+            'market': self.market_metrics,
+            'tech_stack': self.tech_stack
+        }
 
-class GithubMetrics(Base):
+class GithubMetrics(RawPayloadMixin, Base):
     __tablename__ = "github_metrics"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -30,12 +91,11 @@ class GithubMetrics(Base):
     contributors = Column(Integer, default=0)
     commit_frequency = Column(Float, default=0.0)
     issue_response_time = Column(Float, default=0.0)
-    raw_data = Column(JSON)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     company = relationship("Company", back_populates="github_metrics")
 
-class MarketMetrics(Base):
+class MarketMetrics(RawPayloadMixin, Base):
     __tablename__ = "market_metrics"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -47,12 +107,11 @@ class MarketMetrics(Base):
     trend_score = Column(Float, default=0.0)
     efficiency_score = Column(Float, default=0.0)
     trends_data = Column(JSON)  # Stores Google Trends data
-    raw_data = Column(JSON)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     company = relationship("Company", back_populates="market_metrics")
 
-class TechStack(Base):
+class TechStack(RawPayloadMixin, Base):
     __tablename__ = "tech_stack"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -61,11 +120,147 @@ class TechStack(Base):
     advertising_tools = Column(JSON)  # List of advertising tools detected
     marketing_tools = Column(JSON)  # List of marketing tools detected
     tech_diversity_score = Column(Float, default=0.0)
-    raw_data = Column(JSON)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     company = relationship("Company", back_populates="tech_stack")
 
+class ReviewMetrics(RawPayloadMixin, Base):
+    __tablename__ = "review_metrics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"))
+    nps_score = Column(Float, default=0.0)
+    review_count = Column(Integer, default=0)
+    average_rating = Column(Float, default=0.0)
+    sentiment_score = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    company = relationship("Company", back_populates="review_metrics")
+
+class ReviewAggregate(Base):
+    """Mergeable per-source review counts behind ReviewMetrics (see app/review_stats.py)"""
+    __tablename__ = "review_aggregates"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    source = Column(String(32), primary_key=True)
+    review_count = Column(Integer, default=0)
+    rating_sum = Column(Float, default=0.0)
+    rating_histogram = Column(JSON)  # {rating: count}
+    promoters = Column(Integer, default=0)
+    passives = Column(Integer, default=0)
+    detractors = Column(Integer, default=0)
+    sentiment_sum = Column(Float, default=0.0)
+    sentiment_count = Column(Integer, default=0)
+    sentiment_histogram = Column(JSON)  # counts per polarity bin over [-1, 1]
+    seen = Column(JSON)  # {fingerprint: review date} of the reviews folded so far
+    watermark = Column(String(10))  # newest review date folded
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MarketingMetrics(Base):
+    __tablename__ = "marketing_metrics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"))
+    estimated_spend = Column(Float, default=0.0)
+    channels = Column(JSON)
+    efficiency_score = Column(Float, default=0.0)
+    raw_data = Column(JSON)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    company = relationship("Company", back_populates="marketing_metrics")
+
+class CompanyRanking(Base):
+    """
+    Denormalized, indexed copy of every company's screening metrics.
+    Maintained incrementally by the crud update helpers in the same
+    transaction as the metrics row they change.
+    """
+    __tablename__ = "company_rankings"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    acquisition_score = Column(Float, index=True)
+    github_score = Column(Float, index=True)
+    market_score = Column(Float, index=True)
+    tech_score = Column(Float, index=True)
+    stars = Column(Integer, index=True)
+    forks = Column(Integer)
+    contributors = Column(Integer, index=True)
+    commit_frequency = Column(Float, index=True)
+    issue_response_time = Column(Float)
+    nps_score = Column(Float, index=True)
+    review_count = Column(Integer)
+    average_rating = Column(Float, index=True)
+    sentiment_score = Column(Float, index=True)
+    tranco_rank = Column(Integer, index=True)
+    efficiency_score = Column(Float, index=True)
+    search_interest_score = Column(Float)
+    trend_score = Column(Float)
+    tech_diversity_score = Column(Float)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    company = relationship("Company")
+
+class CompanyFeatures(Base):
+    """Tokens the similarity index encodes (language, topics, detected tools)"""
+    __tablename__ = "company_features"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    github_tokens = Column(JSON)
+    tech_tokens = Column(JSON)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Append-only metric history. One row per (company, timestamp, resolution);
+# raw points are rolled up into 'day' and then 'week' buckets as they age.
+# On PostgreSQL the tables are range-partitioned by month on ts.
+
+class GithubMetricsHistory(Base):
+    __tablename__ = "github_metrics_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    ts = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    resolution = Column(String(8), primary_key=True, default="raw")
+    stars = Column(Integer)
+    forks = Column(Integer)
+    contributors = Column(Integer)
+    commit_frequency = Column(Float)
+    issue_response_time = Column(Float)
+
+class MarketMetricsHistory(Base):
+    __tablename__ = "market_metrics_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    ts = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    resolution = Column(String(8), primary_key=True, default="raw")
+    tranco_rank = Column(Integer)
+    estimated_spend = Column(Float)
+    search_interest_score = Column(Float)
+    trend_score = Column(Float)
+    efficiency_score = Column(Float)
+
+class ReviewMetricsHistory(Base):
+    __tablename__ = "review_metrics_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    ts = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    resolution = Column(String(8), primary_key=True, default="raw")
+    nps_score = Column(Float)
+    review_count = Column(Integer)
+    average_rating = Column(Float)
+    sentiment_score = Column(Float)
+
+def _create_history_partitions(table, connection, **kw):
+    # A partitioned table without partitions rejects every insert, so they
+    # are created with the table, wherever create_all runs
+    if connection.dialect.name == 'postgresql':
+        from .history import create_partitions
+        create_partitions(connection, table.name)
+
+for _history_model in (GithubMetricsHistory, MarketMetricsHistory, ReviewMetricsHistory):
+    event.listen(_history_model.__table__, 'after_create', _create_history_partitions)
+
 # Pydantic models for API
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
@@ -90,7 +285,7 @@ class MarketMetricsModel(BaseModel):
     search_interest_score: float
     trend_score: float
     efficiency_score: float
-    trends_data: Dict[str, Any]
+    trends_data: Optional[Dict[str, Any]]
     raw_data: Dict[str, Any]
     updated_at: datetime
 
@@ -0,0 +1,221 @@
+"""Opt-in sampling profiler for Celery tasks and API requests.
+
+Nothing here is hooked up unless PROFILING_ENABLED is set, so normal runs
+pay nothing. With it set, a run is profiled when asked for:
+
+- tasks: `process_company_data.delay(company_id, profile=True)` (its
+  source tasks inherit the flag through a `profile` message header, and
+  the crawl jobs those queue carry it on to the frontier crawler), any
+  task sent with `headers={'profile': True}`, or every run of the tasks
+  listed in PROFILE_TASKS (`*` for all);
+- requests: an `X-Profile: 1` header. POST /companies/ passes it on to
+  the collection it queues.
+
+While a run is profiled, a native thread samples the Python stacks
+PROFILE_HZ times a second. Runs that take at least PROFILE_THRESHOLD_SECONDS
+are written to PROFILE_DIR as collapsed stacks (`<name>.folded`, for
+flamegraph.pl, speedscope or inferno) plus a `<name>.json` with the task
+or request, company ID and timings. Task profiles cover the worker's main
+thread. Under the gevent pool that is every greenlet the worker is running,
+not just the profiled task. Request profiles cover all threads, because sync
+endpoints run in the threadpool.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Optional
+import inspect
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+
+
+def _native():
+    """start_new_thread, get_ident, sleep and allocate_lock that bypass gevent's monkey patching"""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return (
+                monkey.get_original('_thread', 'start_new_thread'),
+                monkey.get_original('_thread', 'get_ident'),
+                monkey.get_original('time', 'sleep'),
+                monkey.get_original('_thread', 'allocate_lock'),
+            )
+    except ImportError:
+        pass
+    import _thread
+    return _thread.start_new_thread, _thread.get_ident, time.sleep, _thread.allocate_lock
+
+
+def _frame_name(code) -> str:
+    path = code.co_filename.replace('\\', '/').rsplit('/', 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of `thread_ids` (default: every thread) every `interval` seconds"""
+
+    def __init__(self, interval: float = 0.01, thread_ids: Optional[Iterable[int]] = None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.stacks = Counter()
+        self.samples = 0
+        self._running = False
+        self._sampler_id = None
+        # Held by the sampler thread until it exits
+        self._finished = None
+
+    def start(self) -> 'SamplingProfiler':
+        start_new_thread, _, self._sleep, allocate_lock = _native()
+        self._running = True
+        self._finished = allocate_lock()
+        self._finished.acquire()
+        self._sampler_id = start_new_thread(self._run, ())
+        return self
+
+    def stop(self) -> Counter:
+        self._running = False
+        if self._finished is not None:
+            # Wait for the sampler to exit so no sample is still writing to the stacks
+            self._finished.acquire()
+            self._finished = None
+        return self.stacks
+
+    def _run(self):
+        try:
+            while self._running:
+                self._sample()
+                self._sleep(self.interval)
+        finally:
+            self._finished.release()
+
+    def _sample(self):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self._sampler_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+
+def save_profile(directory: str, kind: str, name: str, stacks: Counter, duration: float,
+                 company_id: Optional[int] = None, task_id: Optional[str] = None, **context) -> str:
+    """Writes `<directory>/<time>-<kind>-<name>[-company-<id>][-<task id>].folded` and its .json metadata"""
+    os.makedirs(directory, exist_ok=True)
+    parts = [datetime.utcnow().strftime('%Y%m%dT%H%M%S'), kind, name]
+    parts += [f"company-{company_id}"] if company_id is not None else []
+    parts += [task_id] if task_id else []
+    base = os.path.join(directory, re.sub(r'[^A-Za-z0-9_.-]+', '_', '-'.join(parts)))
+
+    with open(f"{base}.folded", 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(f"{base}.json", 'w') as f:
+        json.dump({
+            'kind': kind,
+            'name': name,
+            'duration_seconds': round(duration, 3),
+            'samples': sum(stacks.values()),
+            'created_at': datetime.utcnow().isoformat(),
+            'company_id': company_id,
+            'task_id': task_id,
+            **context
+        }, f, indent=2, default=str)
+    return f"{base}.folded"
+
+
+class _Run:
+    def __init__(self, profiler: SamplingProfiler):
+        self.profiler = profiler
+        self.start = time.perf_counter()
+
+    def finish(self, settings, kind: str, name: str, **context) -> Optional[str]:
+        stacks = self.profiler.stop()
+        duration = time.perf_counter() - self.start
+        if duration < settings.profile_threshold_seconds:
+            return None
+        try:
+            path = save_profile(settings.profile_dir, kind, name, stacks, duration, **context)
+            logger.info(f"Profiled {kind} {name} ({duration:.2f}s) to {path}")
+            return path
+        except Exception as e:
+            logger.error(f"Error saving profile for {kind} {name}: {str(e)}")
+            return None
+
+
+def start(settings, thread_ids: Optional[Iterable[int]] = None) -> _Run:
+    return _Run(SamplingProfiler(1.0 / settings.profile_hz, thread_ids).start())
+
+
+@contextmanager
+def profiled(settings, kind: str, name: str, enabled: bool = True, **context):
+    """Profiles the calling thread for the block when `enabled`; a no-op unless PROFILING_ENABLED"""
+    if not (enabled and settings.profiling_enabled):
+        yield
+        return
+    run = start(settings, [_native()[1]()])
+    try:
+        yield
+    finally:
+        run.finish(settings, kind, name, **context)
+
+
+# Celery
+
+_task_runs = {}
+
+
+def instrument_celery(settings):
+    """Profile the task runs that ask for it; a no-op unless PROFILING_ENABLED"""
+    if not settings.profiling_enabled:
+        return
+    from celery.signals import task_prerun, task_postrun
+
+    profiled = {task.strip() for task in settings.profile_tasks.split(',') if task.strip()}
+
+    def on_prerun(task_id=None, task=None, args=None, kwargs=None, **extra):
+        asked = (kwargs or {}).get('profile') or task_requested(task.request)
+        if asked or '*' in profiled or task.name in profiled:
+            thread_id = _native()[1]()
+            _task_runs[task_id] = (start(settings, [thread_id]), _company_id(task, args, kwargs))
+
+    def on_postrun(task_id=None, task=None, **extra):
+        run = _task_runs.pop(task_id, None)
+        if run is not None:
+            run[0].finish(settings, 'task', task.name, company_id=run[1], task_id=task_id)
+
+    task_prerun.connect(on_prerun, weak=False)
+    task_postrun.connect(on_postrun, weak=False)
+
+
+def task_requested(request) -> bool:
+    """Whether a task was sent with the `profile` header"""
+    return bool(getattr(request, 'profile', None) or (getattr(request, 'headers', None) or {}).get('profile'))
+
+
+def _company_id(task, args, kwargs) -> Optional[int]:
+    if kwargs and 'company_id' in kwargs:
+        return kwargs['company_id']
+    try:
+        parameters = list(inspect.signature(task.run).parameters)
+    except (TypeError, ValueError):
+        return None
+    if args and parameters and parameters[0] == 'company_id':
+        return args[0]
+    return None
+
+
+def requested(value: Optional[str]) -> bool:
+    """Whether an X-Profile header value asks for a profile"""
+    return bool(value) and value.strip().lower() not in ('0', 'false', 'no', 'off')
@@ -0,0 +1,164 @@
+"""Mergeable review aggregates, one per company and review source.
+
+An aggregate holds everything the headline review metrics need:
+
+- the review count, rating sum and a rating histogram;
+- promoter, passive and detractor counts (ratings >= 9, 7-8, <= 6);
+- sentiment sum and count, plus a fixed-bin polarity histogram as a sketch
+  of the distribution.
+
+`fold` adds only reviews no earlier scrape has folded, so a refresh costs
+O(new reviews), and `merge` combines aggregates. Folded reviews are
+remembered durably: a fingerprint set that only grows (oldest dropped past
+MAX_SEEN), plus a watermark of the newest review date, behind which dated
+reviews count as folded already. An empty page changes nothing. A page whose
+dated reviews are all at or behind the watermark yet match none of the
+fingerprints is a changed scrape (new markup changes every fingerprint), so
+those reviews only replace their fingerprints; newer and undated reviews
+are always folded.
+NPS, average rating and sentiment come exactly from these counts and sums,
+without review text. Aggregates are plain JSON-serializable dicts.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROMOTER_MIN = 9
+DETRACTOR_MAX = 6
+SENTIMENT_BINS = 20
+# Dated reviews this long before the watermark count as folded; later ones
+# are checked against the fingerprints, as reviews can be indexed late
+WATERMARK_GRACE_DAYS = 90
+MAX_SEEN = 5000
+
+COUNTERS = ('review_count', 'rating_sum', 'promoters', 'passives', 'detractors', 'sentiment_sum', 'sentiment_count')
+
+
+def empty() -> dict:
+    return {
+        **{counter: 0 for counter in COUNTERS},
+        'rating_histogram': {},
+        'sentiment_histogram': [0] * SENTIMENT_BINS,
+        # Fingerprint -> review date ('' if undated) of every review folded
+        'seen': {},
+        # Newest review date folded, YYYY-MM-DD
+        'watermark': None,
+    }
+
+
+def fingerprint(review: dict) -> str:
+    key = '|'.join(str(review.get(field) or '') for field in ('rating', 'date', 'text', 'pros', 'cons'))
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _sentiment_bin(polarity: float) -> int:
+    return min(SENTIMENT_BINS - 1, max(0, int((polarity + 1) / 2 * SENTIMENT_BINS)))
+
+
+def _date(review: dict) -> Optional[str]:
+    try:
+        return datetime.strptime(str(review.get('date') or '')[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _cutoff(watermark: Optional[str]) -> Optional[str]:
+    if not watermark:
+        return None
+    return (datetime.strptime(watermark, '%Y-%m-%d') - timedelta(days=WATERMARK_GRACE_DAYS)).strftime('%Y-%m-%d')
+
+
+def fold(aggregate: dict, reviews: List[dict], sentiment: Callable[[dict], Optional[float]]) -> int:
+    """
+    Adds the reviews of a freshly scraped page that no earlier scrape folded
+    to `aggregate` in place. `sentiment(review)` gives a review's polarity
+    in [-1, 1], or None for no text, and is only called for new reviews.
+    Returns how many were new.
+    """
+    seen = aggregate.get('seen') or {}
+    if isinstance(seen, list):
+        # Stored before fingerprints were kept across scrapes
+        seen = dict.fromkeys(seen, '')
+    watermark = aggregate.get('watermark')
+    cutoff = _cutoff(watermark)
+
+    page = []
+    occurrences = {}
+    for review in reviews:
+        # Identical reviews on one page stay distinct by their position among the duplicates
+        key = fingerprint(review)
+        occurrences[key] = occurrences.get(key, 0) + 1
+        page.append((f"{key}:{occurrences[key]}", review, _date(review)))
+    new = [
+        (key, review, date) for key, review, date in page
+        if key not in seen and not (date and cutoff and date < cutoff)
+    ]
+    if new and watermark and all(date and date <= watermark for _, _, date in page) \
+            and not any(key in seen for key, _, _ in page):
+        # Every review predates the newest one folded, yet none matches: the scrape changed
+        logger.warning(f"No review on a page dated up to {watermark} matches an earlier scrape, "
+                       f"re-fingerprinting its {len(new)} reviews")
+        for key, _, date in new:
+            seen[key] = date
+        new = []
+
+    for key, review, date in new:
+        seen[key] = date or ''
+        if date and (watermark is None or date > watermark):
+            watermark = date
+
+        rating = review['rating']
+        aggregate['review_count'] += 1
+        aggregate['rating_sum'] += rating
+        histogram = aggregate['rating_histogram']
+        histogram[str(rating)] = histogram.get(str(rating), 0) + 1
+        if rating >= PROMOTER_MIN:
+            aggregate['promoters'] += 1
+        elif rating <= DETRACTOR_MAX:
+            aggregate['detractors'] += 1
+        else:
+            aggregate['passives'] += 1
+
+        polarity = sentiment(review)
+        if polarity is not None:
+            aggregate['sentiment_sum'] += polarity
+            aggregate['sentiment_count'] += 1
+            aggregate['sentiment_histogram'][_sentiment_bin(polarity)] += 1
+
+    # Reviews behind the watermark no longer need their fingerprints
+    cutoff = _cutoff(watermark)
+    seen = {key: date for key, date in seen.items() if not (date and cutoff and date < cutoff)}
+    aggregate['seen'] = dict(list(seen.items())[-MAX_SEEN:])
+    aggregate['watermark'] = watermark
+    return len(new)
+
+
+def merge(aggregates: Iterable[dict]) -> dict:
+    """Sum of several aggregates, e.g. every source of a company"""
+    total = empty()
+    for aggregate in aggregates:
+        for counter in COUNTERS:
+            total[counter] += aggregate.get(counter, 0)
+        for rating, count in aggregate.get('rating_histogram', {}).items():
+            total['rating_histogram'][rating] = total['rating_histogram'].get(rating, 0) + count
+        for index, count in enumerate(aggregate.get('sentiment_histogram', ())):
+            total['sentiment_histogram'][index] += count
+    del total['seen'], total['watermark']
+    return total
+
+
+def headline(aggregates: Iterable[dict]) -> Dict[str, float]:
+    """review_count, average_rating, nps_score (-100..100) and sentiment_score (0..100, 50 neutral)"""
+    total = merge(aggregates)
+    count = total['review_count']
+    nps = (total['promoters'] - total['detractors']) / count * 100 if count else 0.0
+    return {
+        'review_count': count,
+        'average_rating': total['rating_sum'] / count if count else 0.0,
+        'nps_score': max(min(nps, 100), -100),
+        'sentiment_score': (total['sentiment_sum'] / total['sentiment_count'] + 1) * 50
+                           if total['sentiment_count'] else 50.0,
+    }
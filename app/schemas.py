@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
@@ -42,13 +42,18 @@ class MarketMetrics(BaseModel):
     search_interest_score: float
     trend_score: float
     efficiency_score: float
-    trends_data: TrendsData
+    trends_data: Optional[TrendsData]
     raw_data: Dict[str, Any]
     updated_at: datetime
 
     class Config:
         orm_mode = True
 
+    @validator('trends_data', pre=True)
+    def no_trends(cls, value):
+        # Rows stored before a missing Trends payload was kept as None hold {}
+        return value or None
+
 class TechStack(BaseModel):
     analytics_tools: List[str]
     advertising_tools: List[str]
@@ -88,4 +93,44 @@ class TrancoRankResponse(BaseModel):
 
 class TrendsResponse(BaseModel):
     interest_data: TrendsData
-    last_updated: datetime
\ No newline at end of file
+    last_updated: datetime
+
+class GrowthRate(BaseModel):
+    company_id: int
+    start_value: Optional[float]
+    end_value: Optional[float]
+    first_ts: datetime
+    last_ts: datetime
+    growth_pct: Optional[float]
+    monthly_growth_pct: Optional[float]
+
+
+class ScreenResult(BaseModel):
+    company_id: int
+    name: str
+    website: Optional[str]
+    acquisition_score: Optional[float]
+    github_score: Optional[float]
+    market_score: Optional[float]
+    tech_score: Optional[float]
+    stars: Optional[int]
+    forks: Optional[int]
+    contributors: Optional[int]
+    commit_frequency: Optional[float]
+    issue_response_time: Optional[float]
+    nps_score: Optional[float]
+    review_count: Optional[int]
+    average_rating: Optional[float]
+    sentiment_score: Optional[float]
+    tranco_rank: Optional[int]
+    efficiency_score: Optional[float]
+    search_interest_score: Optional[float]
+    trend_score: Optional[float]
+    tech_diversity_score: Optional[float]
+    updated_at: Optional[datetime]
+
+
+class SimilarCompany(BaseModel):
+    company_id: int
+    name: str
+    score: float
@@ -0,0 +1,229 @@
+"""In-memory "similar companies" index.
+
+Each company is reduced to a bag of tokens (primary language, GitHub
+topics, detected marketing/analytics tools), hashed into a fixed-width
+L2-normalized float32 vector. Cosine similarity is then a single
+matrix-vector product over the NumPy matrix of all companies. If hnswlib
+is installed, an approximate HNSW graph can serve queries instead.
+
+The index loads in a background thread and then refreshes incrementally
+from company_features.updated_at. Each refresh re-reads an overlap window
+before its watermark, because updated_at is stamped before commit and a
+slow transaction can land behind rows already read. Companies whose
+features are gone are dropped by a periodic id reconcile.
+"""
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import logging
+import threading
+import time
+import numpy as np
+from . import models
+
+logger = logging.getLogger(__name__)
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# Relative weight of each token kind in the encoded vector
+TOKEN_WEIGHTS = {'lang': 1.0, 'topic': 1.0, 'tool': 0.7}
+
+
+def github_tokens(raw_data: Optional[dict]) -> List[str]:
+    if not raw_data:
+        return []
+    tokens = [f"topic:{topic.lower()}" for topic in raw_data.get('topics') or []]
+    if raw_data.get('language'):
+        tokens.append(f"lang:{raw_data['language'].lower()}")
+    return tokens
+
+
+def tech_tokens(tech_data: Optional[dict]) -> List[str]:
+    if not tech_data:
+        return []
+    return [f"tool:{tool.lower()}" for tools in tech_data.values() for tool in tools]
+
+
+@lru_cache(maxsize=65536)
+def _bucket(token: str, dim: int) -> Tuple[int, float]:
+    digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+    value = int.from_bytes(digest, 'little')
+    # Signed hashing keeps collisions from only ever adding similarity
+    return value % dim, 1.0 if (value >> 63) & 1 else -1.0
+
+
+class SimilarityIndex:
+    def __init__(self, dim: int = 128, use_ann: bool = False, ann_threshold: int = 50000,
+                 overlap_seconds: float = 300, reconcile_seconds: float = 600):
+        self.dim = dim
+        self.use_ann = use_ann and hnswlib is not None
+        self.ann_threshold = ann_threshold
+        self.vectors = np.zeros((1024, dim), dtype=np.float32)
+        self.ids = np.full(1024, -1, dtype=np.int64)
+        self.positions: Dict[int, int] = {}
+        self.size = 0
+        self.watermark: Optional[datetime] = None
+        # Longer than any transaction that writes company_features
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.reconcile_seconds = reconcile_seconds
+        self.loaded = threading.Event()
+        self._ann = None
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._reconciled_at = 0.0
+
+    def encode(self, tokens: Iterable[str]) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in set(tokens):
+            index, sign = _bucket(token, self.dim)
+            vector[index] += sign * TOKEN_WEIGHTS.get(token.split(':', 1)[0], 1.0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def upsert(self, company_id: int, tokens: Iterable[str]):
+        vector = self.encode(tokens)
+        with self._lock:
+            position = self.positions.get(company_id)
+            if position is None:
+                if self.size == len(self.ids):
+                    self._grow()
+                position = self.size
+                self.positions[company_id] = position
+                self.ids[position] = company_id
+                self.size += 1
+            self.vectors[position] = vector
+            if self._ann is not None:
+                self._ann_add([company_id], vector[None, :])
+
+    def remove(self, company_id: int):
+        with self._lock:
+            position = self.positions.pop(company_id, None)
+            if position is None:
+                return
+            # The last row fills the gap so vectors[:size] stays dense
+            last = self.size - 1
+            if position != last:
+                moved = int(self.ids[last])
+                self.vectors[position] = self.vectors[last]
+                self.ids[position] = moved
+                self.positions[moved] = position
+            self.vectors[last] = 0
+            self.ids[last] = -1
+            self.size = last
+            if self._ann is not None:
+                self._ann.mark_deleted(company_id)
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        ids = np.full(capacity, -1, dtype=np.int64)
+        ids[:self.size] = self.ids[:self.size]
+        self.vectors, self.ids = vectors, ids
+
+    def _ann_add(self, company_ids, vectors):
+        if self._ann.get_current_count() + len(company_ids) > self._ann.get_max_elements():
+            self._ann.resize_index(max(self._ann.get_max_elements() * 2, len(self.ids)))
+        self._ann.add_items(vectors, company_ids)
+
+    def _build_ann(self):
+        self._ann = hnswlib.Index(space='ip', dim=self.dim)
+        self._ann.init_index(max_elements=len(self.ids), ef_construction=200, M=16)
+        self._ann.set_ef(100)
+        self._ann.add_items(self.vectors[:self.size], self.ids[:self.size])
+
+    def similar(self, company_id: int, k: int = 20) -> Optional[List[Tuple[int, float]]]:
+        """Top-k (company_id, cosine similarity); None if the company isn't indexed"""
+        with self._lock:
+            position = self.positions.get(company_id)
+            if position is None:
+                return None
+            query = self.vectors[position]
+            if not query.any():
+                return []
+
+            if self._ann is not None:
+                labels, distances = self._ann.knn_query(query, k=min(k + 1, self.size))
+                pairs = zip(labels[0].tolist(), (1 - distances[0]).tolist())
+            else:
+                scores = self.vectors[:self.size] @ query
+                scores[position] = -np.inf
+                top = min(k, self.size - 1)
+                if top <= 0:
+                    return []
+                candidates = np.argpartition(-scores, top - 1)[:top]
+                candidates = candidates[np.argsort(-scores[candidates])]
+                pairs = zip(self.ids[candidates].tolist(), scores[candidates].tolist())
+
+        return [(other, round(score, 4)) for other, score in pairs
+                if other != company_id and score > 0][:k]
+
+    def refresh(self, db: Session, chunk_size: int = 5000) -> int:
+        """Loads feature rows changed since the last refresh and drops deleted companies"""
+        with self._refresh_lock:
+            query = db.query(
+                models.CompanyFeatures.company_id,
+                models.CompanyFeatures.github_tokens,
+                models.CompanyFeatures.tech_tokens,
+                models.CompanyFeatures.updated_at
+            )
+            if self.watermark:
+                query = query.filter(models.CompanyFeatures.updated_at >= self.watermark - self.overlap)
+
+            count = 0
+            watermark = self.watermark
+            for row in query.yield_per(chunk_size):
+                self.upsert(row.company_id, (row.github_tokens or []) + (row.tech_tokens or []))
+                if row.updated_at and (watermark is None or row.updated_at > watermark):
+                    watermark = row.updated_at
+                count += 1
+
+            removed = 0
+            if not self.loaded.is_set():
+                self._reconciled_at = time.monotonic()
+            elif time.monotonic() - self._reconciled_at >= self.reconcile_seconds:
+                removed = self._reconcile(db, chunk_size)
+            self.watermark = watermark
+
+            with self._lock:
+                if self.use_ann and self._ann is None and self.size >= self.ann_threshold:
+                    self._build_ann()
+            self.loaded.set()
+        if count or removed:
+            logger.info(f"Similarity index refreshed {count} and removed {removed} companies ({self.size} total)")
+        return count
+
+    def _reconcile(self, db: Session, chunk_size: int) -> int:
+        present = {
+            row.company_id for row in db.query(models.CompanyFeatures.company_id)
+            .join(models.Company, models.Company.id == models.CompanyFeatures.company_id)
+            .yield_per(chunk_size * 10)
+        }
+        with self._lock:
+            stale = [company_id for company_id in self.positions if company_id not in present]
+        for company_id in stale:
+            self.remove(company_id)
+        self._reconciled_at = time.monotonic()
+        return len(stale)
+
+    def start_background_refresh(self, session_factory, interval: float) -> threading.Thread:
+        """Loads the index, then refreshes it every `interval` seconds, off the request path"""
+        def run():
+            while True:
+                db = session_factory()
+                try:
+                    self.refresh(db)
+                except Exception as e:
+                    logger.error(f"Error refreshing similarity index: {str(e)}")
+                finally:
+                    db.close()
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name='similarity-refresh', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,179 @@
+"""Compressed homepage snapshots and offline tech stack re-detection.
+
+Every homepage the tech stack detector fetches is stored zstd-compressed
+in `homepage_snapshots`, keyed by the company's canonical host and fetch
+time. Each host keeps its `snapshots_per_host` most recent fetches, and
+the oldest fetches store-wide are evicted once the compressed total passes
+`snapshot_max_bytes`: by `store` as soon as its running total goes over,
+and by `evict` as a batch job.
+
+`redetect` runs the current TECH_SIGNATURES over the latest snapshot of
+every host in a process pool and bulk-updates the TechStack rows of the
+companies on those hosts, so a signature change is a local CPU job:
+
+    python -m app.snapshots redetect --processes 8
+    python -m app.snapshots evict
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+import argparse
+import logging
+import time
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from . import models, blobs, crud
+from .domains import canonical_host
+
+logger = logging.getLogger(__name__)
+
+# Compressed bytes in the store as last summed by this process, plus its own
+# writes since. Other workers' writes show up at the next resync.
+TOTAL_RESYNC_SECONDS = 60
+_total = {'bytes': None, 'summed_at': 0.0}
+
+
+def store(db: Session, host: str, url: str, html: str, keep: int = 2, max_bytes: Optional[int] = None):
+    """
+    Adds a snapshot and drops the host's older ones beyond the `keep` most
+    recent. Once the running total passes `max_bytes`, evicts the oldest
+    snapshots store-wide.
+    """
+    data, size = blobs.compress_text(html)
+    db.add(models.HomepageSnapshot(
+        host=host, url=url, fetched_at=datetime.utcnow(), size=size, compressed_size=len(data), data=data
+    ))
+    db.flush()
+    stale = db.query(models.HomepageSnapshot.id, models.HomepageSnapshot.compressed_size)\
+        .filter(models.HomepageSnapshot.host == host)\
+        .order_by(models.HomepageSnapshot.fetched_at.desc(), models.HomepageSnapshot.id.desc())\
+        .offset(keep)\
+        .all()
+    if stale:
+        db.query(models.HomepageSnapshot)\
+            .filter(models.HomepageSnapshot.id.in_([row.id for row in stale]))\
+            .delete(synchronize_session=False)
+    db.commit()
+
+    if max_bytes is not None:
+        added = len(data) - sum(row.compressed_size or 0 for row in stale)
+        if _running_total(db, added) > max_bytes:
+            deleted = evict(db, max_bytes)
+            logger.info(f"Evicted {deleted} homepage snapshots over the size cap")
+            _total['bytes'] = None
+
+
+def _running_total(db: Session, added: int) -> int:
+    now = time.monotonic()
+    if _total['bytes'] is None or now - _total['summed_at'] > TOTAL_RESYNC_SECONDS:
+        _total['bytes'] = _stored_bytes(db)
+        _total['summed_at'] = now
+    else:
+        _total['bytes'] += added
+    return _total['bytes']
+
+
+def _stored_bytes(db: Session) -> int:
+    return db.query(func.coalesce(func.sum(models.HomepageSnapshot.compressed_size), 0)).scalar()
+
+
+def evict(db: Session, max_bytes: int, batch_size: int = 1000) -> int:
+    """Deletes the oldest snapshots until the compressed total fits in `max_bytes`"""
+    total = _stored_bytes(db)
+    deleted = 0
+    while total > max_bytes:
+        oldest = db.query(models.HomepageSnapshot.id, models.HomepageSnapshot.compressed_size)\
+            .order_by(models.HomepageSnapshot.fetched_at, models.HomepageSnapshot.id)\
+            .limit(batch_size)\
+            .all()
+        if not oldest:
+            break
+        ids = []
+        for row in oldest:
+            if total <= max_bytes:
+                break
+            ids.append(row.id)
+            total -= row.compressed_size or 0
+        db.query(models.HomepageSnapshot)\
+            .filter(models.HomepageSnapshot.id.in_(ids))\
+            .delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+    return deleted
+
+
+def _detect(data: bytes) -> dict:
+    # Runs in the pool processes: decompression and matching both stay off the parent
+    from .collectors.marketing import detect_tech_stack
+    return detect_tech_stack(blobs.decompress_text(data))
+
+
+def _companies_by_host(db: Session) -> Dict[str, List[int]]:
+    companies = defaultdict(list)
+    for company_id, website in db.query(models.Company.id, models.Company.website).yield_per(10000):
+        host = canonical_host(website)
+        if host:
+            companies[host].append(company_id)
+    return companies
+
+
+def redetect(db: Session, processes: Optional[int] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """Re-runs tech stack detection over the latest snapshot of every host"""
+    companies = _companies_by_host(db)
+    latest = db.query(
+        models.HomepageSnapshot.host,
+        func.max(models.HomepageSnapshot.fetched_at).label('fetched_at')
+    ).group_by(models.HomepageSnapshot.host).subquery()
+    # Ids first, then the HTML a batch at a time, so commits never cut a streaming cursor short
+    snapshot_ids = [row.id for row in db.query(models.HomepageSnapshot.id).join(latest, and_(
+        models.HomepageSnapshot.host == latest.c.host,
+        models.HomepageSnapshot.fetched_at == latest.c.fetched_at
+    ))]
+
+    stats = {'snapshots': 0, 'companies': 0}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for start in range(0, len(snapshot_ids), batch_size):
+            batch = db.query(models.HomepageSnapshot.host, models.HomepageSnapshot.data)\
+                .filter(models.HomepageSnapshot.id.in_(snapshot_ids[start:start + batch_size]))\
+                .all()
+            results = pool.map(_detect, [row.data for row in batch], chunksize=16)
+            tech_data = {
+                company_id: result
+                for row, result in zip(batch, results)
+                for company_id in companies.get(row.host, ())
+            }
+            stats['snapshots'] += len(batch)
+            stats['companies'] += crud.bulk_update_tech_stacks(db, tech_data)
+    return stats
+
+
+def main(argv=None):
+    from .config import Settings
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    redetect_parser = commands.add_parser('redetect', help='Re-run tech stack signatures over stored snapshots')
+    redetect_parser.add_argument('--processes', type=int, default=None, help='Defaults to one per CPU')
+    redetect_parser.add_argument('--batch-size', type=int, default=1000)
+    commands.add_parser('evict', help='Trim the snapshot store to SNAPSHOT_MAX_BYTES')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    settings = Settings()
+    db = SessionLocal()
+    try:
+        if args.command == 'redetect':
+            stats = redetect(db, args.processes, args.batch_size)
+            logger.info(f"Re-detected tech stacks from {stats['snapshots']} snapshots "
+                        f"for {stats['companies']} companies")
+        else:
+            deleted = evict(db, settings.snapshot_max_bytes)
+            logger.info(f"Evicted {deleted} homepage snapshots")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
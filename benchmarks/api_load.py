@@ -0,0 +1,404 @@
+"""Read API load test at realistic table sizes.
+
+Seeds a PostgreSQL or SQLite database with `--companies` companies, each
+with GitHub, market, review and tech stack rows and ~`--raw-bytes` raw
+payloads in the blob store. PostgreSQL is loaded with COPY, SQLite with
+chunked executemany. The app is then served by uvicorn and driven over
+HTTP by `--concurrency` concurrent clients, one endpoint at a time:
+
+    list     GET /companies/?skip=<random>&limit=100
+    detail   GET /companies/{random id}
+    screen   GET /companies/screen?min_stars=...&sort=-acquisition_score
+
+For each endpoint it reports RPS, p50/p95/p99 latency, errors and SQL
+statements per request (from the app's db_query_duration_seconds counts).
+Reports are JSON, and --baseline prints the change against an earlier one:
+
+    python -m benchmarks.api_load --companies 1000000 --database-url postgresql://... --output before.json
+    python -m benchmarks.api_load --companies 1000000 --database-url postgresql://... --reuse \\
+        --baseline before.json --output after.json
+"""
+from typing import Callable, Dict, Iterator, List, Optional
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+ENDPOINTS = ('list', 'detail', 'screen')
+WORDS = ('data', 'platform', 'open', 'source', 'fast', 'cloud', 'native', 'api', 'analytics',
+         'developer', 'workflow', 'secure', 'scalable', 'realtime', 'sdk', 'framework', 'engine')
+LANGUAGES = ('Python', 'Go', 'TypeScript', 'Rust', 'Java', 'Ruby', 'JavaScript', 'C++')
+TOPICS = ('saas', 'analytics', 'devtools', 'api', 'database', 'ml', 'crm', 'security', 'observability')
+TOOLS = {
+    'analytics_tools': ['Google Analytics', 'Segment', 'Mixpanel', 'Amplitude'],
+    'advertising_tools': ['Google Ads', 'Google AdSense', 'Facebook Pixel'],
+    'marketing_tools': ['HubSpot', 'Marketo', 'Intercom'],
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--companies', type=int, default=100000)
+    parser.add_argument('--raw-bytes', type=int, default=2048,
+                        help='Approximate size of each raw payload; 0 seeds no blobs')
+    parser.add_argument('--database-url', default=None, help='Defaults to a fresh SQLite file')
+    parser.add_argument('--reuse', action='store_true',
+                        help='Skip seeding if the database already holds --companies companies')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per seeding batch')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20.0, help='Measured seconds per endpoint')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Unmeasured seconds per endpoint')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', help='Earlier report to compare against')
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    return parser.parse_args(argv)
+
+
+# Seeding
+
+def _raw_payload(rng: random.Random, size: int, **fields) -> dict:
+    payload = dict(fields)
+    words = []
+    length = len(json.dumps(payload))
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    payload['description'] = ' '.join(words)
+    return payload
+
+
+def _company_rows(start: int, end: int, rng: random.Random, raw_bytes: int, now: datetime) -> Dict[str, List[dict]]:
+    from app import blobs
+
+    rows = {name: [] for name in ('raw_blobs', 'companies', 'github_metrics', 'market_metrics',
+                                  'review_metrics', 'tech_stack')}
+
+    def blob(payload) -> Optional[str]:
+        if not raw_bytes:
+            return None
+        digest, data, size = blobs.encode(payload)
+        rows['raw_blobs'].append({'hash': digest, 'size': size, 'data': data, 'created_at': now})
+        return digest
+
+    for company_id in range(start, end):
+        name = f'company-{company_id:07d}'
+        updated = now - timedelta(minutes=rng.randrange(60 * 24 * 30))
+        stars = int(rng.paretovariate(1.2) * 20)
+        language = rng.choice(LANGUAGES)
+        topics = rng.sample(TOPICS, rng.randint(0, 4))
+        tranco_rank = rng.randint(1, 1000000) if rng.random() < 0.7 else None
+        tools = {column: rng.sample(choices, rng.randint(0, len(choices))) for column, choices in TOOLS.items()}
+
+        rows['companies'].append({
+            'id': company_id, 'name': name, 'github_url': f'https://github.com/{name}/core',
+            'website': f'https://www.{name}.example', 'created_at': updated, 'updated_at': updated,
+            'acquisition_score': round(rng.uniform(0, 100), 2),
+        })
+        rows['github_metrics'].append({
+            'id': company_id, 'company_id': company_id, 'stars': stars, 'forks': stars // 5,
+            'contributors': rng.randint(1, 500), 'commit_frequency': round(rng.uniform(0, 40), 2),
+            'issue_response_time': round(rng.uniform(0.5, 200), 2), 'updated_at': updated,
+            'raw_data_hash': blob(_raw_payload(
+                rng, raw_bytes, language=language, topics=topics, open_issues=rng.randint(0, 900),
+                watchers=stars // 10, last_update=updated.isoformat(),
+                weekly_commits=[rng.randint(0, 60) for _ in range(52)]
+            )),
+        })
+        interest = [rng.randint(0, 100) for _ in range(13)]
+        rows['market_metrics'].append({
+            'id': company_id, 'company_id': company_id, 'tranco_rank': tranco_rank,
+            'estimated_traffic': None,
+            'estimated_spend': round(1000000 * tranco_rank ** -0.7, 2) if tranco_rank else 0.0,
+            'search_interest_score': sum(interest[-4:]) / 4, 'trend_score': round(rng.uniform(-50, 50), 2),
+            'efficiency_score': round(rng.uniform(0, 100), 2),
+            'trends_data': {'interest_over_time': interest, 'related_queries': {'rising': [], 'top': []}},
+            'updated_at': updated,
+            'raw_data_hash': blob(_raw_payload(
+                rng, raw_bytes, tranco={'rank': tranco_rank}, trends={'interest_over_time': interest}
+            )),
+        })
+        review_count = rng.randint(0, 200)
+        rows['review_metrics'].append({
+            'id': company_id, 'company_id': company_id, 'nps_score': round(rng.uniform(-100, 100), 1),
+            'review_count': review_count, 'average_rating': round(rng.uniform(1, 10), 2),
+            'sentiment_score': round(rng.uniform(0, 100), 2), 'updated_at': updated,
+            'raw_data_hash': blob(_raw_payload(rng, raw_bytes, g2={'review_count': review_count})),
+        })
+        rows['tech_stack'].append({
+            'id': company_id, 'company_id': company_id, **tools,
+            'tech_diversity_score': min(100, sum(len(found) for found in tools.values()) * 20),
+            'updated_at': updated, 'raw_data_hash': None,
+        })
+    return rows
+
+
+def _copy(connection, table, rows: List[dict]):
+    """PostgreSQL COPY ... FROM STDIN (CSV) through the raw psycopg2 cursor"""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            '' if (value := row[column]) is None
+            else '\\x' + value.hex() if isinstance(value, bytes)
+            else json.dumps(value) if isinstance(value, (dict, list))
+            else value.isoformat() if isinstance(value, datetime)
+            else value
+            for column in columns
+        ])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def seed(engine, companies: int, raw_bytes: int, chunk_size: int, seed_value: int):
+    from app import crud, models
+    from app.database import SessionLocal, init_db
+
+    init_db()
+    tables = models.Base.metadata.tables
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    postgres = engine.dialect.name == 'postgresql'
+    started = time.perf_counter()
+
+    with engine.begin() as connection:
+        for name in ('tech_stack', 'review_metrics', 'market_metrics', 'github_metrics',
+                     'company_rankings', 'company_features', 'companies', 'raw_blobs'):
+            connection.execute(tables[name].delete())
+
+    for start in range(1, companies + 1, chunk_size):
+        batch = _company_rows(start, min(start + chunk_size, companies + 1), rng, raw_bytes, now)
+        with engine.begin() as connection:
+            for name, rows in batch.items():
+                if not rows:
+                    continue
+                if postgres:
+                    _copy(connection, tables[name], rows)
+                else:
+                    connection.execute(tables[name].insert().prefix_with('OR IGNORE')
+                                       if name == 'raw_blobs' else tables[name].insert(), rows)
+        print(f"\rseeded {min(start + chunk_size - 1, companies)}/{companies} companies", end='', file=sys.stderr)
+    print(file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        crud.rebuild_rankings(db)
+    finally:
+        db.close()
+    if postgres:
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM ANALYZE')
+    return time.perf_counter() - started
+
+
+# Load generation
+
+def _url_generators(companies: int, rng: random.Random) -> Dict[str, Callable[[], str]]:
+    return {
+        'list': lambda: f"/companies/?skip={rng.randrange(max(1, companies - 100))}&limit=100",
+        'detail': lambda: f"/companies/{rng.randint(1, companies)}",
+        'screen': lambda: (f"/companies/screen?min_stars={rng.choice((10, 100, 1000))}"
+                           f"&max_efficiency_score={rng.choice((40, 60, 80))}&sort=-acquisition_score&limit=50"),
+    }
+
+
+def _query_count(base_url: str) -> float:
+    """Total SQL statements the app has executed, across all workers"""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    with urllib.request.urlopen(f"{base_url}/metrics", timeout=10) as response:
+        text = response.read().decode()
+    return sum(
+        sample.value
+        for family in text_string_to_metric_families(text) if family.name == 'db_query_duration_seconds'
+        for sample in family.samples if sample.name.endswith('_count')
+    )
+
+
+async def _drive(base_url: str, next_url: Callable[[], str], concurrency: int, seconds: float):
+    import aiohttp
+
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    async with session.get(base_url + next_url()) as response:
+                        await response.read()
+                        if response.status >= 400:
+                            errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_endpoint(base_url: str, endpoint: str, next_url: Callable[[], str], args) -> dict:
+    if args.warmup:
+        asyncio.run(_drive(base_url, next_url, args.concurrency, args.warmup))
+    queries_before = _query_count(base_url)
+    start = time.perf_counter()
+    latencies, errors = asyncio.run(_drive(base_url, next_url, args.concurrency, args.duration))
+    elapsed = time.perf_counter() - start
+    queries = _query_count(base_url) - queries_before
+
+    return {
+        'endpoint': endpoint,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'queries_per_request': round(queries / len(latencies), 2) if latencies else 0.0,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(env: dict, workers: int):
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+        env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/healthz", timeout=1):
+                return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("API did not become healthy within 60s")
+
+
+# Reporting
+
+def print_report(results: List[dict], baseline: Optional[dict] = None):
+    previous = {r['endpoint']: r for r in (baseline or {}).get('results', [])}
+    print(f"{'endpoint':<8} {'requests':>9} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'queries':>8}")
+    for r in results:
+        print(f"{r['endpoint']:<8} {r['requests']:>9} {r['rps']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+              f"{r['p99_ms']:>9} {r['errors']:>7} {r['queries_per_request']:>8}")
+        if r['endpoint'] in previous:
+            old = previous[r['endpoint']]
+            changes = [
+                f"{key} {((r[key] - old[key]) / old[key] * 100):+.1f}%"
+                for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms') if old.get(key)
+            ]
+            changes.append(f"queries {old['queries_per_request']} -> {r['queries_per_request']}")
+            print(f"{'':<8} vs baseline: {', '.join(changes)}")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp(prefix='aiquisition-api-load-')
+    database_url = args.database_url or f"sqlite:///{workdir}/api_load.db"
+    env = dict(os.environ)
+    env.setdefault('GITHUB_TOKEN', 'benchmark-token')
+    env.setdefault('REDIS_URL', 'redis://localhost:6379/0')
+    env['DATABASE_URL'] = database_url
+    # Aggregates query counts over every uvicorn worker
+    env['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(workdir, 'prometheus')
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+    os.environ.update(GITHUB_TOKEN=env['GITHUB_TOKEN'], REDIS_URL=env['REDIS_URL'], DATABASE_URL=database_url)
+
+    from sqlalchemy import func, select
+    from app import models
+    from app.database import engine
+
+    seed_seconds = None
+    existing = 0
+    if args.reuse:
+        try:
+            with engine.connect() as connection:
+                existing = connection.execute(select(func.count()).select_from(models.Company.__table__)).scalar()
+        except Exception:
+            existing = 0
+    if existing != args.companies:
+        seed_seconds = seed(engine, args.companies, args.raw_bytes, args.chunk_size, args.seed)
+        print(f"seeded in {seed_seconds:.1f}s", file=sys.stderr)
+
+    process, base_url = serve(env, args.workers)
+    try:
+        rng = random.Random(args.seed)
+        generators = _url_generators(args.companies, rng)
+        results = [run_endpoint(base_url, endpoint, generators[endpoint], args) for endpoint in args.endpoints]
+    finally:
+        process.terminate()
+        process.wait()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        report = {
+            'version': 1,
+            'git_commit': _git_commit(),
+            'created_at': datetime.utcnow().isoformat(),
+            'args': vars(args),
+            'dataset': {
+                'dialect': engine.dialect.name,
+                'companies': args.companies,
+                'raw_bytes': args.raw_bytes,
+                'seed_seconds': round(seed_seconds, 1) if seed_seconds else None,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
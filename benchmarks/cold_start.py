@@ -0,0 +1,105 @@
+"""API cold-start benchmark.
+
+Measures, in fresh interpreters, how long `import app.main` takes and how
+long a new uvicorn process needs until /healthz answers 200, i.e. how soon
+an autoscaled replica can take traffic. Exits non-zero when the median
+time to healthy exceeds --target.
+
+Usage:
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --runs 10 --target 1.0 --output cold_start.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--target', type=float, default=1.0, help='Seconds from spawn to a healthy /healthz')
+    parser.add_argument('--database-url', default=None, help='Defaults to a fresh SQLite file')
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    return parser.parse_args(argv)
+
+
+def _environment(database_url: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault('GITHUB_TOKEN', 'benchmark-token')
+    env.setdefault('REDIS_URL', 'redis://localhost:6379/0')
+    env['DATABASE_URL'] = database_url
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env: dict) -> float:
+    result = subprocess.run(
+        [sys.executable, '-c', IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_time_to_healthy(env: dict, timeout: float = 30.0) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port), '--log-level', 'warning'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/healthz', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/healthz not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='aiquisition-cold-start-')
+    env = _environment(args.database_url or f"sqlite:///{workdir}/cold_start.db")
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    healthy = [measure_time_to_healthy(env) for _ in range(args.runs)]
+    report = {
+        'runs': args.runs,
+        'import_median_s': round(statistics.median(imports), 3),
+        'import_max_s': round(max(imports), 3),
+        'healthy_median_s': round(statistics.median(healthy), 3),
+        'healthy_max_s': round(max(healthy), 3),
+        'target_s': args.target,
+    }
+    report['passed'] = report['healthy_median_s'] <= args.target
+
+    print(f"import app.main   median {report['import_median_s']}s  max {report['import_max_s']}s")
+    print(f"spawn -> /healthz median {report['healthy_median_s']}s  max {report['healthy_max_s']}s  "
+          f"(target {args.target}s: {'ok' if report['passed'] else 'MISSED'})")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': report}, f, indent=2)
+    sys.exit(0 if report['passed'] else 1)
+
+
+if __name__ == '__main__':
+    main()
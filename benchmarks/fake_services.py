@@ -0,0 +1,387 @@
+"""Local stand-ins for the external services the collectors talk to.
+
+Everything is served from one aiohttp app under per-service prefixes:
+
+    /github    GitHub REST (+ a minimal /graphql)
+    /tranco    Tranco rank API
+    /trends    Google Trends (explore + widgetdata endpoints)
+    /g2        G2 review pages
+    /capterra  Capterra review pages
+    /site      Company homepages
+
+Each service has its own artificial latency and token-bucket rate limit,
+and every request is counted so callers can report calls per company.
+"""
+from aiohttp import web
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import asyncio
+import json
+import random
+import threading
+import time
+import zlib
+
+SERVICES = ('github', 'tranco', 'trends', 'g2', 'capterra', 'site')
+TOPICS = ['saas', 'analytics', 'devtools', 'api', 'database', 'ml', 'crm', 'security']
+
+
+@dataclass
+class ServiceProfile:
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    rate_limit: Optional[float] = None  # requests per second, None = unlimited
+    burst: int = 50
+
+
+@dataclass
+class FakeServiceConfig:
+    profiles: Dict[str, ServiceProfile] = field(
+        default_factory=lambda: {name: ServiceProfile() for name in SERVICES}
+    )
+    reviews_per_page: int = 25
+    closed_issues: int = 40
+    # Participation stats answer 202 (computing) this many times per repo first
+    stats_computing_responses: int = 1
+    # GitHub calls each token may make per quota window, None = unlimited
+    github_quota: Optional[int] = None
+    github_quota_window: float = 3600.0
+    seed: int = 42
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def _stable_int(key: str, low: int, high: int) -> int:
+    """Deterministic pseudo-random integer per key, so reruns see the same data"""
+    return low + zlib.crc32(key.encode()) % (high - low + 1)
+
+
+class FakeServices:
+    def __init__(self, config: Optional[FakeServiceConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or FakeServiceConfig()
+        self.host = host
+        self.port = port
+        self.calls = Counter()
+        self.rejected = Counter()
+        self._buckets = {
+            name: _TokenBucket(profile.rate_limit, profile.burst)
+            for name, profile in self.config.profiles.items()
+            if profile.rate_limit
+        }
+        self._stats_requests = Counter()
+        self._github_usage = Counter()
+        self._github_window_start = time.time()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+
+    # Lifecycle
+
+    def start(self) -> 'FakeServices':
+        self._thread = threading.Thread(target=self._serve, name='fake-services', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def url(self, service: str) -> str:
+        return f"http://{self.host}:{self.port}/{service}"
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.rejected.clear()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self._build_app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+    def _build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._shape_traffic])
+        app.router.add_get('/github/repos/{owner}/{repo}', self.github_repo)
+        app.router.add_get('/github/repos/{owner}/{repo}/contributors', self.github_counted_list)
+        app.router.add_get('/github/repos/{owner}/{repo}/commits', self.github_counted_list)
+        app.router.add_get('/github/repos/{owner}/{repo}/topics', self.github_topics)
+        app.router.add_get('/github/repos/{owner}/{repo}/stats/participation', self.github_participation)
+        app.router.add_get('/github/repos/{owner}/{repo}/issues', self.github_issues)
+        app.router.add_get('/github/repos/{owner}/{repo}/issues/{number}/comments', self.github_comments)
+        app.router.add_get('/github/rate_limit', self.github_rate_limit)
+        app.router.add_post('/github/graphql', self.github_graphql)
+        app.router.add_get('/tranco/api/ranks/domain/{domain}', self.tranco_rank)
+        app.router.add_get('/trends/explore/', self.trends_cookie)
+        app.router.add_post('/trends/api/explore', self.trends_explore)
+        app.router.add_get('/trends/api/widgetdata/multiline', self.trends_interest)
+        app.router.add_get('/trends/api/widgetdata/relatedsearches', self.trends_related)
+        app.router.add_get('/g2/products/{name}/reviews', self.g2_reviews)
+        app.router.add_get('/capterra/p/{name}/reviews', self.capterra_reviews)
+        app.router.add_get('/site/{domain}', self.homepage)
+        return app
+
+    @web.middleware
+    async def _shape_traffic(self, request, handler):
+        service = request.path.strip('/').split('/', 1)[0]
+        profile = self.config.profiles.get(service, ServiceProfile())
+        self.calls[service] += 1
+
+        bucket = self._buckets.get(service)
+        if bucket and not bucket.take():
+            self.rejected[service] += 1
+            if service == 'github':
+                return web.json_response(
+                    {'message': 'API rate limit exceeded'}, status=403,
+                    headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Limit': '5000',
+                             'X-RateLimit-Reset': str(int(time.time()) + 60)}
+                )
+            return web.Response(status=429, headers={'Retry-After': '1'})
+
+        quota = self._github_quota(request) if service == 'github' else None
+        if quota and quota['X-RateLimit-Remaining'] == '-1':
+            self.rejected[service] += 1
+            quota['X-RateLimit-Remaining'] = '0'
+            return web.json_response({'message': 'API rate limit exceeded'}, status=403, headers=quota)
+
+        delay = profile.latency_ms + random.uniform(-profile.jitter_ms, profile.jitter_ms)
+        await asyncio.sleep(max(delay, 0) / 1000)
+        response = await handler(request)
+        if quota:
+            response.headers.update(quota)
+        return response
+
+    def _github_quota(self, request) -> Optional[Dict[str, str]]:
+        """Per-token budget headers for this call; remaining is -1 once the token is over quota"""
+        if not self.config.github_quota:
+            return None
+        now = time.time()
+        if now - self._github_window_start >= self.config.github_quota_window:
+            self._github_usage.clear()
+            self._github_window_start = now
+        token = request.headers.get('Authorization', '')
+        self._github_usage[token] += 1
+        return {
+            'X-RateLimit-Limit': str(self.config.github_quota),
+            'X-RateLimit-Remaining': str(max(-1, self.config.github_quota - self._github_usage[token])),
+            'X-RateLimit-Reset': str(int(self._github_window_start + self.config.github_quota_window)),
+        }
+
+    # GitHub
+
+    def _github_headers(self, extra=None):
+        headers = {'X-RateLimit-Remaining': '4999', 'X-RateLimit-Limit': '5000',
+                   'X-RateLimit-Reset': str(int(time.time()) + 3600)}
+        headers.update(extra or {})
+        return headers
+
+    def _repo_url(self, request) -> str:
+        return f"{self.url('github')}/repos/{request.match_info['owner']}/{request.match_info['repo']}"
+
+    async def github_repo(self, request):
+        full_name = f"{request.match_info['owner']}/{request.match_info['repo']}"
+        return web.json_response({
+            'id': _stable_int(full_name, 1, 10 ** 8),
+            'name': request.match_info['repo'],
+            'full_name': full_name,
+            'url': self._repo_url(request),
+            'description': f'Synthetic repository {full_name}',
+            'language': random.Random(full_name).choice(['Python', 'Go', 'TypeScript', 'Rust', 'Java']),
+            'stargazers_count': _stable_int(full_name + 'stars', 0, 50000),
+            'forks_count': _stable_int(full_name + 'forks', 0, 5000),
+            'open_issues_count': _stable_int(full_name + 'issues', 0, 500),
+            'subscribers_count': _stable_int(full_name + 'watchers', 0, 2000),
+            'updated_at': '2024-01-06T12:00:00Z',
+            'topics': random.Random(full_name).sample(TOPICS, 3),
+        }, headers=self._github_headers())
+
+    async def github_counted_list(self, request):
+        """Contributors/commits: PyGithub's totalCount reads the last page from the Link header"""
+        total = _stable_int(request.path, 1, 400)
+        per_page = int(request.query.get('per_page', 30))
+        page = int(request.query.get('page', 1))
+        last_page = max(1, -(-total // per_page))
+        query = dict(request.query)
+        query['page'] = str(last_page)
+        link = f'<{request.url.with_query(query)}>; rel="last"'
+        count = min(per_page, max(0, total - (page - 1) * per_page))
+        items = [{'login': f'user{i}', 'sha': f'{i:040x}'} for i in range(count)]
+        return web.json_response(items, headers=self._github_headers({'Link': link}))
+
+    async def github_topics(self, request):
+        full_name = f"{request.match_info['owner']}/{request.match_info['repo']}"
+        return web.json_response({'names': random.Random(full_name).sample(TOPICS, 3)},
+                                 headers=self._github_headers())
+
+    async def github_participation(self, request):
+        self._stats_requests[request.path] += 1
+        if self._stats_requests[request.path] <= self.config.stats_computing_responses:
+            return web.json_response({}, status=202, headers=self._github_headers())
+        rng = random.Random(request.path)
+        weeks = [rng.randint(0, 60) for _ in range(52)]
+        return web.json_response({'all': weeks, 'owner': [w // 3 for w in weeks]},
+                                 headers=self._github_headers())
+
+    async def github_issues(self, request):
+        total = self.config.closed_issues
+        per_page = int(request.query.get('per_page', 30))
+        page = int(request.query.get('page', 1))
+        start = (page - 1) * per_page
+        repo_url = self._repo_url(request)
+        issues = [{
+            'number': n,
+            'url': f'{repo_url}/issues/{n}',
+            'comments': n % 3,
+            'created_at': '2024-01-01T00:00:00Z',
+            'state': 'closed',
+        } for n in range(start + 1, min(total, start + per_page) + 1)]
+        headers = {}
+        if start + per_page < total:
+            query = dict(request.query)
+            query['page'] = str(page + 1)
+            headers['Link'] = f'<{request.url.with_query(query)}>; rel="next"'
+        return web.json_response(issues, headers=self._github_headers(headers))
+
+    async def github_comments(self, request):
+        hours = _stable_int(request.path, 1, 96)
+        return web.json_response([{
+            'id': 1,
+            'created_at': f'2024-01-{1 + hours // 24:02d}T{hours % 24:02d}:00:00Z',
+            'body': 'Thanks for the report',
+        }], headers=self._github_headers())
+
+    async def github_rate_limit(self, request):
+        core = {'limit': 5000, 'remaining': 4999, 'reset': int(time.time()) + 3600}
+        return web.json_response({'resources': {'core': core, 'search': core, 'graphql': core}, 'rate': core})
+
+    async def github_graphql(self, request):
+        body = await request.json()
+        variables = body.get('variables', {})
+        if 'repository' not in body.get('query', ''):
+            return web.json_response({'data': {'rateLimit': {'remaining': 4999, 'cost': 1}}})
+        key = f"{variables.get('owner')}/{variables.get('name')}"
+        nodes = []
+        for n in range(min(self.config.closed_issues, 100)):
+            hours = _stable_int(f'{key}#{n}', 1, 96)
+            comments = [{'createdAt': f'2024-01-{1 + hours // 24:02d}T{hours % 24:02d}:00:00Z'}] if n % 3 else []
+            nodes.append({'createdAt': '2024-01-01T00:00:00Z', 'comments': {'nodes': comments}})
+        return web.json_response({'data': {'repository': {'issues': {'nodes': nodes}}}},
+                                 headers=self._github_headers())
+
+    # Tranco
+
+    async def tranco_rank(self, request):
+        domain = request.match_info['domain']
+        return web.json_response({'domain': domain, 'rank': _stable_int(domain, 1, 1000000)})
+
+    # Google Trends (responses carry the same anti-JSON-hijacking prefixes as Google)
+
+    async def trends_cookie(self, request):
+        response = web.Response(text='ok')
+        response.set_cookie('NID', 'benchmark')
+        return response
+
+    async def trends_explore(self, request):
+        req = json.loads(request.query['req'])
+        keyword = req['comparisonItem'][0]['keyword']
+        restriction = {'complexKeywordsRestriction': {'keyword': [{'type': 'BROAD', 'value': keyword}]}}
+        widgets = [
+            {'id': 'TIMESERIES', 'token': 'ts', 'request': {'keyword': keyword}},
+            {'id': 'RELATED_QUERIES', 'token': 'rq', 'request': {'restriction': restriction}},
+        ]
+        return web.Response(text=")]}'" + json.dumps({'widgets': widgets}), content_type='application/json')
+
+    async def trends_interest(self, request):
+        keyword = json.loads(request.query['req'])['keyword']
+        rng = random.Random(keyword)
+        start = 1696118400
+        timeline = [{
+            'time': str(start + week * 604800),
+            'value': [rng.randint(0, 100)],
+            'isPartial': week == 12,
+        } for week in range(13)]
+        return web.Response(text=")]}',\n" + json.dumps({'default': {'timelineData': timeline}}),
+                            content_type='application/json')
+
+    async def trends_related(self, request):
+        keyword = json.loads(request.query['req'])['restriction']['complexKeywordsRestriction']['keyword'][0]['value']
+        top = [{'query': f'{keyword} pricing', 'value': 100}, {'query': f'{keyword} login', 'value': 60}]
+        rising = [{'query': f'{keyword} brand', 'value': 250}, {'query': f'{keyword} alternatives', 'value': 120}]
+        payload = {'default': {'rankedList': [{'rankedKeyword': top}, {'rankedKeyword': rising}]}}
+        return web.Response(text=")]}',\n" + json.dumps(payload), content_type='application/json')
+
+    # Review sites
+
+    def _reviews(self, name: str):
+        rng = random.Random(name)
+        phrases = ['Great product, easy onboarding', 'Support was slow to respond',
+                   'Powerful but the UI is confusing', 'Excellent value for money',
+                   'Reporting features are lacking']
+        return [(rng.randint(3, 10), rng.choice(phrases)) for _ in range(self.config.reviews_per_page)]
+
+    async def g2_reviews(self, request):
+        blocks = ''.join(
+            '<div class="review">'
+            f'<meta itemprop="ratingValue" content="{rating}"/>'
+            f'<div class="review-content">{text}</div>'
+            '<meta itemprop="datePublished" content="2024-01-01"/>'
+            '</div>'
+            for rating, text in self._reviews('g2' + request.match_info['name'])
+        )
+        return web.Response(text=f'<html><body>{blocks}</body></html>', content_type='text/html')
+
+    async def capterra_reviews(self, request):
+        blocks = ''.join(
+            '<div class="review-wrapper">'
+            f'<meta itemprop="ratingValue" content="{rating}"/>'
+            f'<div class="review-text">{text}</div>'
+            '<div class="pros-text">Fast and reliable</div>'
+            '<div class="cons-text">Pricing is high</div>'
+            '</div>'
+            for rating, text in self._reviews('capterra' + request.match_info['name'])
+        )
+        return web.Response(text=f'<html><body>{blocks}</body></html>', content_type='text/html')
+
+    # Company homepages
+
+    async def homepage(self, request):
+        rng = random.Random(request.match_info['domain'])
+        snippets = ['<script src="https://www.google-analytics.com/analytics.js"></script>',
+                    '<script src="https://pagead2.googlesyndication.com/ads.js"></script>',
+                    '<img src="https://ad.doubleclick.net/pixel"/>',
+                    '<script src="https://js.hs-scripts.com/hubspot.js"></script>',
+                    '<script src="https://munchkin.marketo.net/munchkin.js"></script>']
+        scripts = ''.join(s for s in snippets if rng.random() < 0.5)
+        filler = '<p>' + 'Lorem ipsum dolor sit amet. ' * 200 + '</p>'
+        return web.Response(text=f'<html><head>{scripts}</head><body>{filler}</body></html>',
+                            content_type='text/html')
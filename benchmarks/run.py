@@ -0,0 +1,259 @@
+"""End-to-end collection throughput benchmark.
+
+Runs the collectors against local stand-ins for every external service
+(see fake_services.py) and reports companies/s, p50/p99 latency, external
+calls per company and peak RSS for each stage:
+
+    pipeline   celery_tasks.SOURCE_TASKS in parallel (GitHub, marketing, tech stack, reviews + DB)
+    marketing  MarketingEstimator.collect_metrics
+    reviews    ReviewCollector.collect_metrics
+
+Usage:
+    python -m benchmarks.run --companies 1000 --concurrency 16
+    python -m benchmarks.run --companies 10000 --stages reviews --latency-ms 50 \\
+        --rate-limit g2=200 --output bench.json
+    python -m benchmarks.run --stages pipeline --github-cheap --github-quota 500 --github-tokens 4
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from .fake_services import FakeServices, FakeServiceConfig, ServiceProfile, SERVICES
+
+STAGES = ('pipeline', 'marketing', 'reviews')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--companies', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Base latency for every fake service')
+    parser.add_argument('--jitter-ms', type=float, default=5.0)
+    parser.add_argument('--service-latency', action='append', default=[], metavar='SERVICE=MS',
+                        help='Per-service latency override, e.g. g2=300')
+    parser.add_argument('--rate-limit', action='append', default=[], metavar='SERVICE=RPS',
+                        help='Per-service token-bucket rate limit, e.g. github=80')
+    parser.add_argument('--github-cheap', action='store_true',
+                        help='Use the constant-cost GitHub collection mode')
+    parser.add_argument('--domains', type=int, default=None,
+                        help='Distinct company websites (default: one per company)')
+    parser.add_argument('--github-tokens', type=int, default=1, help='Size of the GitHub token pool')
+    parser.add_argument('--github-quota', type=int, default=None,
+                        help='GitHub calls allowed per token per --github-quota-window seconds')
+    parser.add_argument('--github-quota-window', type=float, default=3600.0)
+    parser.add_argument('--crawl-concurrency', type=int, default=1000,
+                        help='Crawl frontier slots per host (the fake services share one host)')
+    parser.add_argument('--crawl-delay', type=float, default=0.0, help='Crawl frontier seconds between requests to a host')
+    parser.add_argument('--database-url', default=None, help='Defaults to a fresh SQLite file')
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    return parser.parse_args(argv)
+
+
+def _parse_overrides(values: List[str]) -> Dict[str, float]:
+    overrides = {}
+    for value in values:
+        service, _, number = value.partition('=')
+        if service not in SERVICES:
+            raise SystemExit(f"Unknown service '{service}', expected one of {', '.join(SERVICES)}")
+        overrides[service] = float(number)
+    return overrides
+
+
+def build_config(args) -> FakeServiceConfig:
+    latencies = _parse_overrides(args.service_latency)
+    limits = _parse_overrides(args.rate_limit)
+    profiles = {
+        name: ServiceProfile(
+            latency_ms=latencies.get(name, args.latency_ms),
+            jitter_ms=args.jitter_ms,
+            rate_limit=limits.get(name)
+        )
+        for name in SERVICES
+    }
+    return FakeServiceConfig(profiles=profiles, github_quota=args.github_quota,
+                             github_quota_window=args.github_quota_window)
+
+
+def configure_environment(services: FakeServices, database_url: str, github_cheap: bool = False,
+                          github_tokens: int = 1, crawl_concurrency: int = 1000, crawl_delay: float = 0.0):
+    """Point settings and collectors at the fake services before the app is imported"""
+    os.environ.setdefault('GITHUB_TOKEN', 'benchmark-token')
+    os.environ['GITHUB_TOKENS'] = ','.join(f'benchmark-token-{i}' for i in range(1, github_tokens))
+    os.environ['GITHUB_API_URL'] = services.url('github')
+    os.environ['GITHUB_CHEAP_MODE'] = '1' if github_cheap else '0'
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['CRAWL_CONCURRENCY'] = str(crawl_concurrency)
+    os.environ['CRAWL_DELAY'] = str(crawl_delay)
+    os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/0')
+
+    import pytrends.request as trends_request
+    base = services.url('trends')
+    trends_request.BASE_TRENDS_URL = base
+    trends_request.TrendReq.GENERAL_URL = f'{base}/api/explore'
+    trends_request.TrendReq.INTEREST_OVER_TIME_URL = f'{base}/api/widgetdata/multiline'
+    trends_request.TrendReq.RELATED_QUERIES_URL = f'{base}/api/widgetdata/relatedsearches'
+
+    from app.collectors import MarketingEstimator, ReviewCollector
+    MarketingEstimator.TRANCO_URL = services.url('tranco') + '/api/ranks/domain/{domain}'
+    MarketingEstimator.HOMEPAGE_URL = services.url('site') + '/{domain}'
+    ReviewCollector.G2_URL = services.url('g2') + '/products/{name}/reviews'
+    ReviewCollector.CAPTERRA_URL = services.url('capterra') + '/p/{name}/reviews'
+
+
+def synthetic_companies(count: int, domains: Optional[int] = None) -> List[dict]:
+    """`domains` < `count` makes companies share websites, as subsidiaries and rebrands do"""
+    domains = domains or count
+    return [{
+        'name': f'company-{i:06d}',
+        'github_url': f'https://github.com/company-{i:06d}/core',
+        'website': f'https://www.company-{i % domains:06d}.example/'
+    } for i in range(count)]
+
+
+def seed_database(companies: List[dict]) -> List[int]:
+    from app import models
+    from app.database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(models.Company, companies)
+        db.commit()
+        names = [c['name'] for c in companies]
+        rows = db.query(models.Company.id, models.Company.name)\
+            .filter(models.Company.name.in_(names))\
+            .order_by(models.Company.id)
+        # IN returns rows in no particular order; map back by name, newest row per name
+        ids = {row.name: row.id for row in rows}
+        return [ids[c['name']] for c in companies]
+    finally:
+        db.close()
+
+
+def stage_runners(companies: List[dict]) -> Tuple[Dict[str, Callable[[int], object]], List[int]]:
+    """Each runner returns a truthy value when the company was collected"""
+    from app.collectors import MarketingEstimator, ReviewCollector
+    from app.celery import celery
+    from app import celery_tasks
+
+    # No broker here: follow-up tasks (e.g. review analysis on the cpu
+    # queue) run inline in the task that queued them
+    celery.conf.task_always_eager = True
+    # shared_task resolves the app per thread; make ours the default for the pool threads
+    celery.set_default()
+    company_ids = []
+
+    def pipeline(i):
+        # What process_company_data's group does on a worker pool: every source
+        # task at once. GitHub work parked on drained tokens raises here and
+        # counts as not collected.
+        with ThreadPoolExecutor(max_workers=len(celery_tasks.SOURCE_TASKS)) as sources:
+            futures = [sources.submit(task, company_ids[i]) for task in celery_tasks.SOURCE_TASKS]
+            for future in futures:
+                future.result()
+        return True
+
+    def marketing(i):
+        return asyncio.run(MarketingEstimator().collect_metrics(companies[i]['website']))
+
+    def reviews(i):
+        return ReviewCollector().collect_metrics(companies[i]['name'])
+
+    return {'pipeline': pipeline, 'marketing': marketing, 'reviews': reviews}, company_ids
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(name: str, runner: Callable[[int], object], count: int, concurrency: int,
+              services: FakeServices) -> dict:
+    services.reset_counters()
+    latencies = [0.0] * count
+    failures = 0
+
+    def timed_call(i):
+        start = time.perf_counter()
+        try:
+            return bool(runner(i))
+        except Exception:
+            return False
+        finally:
+            latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for ok in pool.map(timed_call, range(count)):
+            failures += 0 if ok else 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        'stage': name,
+        'companies': count,
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'companies_per_s': round(count / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'failed': failures,
+        'calls_per_company': {svc: round(n / count, 2) for svc, n in sorted(services.calls.items())},
+        'rejected': dict(services.rejected),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def print_report(results: List[dict]):
+    print(f"{'stage':<10} {'n':>7} {'co/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'failed':>7} {'rss MB':>8}  calls/company")
+    for r in results:
+        calls = ' '.join(f'{svc}={n}' for svc, n in r['calls_per_company'].items())
+        print(f"{r['stage']:<10} {r['companies']:>7} {r['companies_per_s']:>9} {r['p50_ms']:>9} "
+              f"{r['p99_ms']:>9} {r['failed']:>7} {r['peak_rss_mb']:>8}  {calls}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+
+    with FakeServices(build_config(args)) as services:
+        workdir = tempfile.mkdtemp(prefix='aiquisition-bench-')
+        configure_environment(services, args.database_url or f"sqlite:///{workdir}/bench.db",
+                              args.github_cheap, args.github_tokens, args.crawl_concurrency, args.crawl_delay)
+
+        companies = synthetic_companies(args.companies, args.domains)
+        runners, company_ids = stage_runners(companies)
+        if 'pipeline' in args.stages:
+            company_ids.extend(seed_database(companies))
+
+        results = [
+            run_stage(stage, runners[stage], args.companies, args.concurrency, services)
+            for stage in STAGES if stage in args.stages
+        ]
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import os
+
+# Settings are read at import time; tests never reach these services
+os.environ.setdefault('GITHUB_TOKEN', 'test-token')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/15')
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+
+
+@pytest.fixture
+def db():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,24 @@
+from fastapi.testclient import TestClient
+
+from app import crud, models
+from app.main import app, get_db
+
+
+def test_company_without_trends_data(db):
+    db.add(models.Company(id=1, name='Acme', website='https://acme.example'))
+    db.commit()
+    # Trends failed, so only Tranco landed
+    crud.update_market_metrics(db, 1, {
+        'estimated_spend': 7943.28, 'channels': {}, 'efficiency_score': 10.0,
+        'raw_data': {'tranco': {'rank': 1000}}
+    })
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        response = TestClient(app).get('/companies/1')
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    market = response.json()['metrics']['market']
+    assert market['tranco_rank'] == 1000
+    assert market['trends_data'] is None
@@ -0,0 +1,52 @@
+import asyncio
+
+from app.cache import JSONCache
+
+
+def gather(cache, fetch, callers=10, **kwargs):
+    async def run():
+        return await asyncio.gather(*(
+            cache.get_or_fetch('key', 60, fetch, poll_interval=0.01, **kwargs) for _ in range(callers)
+        ))
+    return asyncio.run(run())
+
+
+def test_concurrent_misses_fetch_once():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {'rank': 1}
+
+    assert gather(JSONCache(), fetch) == [{'rank': 1}] * 10
+    assert len(calls) == 1
+
+
+def test_failed_fetch_is_not_retried_by_each_waiter():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return None
+
+    cache = JSONCache()
+    assert gather(cache, fetch) == [None] * 10
+    assert len(calls) == 1
+
+    # Within the failure window callers don't refetch either
+    assert gather(cache, fetch, callers=1) == [None]
+    assert len(calls) == 1
+
+
+def test_fetch_is_retried_after_the_failure_window():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return None if len(calls) == 1 else {'rank': 2}
+
+    cache = JSONCache()
+    assert gather(cache, fetch, callers=1, failure_ttl=0) == [None]
+    assert gather(cache, fetch, callers=1, failure_ttl=0) == [{'rank': 2}]
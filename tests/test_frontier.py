@@ -0,0 +1,168 @@
+import random
+
+import pytest
+
+from app.collectors import frontier as frontier_module
+from app.collectors.frontier import CrawlFrontier
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(frontier_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['local', 'redis'])
+def make_frontier(request, clock):
+    def make(**kwargs):
+        frontier = CrawlFrontier(**kwargs)
+        if request.param == 'redis':
+            fakeredis = pytest.importorskip('fakeredis')
+            frontier.redis = fakeredis.FakeRedis(decode_responses=True)
+            frontier._push_script = frontier.redis.register_script(frontier_module.PUSH_SCRIPT)
+            frontier._claim_script = frontier.redis.register_script(frontier_module.CLAIM_SCRIPT)
+            frontier._release_script = frontier.redis.register_script(frontier_module.RELEASE_SCRIPT)
+        return frontier
+    return make
+
+
+def test_claims_follow_priority_across_all_hosts(make_frontier):
+    frontier = make_frontier(concurrency=1, delay=0)
+    frontier.SCAN = 10
+    priorities = list(range(300))
+    random.Random(7).shuffle(priorities)
+    for index, priority in enumerate(priorities):
+        frontier.push(f"host-{index}.example", f"job-{priority}", priority)
+
+    claimed = [frontier.claim().job for _ in range(300)]
+
+    assert claimed == [f"job-{priority}" for priority in range(300)]
+    assert frontier.claim() is None
+
+
+def test_host_concurrency_limit(make_frontier):
+    frontier = make_frontier(concurrency=2, delay=0)
+    for job in range(5):
+        frontier.push('a.example', f"job-{job}", job)
+
+    first, second = frontier.claim(), frontier.claim()
+    assert (first.job, second.job) == ('job-0', 'job-1')
+    assert frontier.claim() is None
+
+    frontier.release(first)
+    assert frontier.claim().job == 'job-2'
+    assert frontier.claim() is None
+
+
+def test_busy_host_does_not_block_others(make_frontier):
+    frontier = make_frontier(concurrency=1, delay=0)
+    frontier.push('a.example', 'a-1', 0)
+    frontier.push('a.example', 'a-2', 1)
+    frontier.push('b.example', 'b-1', 5)
+
+    assert frontier.claim().job == 'a-1'
+    assert frontier.claim().job == 'b-1'
+    assert frontier.claim() is None
+
+
+def test_crawl_delay_between_claims(make_frontier, clock):
+    frontier = make_frontier(concurrency=4, delay=10, host_limits={'fast.example': (4, 0)})
+    for job in range(3):
+        frontier.push('a.example', f"job-{job}", job)
+    frontier.push('fast.example', 'fast-0', 50)
+    frontier.push('fast.example', 'fast-1', 51)
+
+    assert frontier.claim().job == 'job-0'
+    # a.example waits out its delay while fast.example has none
+    assert frontier.claim().job == 'fast-0'
+    assert frontier.claim().job == 'fast-1'
+    assert frontier.claim() is None
+    assert frontier.next_ready_in() == pytest.approx(10)
+
+    clock.now += 10
+    assert frontier.claim().job == 'job-1'
+    assert frontier.claim() is None
+
+
+def test_delay_counts_from_the_last_claim_after_release(make_frontier, clock):
+    frontier = make_frontier(concurrency=1, delay=10)
+    frontier.push('a.example', 'job-0', 0)
+    frontier.push('a.example', 'job-1', 1)
+
+    lease = frontier.claim()
+    clock.now += 4
+    frontier.release(lease)
+    assert frontier.claim() is None
+    assert frontier.next_ready_in() == pytest.approx(6)
+
+    clock.now += 6
+    assert frontier.claim().job == 'job-1'
+
+
+def test_expired_lease_requeues_its_job(make_frontier, clock):
+    frontier = make_frontier(concurrency=1, delay=0, lease_ttl=30)
+    frontier.push('a.example', 'job-0', 0)
+    frontier.push('a.example', 'job-1', 1)
+
+    frontier.claim()  # worker dies without releasing
+    assert frontier.claim() is None
+
+    clock.now += 30
+    lease = frontier.claim()
+    assert lease.job == 'job-0'
+    frontier.release(lease)
+    assert frontier.claim().job == 'job-1'
+
+
+def test_expired_lease_of_the_last_job_is_requeued(make_frontier, clock):
+    frontier = make_frontier(concurrency=2, delay=0, lease_ttl=30)
+    frontier.push('a.example', 'job-0', 0)
+
+    frontier.claim()  # worker dies without releasing
+    assert frontier.claim() is None
+    assert frontier.next_ready_in() == pytest.approx(30)
+
+    clock.now += 30
+    assert frontier.claim().job == 'job-0'
+
+
+def test_job_is_dropped_after_max_attempts(make_frontier, clock):
+    frontier = make_frontier(concurrency=1, delay=0, lease_ttl=30, max_attempts=2)
+    frontier.push('a.example', 'job-0', 0)
+    frontier.push('a.example', 'job-1', 1)
+
+    for _ in range(2):
+        assert frontier.claim().job == 'job-0'  # and the worker dies
+        clock.now += 30
+    assert frontier.claim().job == 'job-1'
+
+
+def test_push_to_idle_host_respects_delay(make_frontier, clock):
+    frontier = make_frontier(concurrency=2, delay=10)
+    frontier.push('a.example', 'job-0', 0)
+    frontier.release(frontier.claim())
+    assert frontier.claim() is None
+
+    frontier.push('a.example', 'job-1', 0)
+    assert frontier.claim() is None
+    clock.now += 10
+    assert frontier.claim().job == 'job-1'
+
+
+def test_repush_updates_priority(make_frontier):
+    frontier = make_frontier(concurrency=1, delay=0)
+    frontier.push('a.example', 'a', 5)
+    frontier.push('b.example', 'b', 3)
+    frontier.push('a.example', 'a', 1)
+
+    assert frontier.claim().job == 'a'
+    assert frontier.next_ready_in() == 0
@@ -0,0 +1,57 @@
+import pytest
+from github import RateLimitExceededException
+
+from app.collectors.github import GitHubCollector
+from app.collectors.token_pool import TokensExhausted
+
+
+def test_rate_limit_error_without_headers_moves_on(monkeypatch):
+    collector = GitHubCollector(token='token')
+
+    def collect(github, repo_url):
+        # Raised without a response, e.g. on connection-level failures
+        raise RateLimitExceededException(403, {'message': 'rate limited'}, None)
+    monkeypatch.setattr(collector, '_collect', collect)
+    monkeypatch.setattr(collector, '_record_rate_limit', lambda source, github: None)
+
+    with pytest.raises(TokensExhausted):
+        collector.collect_metrics('https://github.com/acme/widgets')
+
+
+REPO = {
+    'id': 1, 'name': 'widgets', 'full_name': 'acme/widgets',
+    'url': 'https://api.github.com/repos/acme/widgets',
+    'stargazers_count': 120, 'forks_count': 12, 'open_issues_count': 3, 'subscribers_count': 9,
+    'description': 'Widgets', 'language': 'Python', 'topics': ['saas'], 'updated_at': '2024-01-06T12:00:00Z',
+}
+# Seven signed-in contributors, plus three anonymous ones GitHub only lists with anon=true
+CONTRIBUTORS, ANONYMOUS = 7, 3
+
+
+def fake_request(requester, verb, url, parameters=None, headers=None, input=None):
+    parameters = parameters or {}
+    if url.endswith('/contributors'):
+        total = CONTRIBUTORS + (ANONYMOUS if parameters.get('anon') else 0)
+        per_page = int(parameters.get('per_page', 30))
+        last = -(-total // per_page)
+        link = {'link': f'<{url}?per_page={per_page}&page={last}>; rel="last"'} if last > 1 else {}
+        return link, [{'login': f'user{n}'} for n in range(min(total, per_page))]
+    if url.endswith('/topics'):
+        return {}, {'names': REPO['topics']}
+    return {}, REPO
+
+
+def test_cheap_and_full_mode_count_contributors_alike(monkeypatch):
+    monkeypatch.setattr('github.Requester.Requester.requestJsonAndCheck', fake_request)
+    collected = {}
+    for cheap in (False, True):
+        collector = GitHubCollector(token='token', cheap=cheap)
+        monkeypatch.setattr(collector, '_calculate_commit_frequency', lambda repo: 1.0)
+        monkeypatch.setattr(collector, '_calculate_response_time', lambda repo: 2.0)
+        monkeypatch.setattr(collector, '_get_weekly_commits', lambda repo: [7] * 52)
+        monkeypatch.setattr(collector, '_calculate_response_time_graphql', lambda repo: 2.0)
+        collected[cheap] = collector.collect_metrics('https://github.com/acme/widgets')
+
+    assert collected[False]['contributors'] == collected[True]['contributors'] == CONTRIBUTORS
+    for field in ('stars', 'forks', 'commit_frequency', 'issue_response_time'):
+        assert collected[False][field] == collected[True][field]
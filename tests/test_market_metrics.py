@@ -0,0 +1,61 @@
+import pytest
+
+from app import crud, models
+from app.celery_tasks import rescore_company
+
+INTEREST = [40, 50, 60, 70, 80, 90, 100, 90]
+
+
+def market_metrics(skipped=()):
+    raw_data = {}
+    metrics = {'estimated_spend': 0.0, 'channels': {}, 'efficiency_score': 0.0, 'raw_data': raw_data}
+    if 'tranco' not in skipped:
+        raw_data['tranco'] = {'rank': 1000}
+        metrics['estimated_spend'] = 7943.28
+    if 'trends' not in skipped:
+        raw_data['trends'] = {'interest_over_time': INTEREST}
+        metrics['channels']['search'] = {'score': 90.0, 'trend': 38.46}
+    metrics['efficiency_score'] = 10.0 * len(raw_data)
+    if skipped:
+        metrics['partial'] = True
+        raw_data['skipped_sources'] = list(skipped)
+    return metrics
+
+
+def test_partial_market_metrics_keep_skipped_and_derived_values(db):
+    db.add(models.Company(id=1, name='Acme', website='https://acme.example'))
+    db.commit()
+    crud.update_market_metrics(db, 1, market_metrics())
+    rescore_company(db, 1)
+    before = db.query(models.CompanyRanking).get(1)
+    before = (before.market_score, before.efficiency_score)
+
+    crud.update_market_metrics(db, 1, market_metrics(skipped=('tranco',)))
+    rescore_company(db, 1)
+
+    stored = db.query(models.MarketMetrics).filter(models.MarketMetrics.company_id == 1).one()
+    assert stored.tranco_rank == 1000
+    assert stored.estimated_spend == 7943.28
+    assert stored.raw_data['tranco'] == {'rank': 1000}
+    after = db.query(models.CompanyRanking).get(1)
+    assert (after.market_score, after.efficiency_score) == before
+    assert stored.efficiency_score == before[1]
+
+
+def test_rescore_completes_efficiency_once_tech_stack_lands(db):
+    db.add(models.Company(id=1, name='Acme', website='https://acme.example'))
+    db.commit()
+    # Market data collected before the homepage was crawled
+    crud.update_market_metrics(db, 1, market_metrics())
+    rescore_company(db, 1)
+    without_tech = db.query(models.MarketMetrics).filter(models.MarketMetrics.company_id == 1).one().efficiency_score
+
+    crud.update_tech_stack(db, 1, {'analytics': ['Google Analytics'], 'advertising': ['Google Ads'],
+                                   'marketing_tools': ['HubSpot']})
+    rescore_company(db, 1)
+
+    stored = db.query(models.MarketMetrics).filter(models.MarketMetrics.company_id == 1).one()
+    db.refresh(stored)
+    # Three tools are 60 points of tech diversity, weighted 0.3
+    assert stored.efficiency_score == pytest.approx(without_tech + 18.0)
+    assert db.query(models.CompanyRanking).get(1).efficiency_score == pytest.approx(stored.efficiency_score)
@@ -0,0 +1,42 @@
+import json
+import time
+from types import SimpleNamespace
+
+from app import celery_tasks
+from app.collectors.frontier import CrawlFrontier
+from app.profiling import SamplingProfiler
+
+
+def test_stop_waits_for_the_sampler_to_exit():
+    profiler = SamplingProfiler(interval=0.001).start()
+    time.sleep(0.05)
+    stacks = profiler.stop()
+    samples = profiler.samples
+
+    time.sleep(0.02)
+    assert samples > 0 and profiler.samples == samples
+    assert profiler.stop() is stacks
+
+
+def test_crawl_jobs_carry_the_profile_flag(monkeypatch, tmp_path):
+    monkeypatch.setattr(celery_tasks, 'frontier', CrawlFrontier(delay=0))
+    monkeypatch.setattr(celery_tasks.crawl_frontier, 'delay', lambda *args: None)
+    monkeypatch.setattr(celery_tasks.settings, 'profiling_enabled', True)
+    monkeypatch.setattr(celery_tasks.settings, 'profile_dir', str(tmp_path))
+    monkeypatch.setattr(celery_tasks.settings, 'profile_threshold_seconds', 0)
+    crawled = []
+
+    def crawl_company(kind, company_id, profile=False):
+        crawled.append((kind, company_id, profile))
+        time.sleep(0.02)
+    monkeypatch.setattr(celery_tasks, 'crawl_company', crawl_company)
+
+    for company_id, profile in ((1, True), (2, False)):
+        company = SimpleNamespace(id=company_id, name=f"Company {company_id}", acquisition_score=1.0,
+                                  website=f"https://company-{company_id}.example")
+        celery_tasks.enqueue_crawl(company, 'tech_stack', profile=profile)
+    celery_tasks.crawl_frontier()
+
+    assert sorted(crawled) == [('tech_stack', 1, True), ('tech_stack', 2, False)]
+    profiles = [json.loads(path.read_text()) for path in tmp_path.glob('*.json')]
+    assert [(p['kind'], p['name'], p['company_id']) for p in profiles] == [('crawl', 'tech_stack', 1)]
@@ -0,0 +1,62 @@
+import pytest
+
+from app import crud, models
+from app.celery_tasks import calculate_subscores
+
+INTEREST = [10, 20, 30, 40, 50, 60, 70, 80]
+
+
+def add_company(db, company_id, github=True, market=True, tech=True, acquisition_score=0.0):
+    db.add(models.Company(id=company_id, name=f"company-{company_id}", website=f"https://c{company_id}.example",
+                          acquisition_score=acquisition_score))
+    if github:
+        db.add(models.GithubMetrics(company_id=company_id, stars=1000 * company_id, forks=10,
+                                    contributors=20, commit_frequency=5.0, issue_response_time=3.0))
+    if market:
+        db.add(models.MarketMetrics(company_id=company_id, tranco_rank=5000 * company_id,
+                                    search_interest_score=sum(INTEREST[-4:]) / 4,
+                                    trends_data={'interest_over_time': INTEREST}))
+    if tech:
+        db.add(models.TechStack(company_id=company_id, analytics_tools=['Google Analytics'],
+                                advertising_tools=['Google Ads'], marketing_tools=[],
+                                tech_diversity_score=40))
+    db.commit()
+
+
+def test_rebuild_computes_subscores_for_new_rows(db):
+    add_company(db, 1)
+    add_company(db, 2, github=False)
+    add_company(db, 3, market=False, tech=False)
+
+    assert crud.rebuild_rankings(db) == 3
+
+    for company_id in (1, 2, 3):
+        ranking = db.query(models.CompanyRanking).get(company_id)
+        expected = calculate_subscores(*crud.get_score_inputs(db, company_id))
+        for name, value in expected.items():
+            assert getattr(ranking, name) == pytest.approx(value), (company_id, name)
+
+
+def test_rebuild_keeps_rescored_subscores(db):
+    add_company(db, 1, acquisition_score=42.0)
+    crud.update_company_score(db, 1, 42.0, {'github_score': 0.9, 'market_score': 0.8, 'tech_score': 0.7})
+    db.query(models.GithubMetrics).filter(models.GithubMetrics.company_id == 1).update({'stars': 7})
+    db.commit()
+
+    crud.rebuild_rankings(db)
+
+    ranking = db.query(models.CompanyRanking).get(1)
+    db.refresh(ranking)
+    assert (ranking.github_score, ranking.market_score, ranking.tech_score) == (0.9, 0.8, 0.7)
+    assert ranking.acquisition_score == 42.0
+    assert ranking.stars == 7
+
+
+def test_subscore_screens_match_after_rebuild(db):
+    for company_id in (1, 2, 3):
+        add_company(db, company_id)
+    crud.rebuild_rankings(db)
+
+    results = crud.screen_companies(db, {'tech_score': (0.4, None)}, [('github_score', True)])
+
+    assert [result['company_id'] for result in results] == [3, 2, 1]
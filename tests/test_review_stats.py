@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, review_stats
+from app.collectors.reviews import ReviewCollector
+
+
+def review(index, rating=8, date=None):
+    return {'rating': rating, 'text': f"Review number {index}", 'date': date}
+
+
+def neutral(review):
+    return 0.0
+
+
+def scrape(aggregate, reviews):
+    return review_stats.fold(aggregate, reviews, neutral)
+
+
+def test_empty_page_keeps_what_was_seen():
+    aggregate = review_stats.empty()
+    page = [review(index) for index in range(10)]
+
+    assert [scrape(aggregate, page), scrape(aggregate, page), scrape(aggregate, []), scrape(aggregate, page)] \
+        == [10, 0, 0, 0]
+    assert aggregate['review_count'] == 10
+
+
+def test_review_that_drops_off_the_page_and_returns_is_counted_once():
+    aggregate = review_stats.empty()
+    scrape(aggregate, [review(index) for index in range(10)])
+    assert scrape(aggregate, [review(index) for index in range(1, 11)]) == 1
+    assert scrape(aggregate, [review(index) for index in range(10)]) == 0
+    assert aggregate['review_count'] == 11
+
+
+def test_turned_over_page_is_folded_in_full():
+    aggregate = review_stats.empty()
+    scrape(aggregate, [review(index, date=f"2024-05-{index + 1:02d}") for index in range(10)])
+    assert scrape(aggregate, [review(index, date=f"2024-06-{index - 9:02d}") for index in range(10, 20)]) == 10
+    # Undated pages have nothing to go on but the fingerprints
+    assert scrape(aggregate, [review(index) for index in range(20, 30)]) == 10
+    assert aggregate['review_count'] == 30
+
+
+def test_changed_scrape_of_dated_reviews_is_not_counted_again():
+    aggregate = review_stats.empty()
+    dates = [f"2024-06-{index + 1:02d}" for index in range(10)]
+    scrape(aggregate, [review(index, date=date) for index, date in enumerate(dates)])
+
+    # Changed markup: the same reviews now parse to different text
+    changed = [{'rating': 8, 'text': f"Review number {index} (edited)", 'date': date}
+               for index, date in enumerate(dates)]
+    assert scrape(aggregate, changed) == 0
+    assert scrape(aggregate, changed + [review(99, date='2024-06-20')]) == 1
+    assert aggregate['review_count'] == 11
+
+
+def test_dated_reviews_behind_the_watermark_count_as_folded():
+    aggregate = review_stats.empty()
+    scrape(aggregate, [review(0, date='2024-01-01'), review(1, date='2024-06-01')])
+    assert aggregate['watermark'] == '2024-06-01'
+    # Older than the grace window, so its fingerprint was dropped
+    assert len(aggregate['seen']) == 1
+
+    # Reviews behind the window count as folded; late-indexed ones inside it still fold
+    assert scrape(aggregate, [review(0, date='2024-01-01'), review(2, date='2024-05-01'),
+                              review(1, date='2024-06-01')]) == 1
+    assert aggregate['review_count'] == 3
+
+
+def test_identical_reviews_on_one_page_count_separately():
+    aggregate = review_stats.empty()
+    assert scrape(aggregate, [review(0), review(0), review(1)]) == 3
+    assert scrape(aggregate, [review(0), review(0), review(1)]) == 0
+
+
+def test_merge_and_headline():
+    g2, capterra = review_stats.empty(), review_stats.empty()
+    review_stats.fold(g2, [review(0, rating=10), review(1, rating=9), review(2, rating=3)], lambda r: 0.5)
+    review_stats.fold(capterra, [review(3, rating=7)], lambda r: None)
+
+    merged = review_stats.merge([g2, capterra])
+    assert merged['review_count'] == 4
+    assert merged['rating_histogram'] == {'10': 1, '9': 1, '3': 1, '7': 1}
+    assert 'seen' not in merged and 'watermark' not in merged
+
+    assert review_stats.headline([g2, capterra]) == {
+        'review_count': 4,
+        'average_rating': pytest.approx(29 / 4),
+        'nps_score': pytest.approx(25.0),
+        'sentiment_score': pytest.approx(75.0),
+    }
+    assert review_stats.headline([]) == {
+        'review_count': 0, 'average_rating': 0.0, 'nps_score': 0.0, 'sentiment_score': 50.0
+    }
+
+
+def test_stored_aggregates_dedupe_a_redelivered_analysis(db):
+    db.add(models.Company(id=1, name='Acme', website='https://acme.example'))
+    db.commit()
+    collector = ReviewCollector()
+    reviews = [review(index, date=f"2024-06-{index + 1:02d}") for index in range(5)]
+    metrics = collector.summarize({'g2': {'rating': 8.0, 'review_count': 5, 'reviews': reviews}}, analyze=False)
+
+    for _ in range(2):
+        aggregates = crud.lock_review_aggregates(db, 1, ReviewCollector.SOURCES)
+        crud.update_review_metrics(db, 1, collector.analyze(dict(metrics), aggregates))
+
+    stored = crud.get_review_aggregates(db, 1)['g2']
+    assert stored['review_count'] == 5
+    assert stored['watermark'] == '2024-06-05'
+    assert db.query(models.ReviewMetrics).filter(models.ReviewMetrics.company_id == 1).one().review_count == 5
+
+
+def test_concurrent_first_folds_are_serialized(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'reviews.db'}", connect_args={'timeout': 30})
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        db.add(models.Company(id=1, name='Acme', website='https://acme.example'))
+        db.commit()
+    collector = ReviewCollector()
+    start, errors = threading.Barrier(2), []
+
+    def analyze(reviews):
+        metrics = collector.summarize({'g2': {'rating': 8.0, 'review_count': 5, 'reviews': reviews}}, analyze=False)
+        with Session() as db:
+            try:
+                start.wait()
+                aggregates = crud.lock_review_aggregates(db, 1, ReviewCollector.SOURCES)
+                # Time for the other worker to read too, were the lock not held
+                time.sleep(0.2)
+                crud.update_review_metrics(db, 1, collector.analyze(metrics, aggregates))
+            except Exception as e:
+                errors.append(e)
+
+    # Two scrapes of a turned-over page, both folding into a company with no aggregates yet
+    pages = ([review(index) for index in range(5)], [review(index) for index in range(5, 10)])
+    workers = [threading.Thread(target=analyze, args=(page,)) for page in pages]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    with Session() as db:
+        assert crud.get_review_aggregates(db, 1)['g2']['review_count'] == 10
+    engine.dispose()
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from app import models
+from app.similarity import SimilarityIndex
+
+TOKENS = ['lang:python', 'topic:crm', 'tool:hubspot']
+
+
+def add_features(db, company_id, updated_at, tokens=TOKENS):
+    db.add(models.Company(id=company_id, name=f"company-{company_id}", website=f"https://c{company_id}.example"))
+    db.add(models.CompanyFeatures(company_id=company_id, github_tokens=tokens, tech_tokens=[], updated_at=updated_at))
+    db.commit()
+
+
+def test_refresh_picks_up_rows_committed_behind_the_watermark(db):
+    now = datetime.utcnow()
+    add_features(db, 1, now)
+    index = SimilarityIndex()
+    index.refresh(db)
+    assert index.loaded.is_set()
+
+    # Stamped before the row already read, committed after the refresh
+    add_features(db, 2, now - timedelta(seconds=30))
+    index.refresh(db)
+
+    assert index.similar(1) == [(2, 1.0)]
+
+
+def test_refresh_drops_deleted_companies(db):
+    now = datetime.utcnow()
+    for company_id in (1, 2, 3):
+        add_features(db, company_id, now)
+    index = SimilarityIndex(reconcile_seconds=0)
+    index.refresh(db)
+
+    db.query(models.CompanyFeatures).filter(models.CompanyFeatures.company_id == 1).delete()
+    db.query(models.Company).filter(models.Company.id == 1).delete()
+    db.commit()
+    index.refresh(db)
+
+    assert index.similar(1) is None
+    assert index.size == 2
+    assert [other for other, _ in index.similar(3)] == [2]
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from app import models, snapshots
+
+
+@pytest.fixture(autouse=True)
+def fresh_total(monkeypatch):
+    monkeypatch.setattr(snapshots, '_total', {'bytes': None, 'summed_at': 0.0})
+
+
+def page(size):
+    # Hex of random bytes compresses to about half, so each snapshot costs about `size` bytes
+    return os.urandom(size).hex()
+
+
+def test_store_evicts_the_oldest_once_the_running_total_passes_the_cap(db):
+    for index in range(5):
+        snapshots.store(db, f"host-{index}.example", f"https://host-{index}.example", page(1000),
+                        max_bytes=3500)
+
+    hosts = [row.host for row in db.query(models.HomepageSnapshot.host).order_by(models.HomepageSnapshot.id)]
+    assert hosts == ['host-2.example', 'host-3.example', 'host-4.example']
+    assert snapshots._stored_bytes(db) <= 3500
+
+
+def test_replaced_snapshots_count_against_the_running_total(db):
+    for _ in range(5):
+        snapshots.store(db, 'a.example', 'https://a.example', page(1000), keep=1, max_bytes=3500)
+    snapshots.store(db, 'b.example', 'https://b.example', page(1000), max_bytes=3500)
+
+    # a.example's replaced fetches freed their bytes, so nothing was evicted
+    assert db.query(models.HomepageSnapshot).count() == 2
+    assert snapshots._total['bytes'] == snapshots._stored_bytes(db)
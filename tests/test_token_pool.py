@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import pytest
+
+from app.collectors.token_pool import GitHubTokenPool, StaticToken, TokensExhausted
+
+
+def make_pool(redis_client=None, tokens=('a', 'b')):
+    pool = GitHubTokenPool([StaticToken(token) for token in tokens])
+    if redis_client is not None:
+        from app.collectors.token_pool import ACQUIRE_SCRIPT
+        pool.redis = redis_client
+        pool._acquire_script = redis_client.register_script(ACQUIRE_SCRIPT)
+    return pool
+
+
+@pytest.fixture(params=['local', 'redis'])
+def pool(request):
+    if request.param == 'local':
+        return make_pool()
+    fakeredis = pytest.importorskip('fakeredis')
+    return make_pool(fakeredis.FakeRedis(decode_responses=True))
+
+
+def test_acquire_picks_the_credential_with_most_headroom(pool):
+    reset = time.time() + 600
+    pool.update(pool.sources[0], 500, reset)
+    pool.update(pool.sources[1], 900, reset)
+
+    assert pool.acquire(10) is pool.sources[1]
+
+
+def test_concurrent_acquires_never_dig_into_the_reserve(pool):
+    reset = time.time() + 600
+    for source in pool.sources:
+        pool.update(source, pool.RESERVE + 100, reset)
+
+    def acquire(_):
+        try:
+            return pool.acquire(7)
+        except TokensExhausted:
+            return None
+
+    with ThreadPoolExecutor(16) as executor:
+        granted = [source for source in executor.map(acquire, range(200)) if source is not None]
+
+    # 100 spare calls per credential buy 14 collections of 7 each
+    assert len(granted) == 2 * 14
+    with pytest.raises(TokensExhausted) as exhausted:
+        pool.acquire(7)
+    assert exhausted.value.retry_at == pytest.approx(reset)
+
+
+def test_expired_window_starts_a_full_budget(pool):
+    pool.update(pool.sources[0], 0, time.time() - 1)
+    pool.update(pool.sources[1], 60, time.time() + 600)
+
+    assert pool.acquire(100) is pool.sources[0]